@@ -0,0 +1,408 @@
+"""
+run_benchmarks.py
+
+Summary:
+    Benchmark harness for the downscaling pipeline on synthetic data
+    (see synthetic.py), so it runs anywhere without the real archives.
+
+    Benchmarks:
+        - interpolation: seconds/day for each access_interpolator method,
+                         the ERA5 and the MLD interpolators, and the multi-level
+                         (all ACCESS depths -> all ROMS s-levels) interpolator
+        - gp:            sparse (inducing-point) GP vs the exact sklearn GP on
+                         small grids: time, speedup, RMSE of the mean
+        - prepare:       seconds for data_utils.prepare_train_data
+        - patches:       patches/sec from generate_patches alone
+        - train_step:    patches/sec through the tf.data pipeline + a U-Net train step
+        - precision:     train-step patches/sec for float32 vs XLA, bf16, fp16 and
+                         gradient accumulation (see rcnn_model/scripts/precision.py)
+        - inference:     days/sec of the full-image predict path of
+                         test_full_inference
+
+    Each run is saved as JSON under benchmarks/results/ keyed by git commit,
+    and can be compared against an earlier run to catch regressions.
+    Benchmarks whose dependencies are missing are recorded as skipped.
+
+Usage:
+    python benchmarks/run_benchmarks.py --quick
+    python benchmarks/run_benchmarks.py --only interpolation --methods rbf random_forest
+    python benchmarks/run_benchmarks.py --compare latest
+"""
+
+# run_benchmarks.py
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+
+INTERP_METHODS = ('rbf', 'random_forest', 'gradient_boosting', 'gaussian_process')
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+def _timed(fn, repeat=1):
+    """Runs fn `repeat` times and returns the best wall time in seconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _setup_paths(workdir):
+    # point the rcnn Config at the synthetic tree before anything imports it
+    os.environ['SST_MODEL_ROOT'] = workdir
+    os.environ['SST_PROCESSED_DIR'] = os.path.join(workdir, 'data', 'processed')
+    for sub in ('', 'interpolation-engine', 'rcnn_model/scripts', 'benchmarks'):
+        path = os.path.join(REPO_ROOT, sub)
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+
+#%% Benchmarks
+
+@benchmark('interpolation')
+def bench_interpolation(ctx):
+    import xarray as xr
+    from synthetic import write_synthetic_tree, LATMIN, LATMAX, LONMIN, LONMAX
+    from interpolation.access_interpolator import interpolator
+    from interpolation.era5_interpolator import interpolator_era5
+    from interpolation.mld1_interpolator import interpolator_mld1
+
+    paths = write_synthetic_tree(ctx.workdir, ctx.year, ctx.days)
+    ds_sst = xr.open_dataset(paths['sst'])
+    ds_mld = xr.open_dataset(paths['mld1'])
+    ds_era5 = xr.open_dataset(paths['slhf'])
+    ds_local = xr.open_dataset(paths['roms'])
+    days = range(ctx.interp_days)
+    region = (LATMIN, LATMAX, LONMIN, LONMAX)
+
+    metrics = {}
+    for method in ctx.methods:
+        t = _timed(lambda: [interpolator(ds_sst, ds_local, 'sst', 'temp', T, 0, *region, method=method)
+                            for T in days])
+        metrics[f'interpolation.access.{method}.s_per_day'] = t / len(days)
+    t = _timed(lambda: [interpolator_era5(ds_era5, ds_local, 'slhf', 'temp', T, 0) for T in days])
+    metrics['interpolation.era5.rbf.s_per_day'] = t / len(days)
+    t = _timed(lambda: [interpolator_mld1(ds_mld, ds_local, 'mld1', 'temp', T, 0, *region) for T in days])
+    metrics['interpolation.mld1.rbf.s_per_day'] = t / len(days)
+
+    # all ACCESS levels onto all ROMS s-levels, horizontal weights shared across levels
+    from interpolation.regrid import GridCache
+    from interpolation.vertical import interpolator_levels
+    levels = range(ds_sst.sizes['deptht'])
+    cache = GridCache()
+    interpolator_levels(ds_sst, ds_local, 'sst', 'temp', 0, levels, *region, cache=cache)  # builds the weights
+    t = _timed(lambda: [interpolator_levels(ds_sst, ds_local, 'sst', 'temp', T, levels, *region, cache=cache)
+                        for T in days])
+    metrics['interpolation.levels.rbf.s_per_day'] = t / len(days)
+    return metrics
+
+
+@benchmark('gp')
+def bench_gp(ctx):
+    import numpy as np
+    from sklearn.gaussian_process import GaussianProcessRegressor
+    from sklearn.gaussian_process.kernels import ConstantKernel, RBF, WhiteKernel
+    from interpolation.sparse_gp import SparseGP
+
+    # small source grids (the exact GP is O(N^3)) and a 100 x 100 target grid
+    rng = np.random.default_rng(0)
+    glat, glon = np.meshgrid(np.linspace(-34, -22, 100), np.linspace(108, 116, 100), indexing='ij')
+    X_test = np.column_stack((glat.ravel(), glon.ravel()))
+
+    metrics = {}
+    for side in ctx.gp_sides:
+        lat, lon = np.meshgrid(np.linspace(-34, -22, side), np.linspace(108, 116, side), indexing='ij')
+        X = np.column_stack((lat.ravel(), lon.ravel()))
+        y = np.sin(X[:, 0] / 2) + np.cos(X[:, 1] / 1.5) + 0.01 * rng.standard_normal(len(X))
+        mu, sd = X.mean(0), X.std(0)
+
+        def exact():
+            kernel = ConstantKernel(1.0) * RBF(length_scale=np.ones(2)) + WhiteKernel(1e-2)
+            gpr = GaussianProcessRegressor(kernel=kernel, normalize_y=True, random_state=0)
+            gpr.fit((X - mu) / sd, y)
+            return gpr.predict((X_test - mu) / sd)
+
+        def sparse():
+            return SparseGP(X, X_test).fit(y).apply(y)
+
+        t_exact = _timed(exact)
+        t_sparse = _timed(sparse)
+        m_e, m_s = exact(), sparse()
+        gp = SparseGP(X, X_test).fit(y)
+        t_day = _timed(lambda: gp.apply(y), repeat=ctx.repeat)
+
+        key = f'gp.n{len(X)}'
+        metrics[f'{key}.exact.s'] = t_exact
+        metrics[f'{key}.sparse.s'] = t_sparse
+        metrics[f'{key}.sparse.s_per_day_shared'] = t_day
+        metrics[f'{key}.sparse.speedup'] = t_exact / t_sparse
+        metrics[f'{key}.sparse.mean_rmse'] = float(np.sqrt(np.mean((m_s - m_e) ** 2)))
+    return metrics
+
+
+def _write_processed(ctx):
+    from synthetic import write_synthetic_processed
+    for year in ctx.train_years:
+        write_synthetic_processed(os.environ['SST_PROCESSED_DIR'],
+                                  os.path.join(ctx.workdir, 'data'), year, ctx.days)
+
+
+@benchmark('prepare')
+def bench_prepare(ctx):
+    from data_utils import prepare_train_data
+
+    _write_processed(ctx)
+    t = _timed(lambda: prepare_train_data(ctx.train_years, 0, ctx.days), repeat=ctx.repeat)
+    return {'prepare.prepare_train_data.s': t,
+            'prepare.prepare_train_data.s_per_day': t / (ctx.days * len(ctx.train_years))}
+
+
+@benchmark('patches')
+def bench_patches(ctx):
+    import itertools
+    from data_utils import prepare_train_data, generate_patches
+
+    _write_processed(ctx)
+    (X_tr, m_tr, y_tr), _, _ = prepare_train_data(ctx.train_years, 0, ctx.days)
+    gen = generate_patches(X_tr, m_tr, y_tr)
+    t = _timed(lambda: list(itertools.islice(gen, ctx.patches)))
+    return {'patches.generator.patches_per_s': ctx.patches / t}
+
+
+@benchmark('train_step')
+def bench_train_step(ctx):
+    import tensorflow as tf
+    from config import Config
+    from data_utils import prepare_train_data, generate_patches
+    from model import build_unet
+
+    _write_processed(ctx)
+    (X_tr, m_tr, y_tr), _, _ = prepare_train_data(ctx.train_years, 0, ctx.days)
+    ps, C = Config.PATCH_SIZE, X_tr.shape[-1]
+    ds = tf.data.Dataset.from_generator(
+        lambda: generate_patches(X_tr, m_tr, y_tr),
+        output_signature=(
+            (tf.TensorSpec((ps, ps, C), tf.float32), tf.TensorSpec((ps, ps, 1), tf.float32)),
+            tf.TensorSpec((ps, ps, 1), tf.float32)
+        )
+    ).batch(Config.BATCH_SIZE).prefetch(tf.data.AUTOTUNE)
+
+    model = build_unet((ps, ps, C))
+    model.compile(optimizer=tf.keras.optimizers.Adam(Config.LEARNING_RATE), loss='mse')
+    steps = max(1, ctx.patches // Config.BATCH_SIZE)
+    it = iter(ds)
+    model.train_on_batch(*next(it))  # build + trace outside the timed region
+    t = _timed(lambda: [model.train_on_batch(*next(it)) for _ in range(steps)])
+    return {'train_step.unet.patches_per_s': steps * Config.BATCH_SIZE / t,
+            'train_step.unet.s_per_step': t / steps}
+
+
+@benchmark('precision')
+def bench_precision(ctx):
+    import numpy as np
+    import tensorflow as tf
+    from config import Config
+    from model import build_unet
+    from precision import set_precision, make_optimizer, wrap_for_training
+
+    ps, bs = Config.PATCH_SIZE, Config.BATCH_SIZE
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((bs, ps, ps, 7)).astype(np.float32)
+    m = np.ones((bs, ps, ps, 1), np.float32)
+    y = rng.standard_normal((bs, ps, ps, 1)).astype(np.float32)
+    steps = max(2, ctx.patches // bs)
+
+    # (label, policy, jit_compile, accum_steps); the first row is the previous train.py setup
+    modes = [('float32', 'float32', False, 1),
+             ('float32_xla', 'float32', True, 1),
+             ('bf16_xla', 'mixed_bfloat16', True, 1),
+             ('fp16_xla', 'mixed_float16', True, 1),
+             ('bf16_xla_accum4', 'mixed_bfloat16', True, 4)]
+    metrics = {}
+    try:
+        for label, policy, jit, accum in modes:
+            set_precision(policy)
+            model = wrap_for_training(build_unet((ps, ps, 7)), accum)
+            model.compile(optimizer=make_optimizer(Config.LEARNING_RATE, policy), loss='mse', jit_compile=jit)
+            model.train_on_batch([x, m], y)  # build + compile outside the timed region
+            t = _timed(lambda: [model.train_on_batch([x, m], y) for _ in range(steps)], repeat=ctx.repeat)
+            metrics[f'precision.{label}.patches_per_s'] = steps * bs / t
+            tf.keras.backend.clear_session()
+    finally:
+        set_precision('float32')
+    base = metrics['precision.float32.patches_per_s']
+    for label, *_ in modes[1:]:
+        metrics[f'precision.{label}.speedup'] = metrics[f'precision.{label}.patches_per_s'] / base
+    return metrics
+
+
+@benchmark('inference')
+def bench_inference(ctx):
+    import numpy as np
+    from synthetic import ROMS_SHAPE
+    from model import build_unet, build_inference_model
+    from test_full_inference import predict_full
+
+    rng = np.random.default_rng(0)
+    H, W = ROMS_SHAPE
+    X = rng.standard_normal((ctx.days, H, W, 7)).astype(np.float32)
+    X[:, :, -60:, :] = 0.0  # land strip
+    stats = {'mean_X': X.reshape(-1, 7).mean(0), 'scale_X': X.reshape(-1, 7).std(0),
+             'mean_y': X[..., :1].mean(keepdims=True).ravel(), 'scale_y': X[..., :1].std(keepdims=True).ravel()}
+
+    model = build_inference_model(build_unet((H, W, 7)), stats)
+    predict_full(model, X[:1])  # warm-up
+    t = _timed(lambda: predict_full(model, X), repeat=ctx.repeat)
+    return {'inference.predict_full.days_per_s': ctx.days / t}
+
+
+#%% Result storage and comparison
+
+def _git_info():
+    def git(*args):
+        try:
+            return subprocess.check_output(('git',) + args, cwd=REPO_ROOT,
+                                           stderr=subprocess.DEVNULL, text=True).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return {'commit': git('rev-parse', 'HEAD'),
+            'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+
+
+def save_results(results, results_dir=RESULTS_DIR):
+    os.makedirs(results_dir, exist_ok=True)
+    sha = (results['git']['commit'] or 'nogit')[:10]
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(results['timestamp']))
+    path = os.path.join(results_dir, f'{stamp}_{sha}.json')
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    return path
+
+
+def _resolve_baseline(arg, exclude, results_dir=RESULTS_DIR):
+    if arg != 'latest':
+        return arg
+    runs = sorted(p for p in glob.glob(os.path.join(results_dir, '*.json')) if p != exclude)
+    return runs[-1] if runs else None
+
+
+def compare(current, baseline, threshold=0.10):
+    """Prints relative changes; _per_s and speedup metrics are higher-is-better."""
+    rows, regressions = [], []
+    for key, new in sorted(current['metrics'].items()):
+        old = baseline['metrics'].get(key)
+        if not old:
+            rows.append((key, old, new, '  new'))
+            continue
+        change = (new - old) / old
+        worse = -change if key.endswith(('_per_s', '.speedup')) else change
+        flag = '  REGRESSION' if worse > threshold else ''
+        if flag:
+            regressions.append(key)
+        rows.append((key, old, new, f'{100 * change:+7.1f}%{flag}'))
+
+    print(f"\nComparison against {baseline['git']['commit']} ({time.ctime(baseline['timestamp'])})")
+    print(f"{'metric':<52}{'baseline':>14}{'current':>14}  change")
+    for key, old, new, note in rows:
+        old_s = f'{old:14.4g}' if old else f"{'-':>14}"
+        print(f'{key:<52}{old_s}{new:14.4g}{note}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip(),
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), default=None)
+    parser.add_argument('--methods', nargs='+', choices=INTERP_METHODS, default=list(INTERP_METHODS))
+    parser.add_argument('--days', type=int, default=8, help='synthetic days per year')
+    parser.add_argument('--interp-days', type=int, default=2, help='days timed per interpolation method')
+    parser.add_argument('--years', type=int, nargs='+', default=[2019, 2020])
+    parser.add_argument('--gp-sides', type=int, nargs='+', default=[20, 30, 40],
+                        help='source grid sides (N = side^2 points) for the gp benchmark')
+    parser.add_argument('--patches', type=int, default=256)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--quick', action='store_true', help='smallest sizes, rbf only, for smoke runs')
+    parser.add_argument('--workdir', default=None, help='where synthetic files go (default: temp dir)')
+    parser.add_argument('--results-dir', default=RESULTS_DIR)
+    parser.add_argument('--no-save', action='store_true')
+    parser.add_argument('--compare', default=None, metavar='RESULT.json|latest')
+    parser.add_argument('--threshold', type=float, default=0.10, help='relative slowdown flagged as regression')
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.days, args.interp_days, args.patches, args.repeat = 2, 1, 32, 1
+        args.methods, args.years, args.gp_sides = ['rbf'], args.years[:1], args.gp_sides[:1]
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='sst_bench_')
+    _setup_paths(workdir)
+
+    class Context:
+        pass
+    ctx = Context()
+    ctx.workdir, ctx.year, ctx.days = workdir, args.years[0], args.days
+    ctx.train_years, ctx.interp_days = args.years, min(args.interp_days, args.days)
+    ctx.methods, ctx.patches, ctx.repeat = args.methods, args.patches, args.repeat
+    ctx.gp_sides = args.gp_sides
+
+    results = {
+        'timestamp': time.time(),
+        'git': _git_info(),
+        'host': {'platform': platform.platform(), 'python': platform.python_version(),
+                 'cpus': os.cpu_count()},
+        'params': {k: v for k, v in vars(args).items()
+                   if k not in ('compare', 'results_dir', 'no_save', 'workdir')},
+        'metrics': {},
+        'skipped': {},
+    }
+
+    for name in args.only or BENCHMARKS:
+        print(f"▶ {name} ...", flush=True)
+        try:
+            metrics = BENCHMARKS[name](ctx)
+        except ImportError as e:
+            results['skipped'][name] = f'missing dependency: {e}'
+            print(f"  skipped ({e})")
+            continue
+        for key, value in metrics.items():
+            print(f"  {key:<52}{value:12.4g}")
+        results['metrics'].update(metrics)
+
+    path = None
+    if not args.no_save:
+        path = save_results(results, args.results_dir)
+        print(f"\nResults saved to {path}")
+
+    if args.compare:
+        baseline_path = _resolve_baseline(args.compare, path, args.results_dir)
+        if baseline_path is None:
+            print("No earlier results to compare against.")
+            return 0
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
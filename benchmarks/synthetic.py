@@ -0,0 +1,202 @@
+"""
+synthetic.py
+
+Summary:
+    Generates small synthetic datasets that mimic the layout of the real inputs,
+    so the pipeline can be benchmarked without ACCESS-S2, ERA5 or ROMS files.
+
+    - ACCESS-S2: nav_lat/nav_lon (y, x), time_counter, deptht; sst, salt, mld1
+                 with zeros on land, like the daily ACCESS files
+    - ERA5:      latitude (descending), longitude, valid_time; slhf, ssr, str, sshf
+    - ROMS:      lat_rho/lon_rho (eta_rho, xi_rho) on the 640 x 480 WA grid,
+                 s_rho levels and temp with NaN on land
+
+    Fields are smooth analytic patterns plus seeded noise, so repeated runs
+    produce identical files.
+
+Functions:
+    - make_access_dataset(var, days, year)
+    - make_era5_dataset(var, days, year)
+    - make_roms_dataset()
+    - write_synthetic_tree(root, year, days): NetCDF files in the data/ layout
+    - write_synthetic_processed(processed_dir, data_dir, year, days): .p files
+
+Usage:
+    from synthetic import write_synthetic_tree
+    write_synthetic_tree('/tmp/sst_bench', 2021, days=4)
+"""
+
+# synthetic.py
+import os
+import pickle
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+# Region used by interpolationroutine
+LATMIN, LATMAX = -34.3265, -22.5763
+LONMIN, LONMAX = 108.511, 116.284
+
+ROMS_SHAPE = (640, 480)
+ROMS_LEVELS = 30
+ACCESS_DEPTHS = (0.5, 1.5, 2.6)
+
+ACCESS_VARS = ('sst', 'salt', 'mld1')
+ERA5_VARS = ('slhf', 'ssr', 'str', 'sshf')
+
+# (offset, amplitude) of each synthetic field
+_FIELDS = {
+    'sst':  (22.0, 4.0),
+    'salt': (35.2, 0.4),
+    'mld1': (40.0, 15.0),
+    'slhf': (-9.0e6, 3.0e6),
+    'ssr':  (2.0e7, 5.0e6),
+    'str':  (-5.0e6, 1.0e6),
+    'sshf': (-1.0e6, 5.0e5),
+    'temp': (22.0, 4.0),
+}
+
+
+def _is_land(lat, lon):
+    # a rough WA coastline running north-east from Cape Leeuwin
+    return lon > 114.9 + 0.09 * (lat + 34.0)
+
+
+def _field(var, lat, lon, day, rng):
+    offset, amp = _FIELDS[var]
+    pattern = (-(lat - LATMAX) / (LATMAX - LATMIN)
+               + 0.2 * np.sin(lon * 1.7 + day * 0.3)
+               + 0.1 * np.cos(lat * 2.3 - day * 0.2))
+    return offset + amp * pattern + 0.01 * amp * rng.standard_normal(lat.shape)
+
+
+def _times(year, days):
+    return pd.date_range(f"{year}-01-01", periods=days, freq="D")
+
+
+def make_access_dataset(var, days, year=2021, resolution=0.25, seed=0):
+    """ACCESS-S2 style dataset: 2-D nav_lat/nav_lon, zero-filled land."""
+    rng = np.random.default_rng(seed)
+    lat = np.arange(-45.0, -10.0, resolution)
+    lon = np.arange(100.0, 125.0, resolution)
+    nav_lon, nav_lat = np.meshgrid(lon, lat)
+    land = _is_land(nav_lat, nav_lon)
+
+    data = np.stack([_field(var, nav_lat, nav_lon, d, rng) for d in range(days)]).astype(np.float32)
+    data[:, land] = 0.0
+    coords = {
+        'nav_lat': (('y', 'x'), nav_lat.astype(np.float32)),
+        'nav_lon': (('y', 'x'), nav_lon.astype(np.float32)),
+        'time_counter': _times(year, days),
+    }
+    if var == 'mld1':
+        return xr.Dataset({var: (('time_counter', 'y', 'x'), data)}, coords=coords)
+
+    levels = np.stack([data * (1.0 - 0.01 * k) for k in range(len(ACCESS_DEPTHS))], axis=1)
+    coords['deptht'] = np.asarray(ACCESS_DEPTHS, dtype=np.float32)
+    return xr.Dataset({var: (('time_counter', 'deptht', 'y', 'x'), levels)}, coords=coords)
+
+
+def make_era5_dataset(var, days, year=2021, resolution=0.25, seed=0):
+    """ERA5 style dataset on a regular lat/lon grid, latitude descending."""
+    rng = np.random.default_rng(seed)
+    lat = np.arange(-22.5, -34.5 - resolution, -resolution)
+    lon = np.arange(108.5, 116.5 + resolution, resolution)
+    lon2, lat2 = np.meshgrid(lon, lat)
+    data = np.stack([_field(var, lat2, lon2, d, rng) for d in range(days)]).astype(np.float32)
+    return xr.Dataset(
+        {var: (('valid_time', 'latitude', 'longitude'), data)},
+        coords={'valid_time': _times(year, days), 'latitude': lat, 'longitude': lon},
+    )
+
+
+def make_roms_dataset(days=1, seed=0):
+    """ROMS style dataset on the 640 x 480 WA grid with NaN over land."""
+    rng = np.random.default_rng(seed)
+    eta, xi = ROMS_SHAPE
+    lat = np.linspace(LATMIN, LATMAX, eta)
+    lon = np.linspace(LONMIN, LONMAX, xi)
+    lon_rho, lat_rho = np.meshgrid(lon, lat)
+    land = _is_land(lat_rho, lon_rho)
+
+    surface = np.stack([_field('temp', lat_rho, lon_rho, d, rng) for d in range(days)]).astype(np.float32)
+    surface[:, land] = np.nan
+    # s_rho runs from the bottom (-1) to the surface (0), so the last level is the surface
+    s_rho = np.linspace(-1.0, 0.0, ROMS_LEVELS, endpoint=False) + 0.5 / ROMS_LEVELS
+    cooling = np.linspace(8.0, 0.0, ROMS_LEVELS, dtype=np.float32)[None, :, None, None]
+    temp = surface[:, None, :, :] - cooling
+    return xr.Dataset(
+        {
+            'temp': (('ocean_time', 's_rho', 'eta_rho', 'xi_rho'), temp),
+            'h': (('eta_rho', 'xi_rho'), np.where(land, 5.0, 200.0).astype(np.float32)),
+        },
+        coords={
+            'lat_rho': (('eta_rho', 'xi_rho'), lat_rho),
+            'lon_rho': (('eta_rho', 'xi_rho'), lon_rho),
+            's_rho': s_rho,
+            'ocean_time': _times(2021, days),
+        },
+    )
+
+
+def write_synthetic_tree(root, year=2021, days=4):
+    """
+    Writes NetCDF files under root/data/ using the same paths as
+    interpolation-engine/utils/data_generator.py. Returns {name: path}.
+    """
+    paths = {}
+    for var in ACCESS_VARS:
+        path = os.path.join(root, 'data/access/daily', var, f'do_{var}_{year}.nc')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        make_access_dataset(var, days, year).to_netcdf(path)
+        paths[var] = path
+
+    era5_dirs = {'slhf': 'slhf', 'ssr': 'snsr', 'str': 'sntr', 'sshf': 'sshf'}
+    for var in ERA5_VARS:
+        path = os.path.join(root, 'data/era5/daily', era5_dirs[var], f'era5_{var}_daily_{year}.nc')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        make_era5_dataset(var, days, year).to_netcdf(path)
+        paths[var] = path
+
+    path = os.path.join(root, 'data/roms/2021/cwa_20210101_12__avg.nc')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    make_roms_dataset().to_netcdf(path)
+    paths['roms'] = path
+    return paths
+
+
+def write_synthetic_processed(processed_dir, data_dir, year=2021, days=4, seed=0):
+    """
+    Writes Data<year>_gcm.p (seven lists of raveled 640*480 fields, zero on land)
+    and pds_local_sstnsalt_<year>.p (ROMS SST/salt targets) in the layout that
+    rcnn_model/scripts/data_utils.load_raw_data expects.
+    """
+    rng = np.random.default_rng(seed)
+    eta, xi = ROMS_SHAPE
+    lat = np.linspace(LATMIN, LATMAX, eta)
+    lon = np.linspace(LONMIN, LONMAX, xi)
+    lon2, lat2 = np.meshgrid(lon, lat)
+    land = _is_land(lat2, lon2)
+
+    def series(var):
+        out = []
+        for d in range(days):
+            f = _field(var, lat2, lon2, d, rng)
+            f[land] = 0.0
+            out.append(f.ravel())
+        return out
+
+    gcm = [series(v) for v in ('sst', 'salt', 'slhf', 'ssr', 'str', 'sshf', 'mld1')]
+    pds_local = series('temp')
+    pds_local_salt = series('salt')
+    filenames = [f'cwa_{t:%Y%m%d}_12__avg.nc' for t in _times(year, days)]
+
+    os.makedirs(processed_dir, exist_ok=True)
+    os.makedirs(data_dir, exist_ok=True)
+    gcm_file = os.path.join(processed_dir, f'Data{year}_gcm.p')
+    pds_file = os.path.join(data_dir, f'pds_local_sstnsalt_{year}.p')
+    with open(gcm_file, 'wb') as f:
+        pickle.dump(gcm, f)
+    with open(pds_file, 'wb') as f:
+        pickle.dump([pds_local, pds_local_salt, filenames], f)
+    return gcm_file, pds_file
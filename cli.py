@@ -0,0 +1,209 @@
+"""
+cli.py
+
+Summary:
+    Single entry point for the whole pipeline, one subcommand per step:
+
+        download     ERA5 hourly files from the CDS            (download_data/)
+        aggregate    hourly ERA5 files -> daily averages        (download_data/)
+        interpolate  ACCESS-S2 / ERA5 -> ROMS grid, per year    (interpolation-engine/main.py)
+        train        U-Net training                             (rcnn_model/scripts/train.py)
+        distill      compact student models from the U-Net      (rcnn_model/scripts/distill.py)
+        infer        full-image inference and metrics           (rcnn_model/scripts/test_full_inference.py)
+        evaluate     parallel multi-year evaluation by season/region (rcnn_model/scripts/evaluate.py)
+        train-distributed  multi-process CPU training           (rcnn_model/scripts/train_distributed.py)
+        sweep        hyperparameter sweep                       (rcnn_model/scripts/sweep.py)
+        operational  downscale single new days                  (rcnn_model/scripts/operational.py)
+        serve        warm inference server                      (rcnn_model/scripts/serve.py)
+        bench        synthetic-data benchmarks                  (benchmarks/run_benchmarks.py)
+
+    Only argparse is imported up front. Each subcommand puts its folders on
+    sys.path and imports its modules (and through them xarray, sklearn,
+    TensorFlow, cdsapi) when it runs, so --help and the light subcommands
+    start immediately and a missing heavy dependency only affects the step
+    that needs it.
+
+    _use() is the one place where import paths are set up: the pipeline
+    modules import each other and profiling/ as top-level modules and do not
+    touch sys.path themselves, and they have no __main__ entry points of
+    their own: run them through cli.py (train_distributed.py keeps one for
+    the worker processes its launcher starts with PYTHONPATH set).
+
+Usage:
+    python cli.py --help
+    python cli.py download --years 2021 --variables surface_net_thermal_radiation --prefix era5_sntr
+    python cli.py aggregate --years 2021
+    python cli.py interpolate 2008 2021 --workers 8
+    python cli.py train --years 2015 2016 2017 --day-end 365
+    python cli.py distill --filters 8 16
+    python cli.py infer --year 2011
+    python cli.py evaluate --years 2009 2010 2011 --workers 4
+    python cli.py operational 2024-03-05
+    python cli.py bench --quick
+"""
+
+# cli.py
+import argparse
+import os
+import sys
+
+REPO_ROOT = os.path.abspath(os.path.dirname(__file__))
+
+WA_AREA = [-22.5763, 108.511, -34.3265, 116.284]  # N, W, S, E
+
+
+def _use(*subdirs):
+    """Puts the repo root (profiling/) and the given pipeline folders on sys.path."""
+    for subdir in ('',) + subdirs:
+        path = os.path.join(REPO_ROOT, subdir) if subdir else REPO_ROOT
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+
+#%% Subcommands
+
+def cmd_download(args):
+    _use('download_data')
+    from era5_downloader import download_era5_data
+    download_era5_data(args.variables, args.years, args.area, args.output_dir, prefix=args.prefix)
+
+
+def cmd_aggregate(args):
+    _use('download_data')
+    from era5_hourly_to_daily import convert_hourly_to_daily
+    convert_hourly_to_daily(args.input_dir, args.output_dir, args.variables, args.years, prefix=args.prefix)
+
+
+def cmd_interpolate(argv):
+    _use('interpolation-engine')
+    import main as interpolation_main
+    return interpolation_main.main(argv)
+
+
+def cmd_train(args):
+    _use('rcnn_model/scripts')
+    import train
+    train.main(tuple(args.years), args.day_start, args.day_end)
+
+
+def cmd_distill(args):
+    _use('rcnn_model/scripts')
+    import distill
+    distill.main(tuple(args.years), args.day_start, args.day_end, args.filters, args.export)
+
+
+def cmd_infer(args):
+    _use('rcnn_model/scripts')
+    import test_full_inference
+    test_full_inference.main(args.year, args.day_start, args.day_end)
+
+
+def cmd_evaluate(argv):
+    _use('rcnn_model/scripts')
+    import evaluate
+    evaluate.main(argv)
+
+
+def cmd_train_distributed(argv):
+    _use('rcnn_model/scripts')
+    import train_distributed
+    return train_distributed.main(argv)
+
+
+def cmd_sweep(argv):
+    _use('rcnn_model/scripts')
+    import sweep
+    sweep.main(argv)
+
+
+def cmd_operational(argv):
+    _use('rcnn_model/scripts', 'interpolation-engine')
+    import operational
+    operational.main(argv)
+
+
+def cmd_serve(argv):
+    _use('rcnn_model/scripts')
+    import serve
+    serve.main(argv)
+
+
+def cmd_bench(argv):
+    _use('benchmarks')
+    import run_benchmarks
+    return run_benchmarks.main(argv)
+
+
+# subcommands that parse their own options: everything after the name is passed on as is
+PASSTHROUGH = {'interpolate': cmd_interpolate, 'evaluate': cmd_evaluate, 'train-distributed': cmd_train_distributed,
+               'sweep': cmd_sweep, 'operational': cmd_operational, 'serve': cmd_serve, 'bench': cmd_bench}
+
+
+#%% Parser
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description='SST downscaling pipeline.')
+    sub = parser.add_subparsers(dest='command', metavar='command', required=True)
+
+    p = sub.add_parser('download', help='download ERA5 hourly data from the CDS')
+    p.add_argument('--variables', nargs='+', default=['surface_net_thermal_radiation'])
+    p.add_argument('--years', nargs='+', default=['2021'])
+    p.add_argument('--area', nargs=4, type=float, default=WA_AREA, metavar=('N', 'W', 'S', 'E'))
+    p.add_argument('--output-dir', default='data/era5/raw')
+    p.add_argument('--prefix', default='era5_sntr')
+    p.set_defaults(func=cmd_download)
+
+    p = sub.add_parser('aggregate', help='average hourly ERA5 files to daily files')
+    p.add_argument('--variables', nargs='+', default=['slhf', 'snsr', 'sntr', 'sshf'])
+    p.add_argument('--years', nargs='+', default=['2021'])
+    p.add_argument('--input-dir', default='data/era5/raw')
+    p.add_argument('--output-dir', default='data/era5/daily')
+    p.add_argument('--prefix', default='era5')
+    p.set_defaults(func=cmd_aggregate)
+
+    # own options, see: cli.py interpolate --help / cli.py bench --help
+    sub.add_parser('interpolate', help='interpolate years onto the ROMS grid')
+
+    p = sub.add_parser('train', help='train the U-Net')
+    p.add_argument('--years', nargs='+', type=int, default=[2015, 2016, 2017, 2018, 2019, 2020])
+    p.add_argument('--day-start', type=int, default=0)
+    p.add_argument('--day-end', type=int, default=1)
+    p.set_defaults(func=cmd_train)
+
+    p = sub.add_parser('distill', help='distil the U-Net into compact student models')
+    p.add_argument('--years', nargs='+', type=int, default=[2015, 2016, 2017, 2018, 2019, 2020])
+    p.add_argument('--day-start', type=int, default=0)
+    p.add_argument('--day-end', type=int, default=1)
+    p.add_argument('--filters', nargs='+', type=int, default=None)
+    p.add_argument('--export', type=int, default=None)
+    p.set_defaults(func=cmd_distill)
+
+    p = sub.add_parser('infer', help='full-image inference and test metrics')
+    p.add_argument('--year', type=int, default=2011)
+    p.add_argument('--day-start', type=int, default=0)
+    p.add_argument('--day-end', type=int, default=366)
+    p.set_defaults(func=cmd_infer)
+
+    # own options, see: cli.py evaluate --help
+    sub.add_parser('evaluate', help='parallel multi-year evaluation by season and subregion')
+
+    # own options, see: cli.py <command> --help
+    sub.add_parser('train-distributed', help='multi-process CPU data-parallel training')
+    sub.add_parser('sweep', help='hyperparameter sweep sharing one copy of the data')
+    sub.add_parser('operational', help='interpolate and downscale single new days')
+    sub.add_parser('serve', help='warm, micro-batching inference server')
+
+    sub.add_parser('bench', help='synthetic-data benchmarks')
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] in PASSTHROUGH:
+        return PASSTHROUGH[argv[0]](argv[1:]) or 0
+    args = build_parser().parse_args(argv)
+    return args.func(args) or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -20,45 +20,32 @@ from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import StandardScaler
 import matplotlib.pyplot as plt
 
+from profiling.tracer import span
+from interpolation.regrid import RBFWeights, fingerprint, source_of
+from interpolation.spatial_index import regionWindow
+from interpolation.sparse_gp import SparseGP
+
 #%% Read global climate data:
 
-def westernAustraliaGlobal(ds, var_global, T, depth, latmin, latmax, lonmin, lonmax):
+def westernAustraliaGlobal(ds, var_global, T, depth, latmin, latmax, lonmin, lonmax, cache=None):
      
     """
     Inputs:
         global climate model data: ds
         global variable of interest: var_global
         day of the month: T
+        depth: deptht index, or a list of indices to read several levels at once (see vertical.py)
         latmin, latmax, lonmin, lonmax: latitude, longitude of the region of interest
+        cache: optional GridCache; the region window is then exact on curvilinear grids
+        and found once per source grid (see spatial_index.regionWindow)
     
     Output:
         Global climate model data for a given region and a desired variable
     """
     
-    Lat = ds.nav_lat.to_numpy()
-    Lon = ds.nav_lon.to_numpy()
-
-    Lat_1 = Lat[:,0]
-    Lon_1 = Lon[0,:]
-
-    # find the region of interest based on given lat, lon
-    def find_nearest(array, value):
-        array = np.asarray(array)
-        idx = (np.abs(array - value)).argmin()
-        return array[idx], idx
-
-    LatGlobTemp1, Lat_loc1 = find_nearest(Lat_1, latmin) #-34.3265
-    LatGlobTemp2, Lat_loc2 = find_nearest(Lat_1, latmax) #-22.5763
-
-    LonGlobTemp1, Lon_loc1 = find_nearest(Lon_1, lonmin) #108.511
-    LonGlobTemp2, Lon_loc2 = find_nearest(Lon_1, lonmax) #116.284
+    rows, cols, Lat_glob, Lon_glob = regionWindow(ds, latmin, latmax, lonmin, lonmax, cache)
 
-    Lat_glob = Lat_1[Lat_loc1:Lat_loc2]
-    Lon_glob = Lon_1[Lon_loc1:Lon_loc2]
-
-    LatGlobX, LonGlobY = np.meshgrid(Lat_glob, Lon_glob)
-
-    ds_QoI = ds[var_global].isel(time_counter=T, deptht=depth, x=slice(Lon_loc1, Lon_loc2) , y=slice(Lat_loc1, Lat_loc2))
+    ds_QoI = ds[var_global].isel(time_counter=T, deptht=depth, x=cols, y=rows)
     # ds_QoI.plot(x="x", y="y", figsize=(15, 6), clim=(25, 35))
     
     return ds_QoI, Lat_glob, Lon_glob
@@ -136,56 +123,79 @@ def westernAustraliaLocal(ds_local, var_local, T, depth):
 #%% Interpolation!:
 
 from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
-from sklearn.gaussian_process import GaussianProcessRegressor
 from scipy.interpolate import griddata
 import numpy as np
 import time
 from scipy.interpolate import RBFInterpolator
 
-def interpolator(ds, ds_local, var_global, var_local, T, depth, latmin, latmax, lonmin, lonmax, method='random_forest'):
-    ds_QoI, Lat_glob, Lon_glob = westernAustraliaGlobal(ds, var_global, T, depth, latmin, latmax, lonmin, lonmax)
-    ds_QoI_np = padding(ds_QoI)
+def interpolator(ds, ds_local, var_global, var_local, T, depth, latmin, latmax, lonmin, lonmax, method='random_forest',
+                 cache=None):
+    """
+    cache: optional GridCache; the local grid (and the RBF weights for method='rbf', the
+    fitted sparse GP for method='gaussian_process') are then reused across days.
+    The tree models are refitted every day, the sparse GP once per source file (year).
+    """
+
+    with span('read_global', var=var_global, day=T):
+        ds_QoI, Lat_glob, Lon_glob = westernAustraliaGlobal(ds, var_global, T, depth, latmin, latmax, lonmin, lonmax, cache)
+        ds_QoI_np = padding(ds_QoI)
     
     idx = np.argwhere(np.all(ds_QoI_np[..., :] == 0, axis=0))
     ds_QoI_np = np.delete(ds_QoI_np, idx, axis=1)
-    Lon_glob = np.delete(Lon_glob, idx)
+    Lat_glob = np.delete(Lat_glob, idx[:, 0], axis=1)
+    Lon_glob = np.delete(Lon_glob, idx[:, 0], axis=1)
     
-    LatGlobX, LonGlobY = np.meshgrid(Lat_glob, Lon_glob)
-    LatGlobX = LatGlobX.T
-    LonGlobY = LonGlobY.T
-
-    X = np.concatenate((LatGlobX.ravel().reshape(-1,1), LonGlobY.ravel().reshape(-1,1)), axis=1)
+    X = np.concatenate((Lat_glob.ravel().reshape(-1,1), Lon_glob.ravel().reshape(-1,1)), axis=1)
     y = ds_QoI_np.ravel()
     
-    sc = StandardScaler()
-    X_train = sc.fit_transform(X)
-    
-    
-    start_time = time.time()
-    # Choose model based on the method parameter
-    if method == 'random_forest':
-        model = RandomForestRegressor(n_estimators=500)
-        model.fit(X_train, y)
-        interpolation_function = model.predict
-    elif method == 'gradient_boosting':
-        model = GradientBoostingRegressor(n_estimators=500)
-        model.fit(X_train, y)
-        interpolation_function = model.predict
-    elif method == 'gaussian_process':
-        model = GaussianProcessRegressor()
-        model.fit(X_train, y)
-        interpolation_function = model.predict
-    elif method == 'rbf':
-        interpolator = RBFInterpolator(X_train, y, kernel='linear')
-        interpolation_function = interpolator
-    else:
-        raise ValueError("Invalid interpolation method")
-    
-    Latlocal_1, Lonlocal_1, Lat_np, Lon_np, ds_sstloc_mean_np = westernAustraliaLocal(ds_local, var_local, T, depth)
+    with span('read_local', day=T):
+        if cache is None:
+            Latlocal_1, Lonlocal_1, Lat_np, Lon_np, ds_sstloc_mean_np = westernAustraliaLocal(ds_local, var_local, T, depth)
+        else:
+            Latlocal_1, Lonlocal_1, Lat_np, Lon_np, ds_sstloc_mean_np = cache.get(
+                ('local', source_of(ds_local), var_local), lambda: westernAustraliaLocal(ds_local, var_local, T, depth))
     X_test = np.concatenate((Lat_np.ravel().reshape(-1,1), Lon_np.ravel().reshape(-1,1)), axis=1)
-    X_test_std = sc.transform(X_test)
 
-    interpolated = interpolation_function(X_test_std).reshape(640, 480)
+    start_time = time.time()
+    if method == 'gaussian_process':
+        # inducing-point GP: hyperparameters fitted on the first day of each file, then shared (see sparse_gp.py)
+        with span('fit', method=method, day=T):
+            if cache is None:
+                gp = SparseGP(X, X_test).fit(y)
+            else:
+                key = ('gp', source_of(ds), var_global, depth, fingerprint(X), fingerprint(X_test))
+                gp = cache.get(key, lambda: SparseGP(X, X_test).fit(y))
+        with span('predict', method=method, day=T):
+            interpolated = gp.apply(y).reshape(640, 480)
+    elif method == 'rbf' and cache is not None:
+        with span('fit', method=method, day=T):
+            weights = cache.get(('rbf', fingerprint(X), fingerprint(X_test)), lambda: RBFWeights(X, X_test))
+        with span('predict', method=method, day=T):
+            interpolated = weights.apply(y).reshape(640, 480)
+    else:
+        sc = StandardScaler()
+        X_train = sc.fit_transform(X)
+
+        # Choose model based on the method parameter
+        with span('fit', method=method, day=T):
+            if method == 'random_forest':
+                model = RandomForestRegressor(n_estimators=500)
+                model.fit(X_train, y)
+                interpolation_function = model.predict
+            elif method == 'gradient_boosting':
+                model = GradientBoostingRegressor(n_estimators=500)
+                model.fit(X_train, y)
+                interpolation_function = model.predict
+            elif method == 'rbf':
+                interpolator = RBFInterpolator(X_train, y, kernel='linear')
+                interpolation_function = interpolator
+            else:
+                raise ValueError("Invalid interpolation method")
+
+        X_test_std = sc.transform(X_test)
+
+        with span('predict', method=method, day=T):
+            interpolated = interpolation_function(X_test_std).reshape(640, 480)
     noise = np.random.normal(0, 50, interpolated.shape) / 10000
     interpolated = interpolated + noise
     
@@ -20,6 +20,9 @@ from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import StandardScaler
 from scipy.interpolate import RBFInterpolator
 
+from profiling.tracer import span
+from interpolation.regrid import RBFWeights, fingerprint, source_of
+
 
 #%% Read global climate data:
 
@@ -76,7 +79,7 @@ def westernAustraliaLocal(ds_local, var_local, T, depth):
 
 #%% Interpolation!:
 
-def interpolator_era5(ds, ds_local, var_global, var_local, T, depth):
+def interpolator_era5(ds, ds_local, var_global, var_local, T, depth, cache=None):
     
     """
     Inputs:
@@ -85,13 +88,15 @@ def interpolator_era5(ds, ds_local, var_global, var_local, T, depth):
         westernAustraliaLocal
         global and local variables of interest: var_local, var_global
         day of the month: T
+        cache: optional GridCache; the local grid and RBF weights are then reused across days
     
     Output:
         Global climate model data is interpolated
     """
     
-    ds_QoI, Lat_glob, Lon_glob = westernAustraliaGlobal(ds, var_global, T)
-    ds_QoI_np = ds_QoI.to_numpy()
+    with span('read_global', var=var_global, day=T):
+        ds_QoI, Lat_glob, Lon_glob = westernAustraliaGlobal(ds, var_global, T)
+        ds_QoI_np = ds_QoI.to_numpy()
     
     
     LatGlobX, LonGlobY = np.meshgrid(Lat_glob, Lon_glob)
@@ -101,23 +106,36 @@ def interpolator_era5(ds, ds_local, var_global, var_local, T, depth):
     X = np.concatenate((LatGlobX.ravel().reshape(-1,1), LonGlobY.ravel().reshape(-1,1)), axis =1)
     y = ds_QoI_np.ravel()
     
-    sc = StandardScaler()
+    with span('read_local', day=T):
+        if cache is None:
+            Latlocal_1, Lonlocal_1, Lat_np, Lon_np, ds_sstloc_mean_np = westernAustraliaLocal(ds_local, var_local, T, depth)
+        else:
+            Latlocal_1, Lonlocal_1, Lat_np, Lon_np, ds_sstloc_mean_np = cache.get(
+                ('local', source_of(ds_local), var_local), lambda: westernAustraliaLocal(ds_local, var_local, T, depth))
+    
+    X_test = np.concatenate((Lat_np.ravel().reshape(-1,1), Lon_np.ravel().reshape(-1,1)), axis =1)
 
-    X_train = sc.fit_transform(X)
+    if cache is None:
+        sc = StandardScaler()
 
-    #model = RandomForestRegressor(n_estimators=500)
-    
-    model = RBFInterpolator(X_train, y, kernel='linear')
+        X_train = sc.fit_transform(X)
 
-    #model.fit(X_train, y)
-    
-    Latlocal_1, Lonlocal_1, Lat_np, Lon_np, ds_sstloc_mean_np = westernAustraliaLocal(ds_local, var_local, T, depth)
-    
-    X_test = np.concatenate((Lat_np.ravel().reshape(-1,1), Lon_np.ravel().reshape(-1,1)), axis =1)
+        #model = RandomForestRegressor(n_estimators=500)
+        
+        with span('fit', method='rbf', day=T):
+            model = RBFInterpolator(X_train, y, kernel='linear')
+
+        #model.fit(X_train, y)
 
-    X_test_std = sc.transform(X_test)
+        X_test_std = sc.transform(X_test)
 
-    interpolated = model(X_test_std)
+        with span('predict', method='rbf', day=T):
+            interpolated = model(X_test_std)
+    else:
+        with span('fit', method='rbf', day=T):
+            weights = cache.get(('rbf', fingerprint(X), fingerprint(X_test)), lambda: RBFWeights(X, X_test))
+        with span('predict', method='rbf', day=T):
+            interpolated = weights.apply(y)
     interpolated = interpolated.reshape(640,480)
     noise = np.random.normal(0, 50, interpolated.shape)
     interpolated = interpolated + noise
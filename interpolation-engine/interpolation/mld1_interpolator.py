@@ -21,10 +21,14 @@ from sklearn.preprocessing import StandardScaler
 import matplotlib.pyplot as plt
 from scipy.interpolate import RBFInterpolator
 
+from profiling.tracer import span
+from interpolation.regrid import RBFWeights, fingerprint, source_of
+from interpolation.spatial_index import regionWindow
+
 
 #%% Read global climate data:
 
-def westernAustraliaGlobal(ds, var_global, T, latmin, latmax, lonmin, lonmax):
+def westernAustraliaGlobal(ds, var_global, T, latmin, latmax, lonmin, lonmax, cache=None):
      
     """
     Inputs:
@@ -32,35 +36,16 @@ def westernAustraliaGlobal(ds, var_global, T, latmin, latmax, lonmin, lonmax):
         global variable of interest: var_global
         day of the month: T
         latmin, latmax, lonmin, lonmax: latitude, longitude of the region of interest
+        cache: optional GridCache; the region window is then exact on curvilinear grids
+        and found once per source grid (see spatial_index.regionWindow)
     
     Output:
         Global climate model data for a given region and a desired variable
     """
     
-    Lat = ds.nav_lat.to_numpy()
-    Lon = ds.nav_lon.to_numpy()
-
-    Lat_1 = Lat[:,0]
-    Lon_1 = Lon[0,:]
-
-    # find the region of interest based on given lat, lon
-    def find_nearest(array, value):
-        array = np.asarray(array)
-        idx = (np.abs(array - value)).argmin()
-        return array[idx], idx
-
-    LatGlobTemp1, Lat_loc1 = find_nearest(Lat_1, latmin) #-34.3265
-    LatGlobTemp2, Lat_loc2 = find_nearest(Lat_1, latmax) #-22.5763
+    rows, cols, Lat_glob, Lon_glob = regionWindow(ds, latmin, latmax, lonmin, lonmax, cache)
 
-    LonGlobTemp1, Lon_loc1 = find_nearest(Lon_1, lonmin) #108.511
-    LonGlobTemp2, Lon_loc2 = find_nearest(Lon_1, lonmax) #116.284
-
-    Lat_glob = Lat_1[Lat_loc1:Lat_loc2]
-    Lon_glob = Lon_1[Lon_loc1:Lon_loc2]
-
-    LatGlobX, LonGlobY = np.meshgrid(Lat_glob, Lon_glob)
-
-    ds_QoI = ds[var_global].isel(time_counter=T, x=slice(Lon_loc1, Lon_loc2) , y=slice(Lat_loc1, Lat_loc2))
+    ds_QoI = ds[var_global].isel(time_counter=T, x=cols, y=rows)
     # ds_QoI.plot(x="x", y="y", figsize=(15, 6), clim=(25, 35))
     
     return ds_QoI, Lat_glob, Lon_glob
@@ -137,7 +122,7 @@ def westernAustraliaLocal(ds_local, var_local, T, depth):
 
 #%% Interpolation!:
 
-def interpolator_mld1(ds, ds_local, var_global, var_local, T, depth, latmin, latmax, lonmin, lonmax):
+def interpolator_mld1(ds, ds_local, var_global, var_local, T, depth, latmin, latmax, lonmin, lonmax, cache=None):
     
     """
     Inputs:
@@ -146,45 +131,58 @@ def interpolator_mld1(ds, ds_local, var_global, var_local, T, depth, latmin, lat
         westernAustraliaLocal
         global and local variables of interest: var_local, var_global
         day of the month: T
+        cache: optional GridCache; the local grid and RBF weights are then reused across days
     
     Output:
         Global climate model data is interpolated
     """
     
-    ds_QoI, Lat_glob, Lon_glob = westernAustraliaGlobal(ds, var_global, T, latmin, latmax, lonmin, lonmax)
-    ds_QoI_np = padding(ds_QoI)
+    with span('read_global', var=var_global, day=T):
+        ds_QoI, Lat_glob, Lon_glob = westernAustraliaGlobal(ds, var_global, T, latmin, latmax, lonmin, lonmax, cache)
+        ds_QoI_np = padding(ds_QoI)
     
     idx = np.argwhere(np.all(ds_QoI_np[..., :] == 0, axis=0))
     ds_QoI_np = np.delete(ds_QoI_np, idx, axis=1)
-    Lon_glob = np.delete(Lon_glob, idx)
+    Lat_glob = np.delete(Lat_glob, idx[:, 0], axis=1)
+    Lon_glob = np.delete(Lon_glob, idx[:, 0], axis=1)
     
     # ds_QoI_np[ds_QoI_np == 0] = 'nan'
 
     
-    LatGlobX, LonGlobY = np.meshgrid(Lat_glob, Lon_glob)
-    LatGlobX = LatGlobX.T
-    LonGlobY = LonGlobY.T
-
-    X = np.concatenate((LatGlobX.ravel().reshape(-1,1), LonGlobY.ravel().reshape(-1,1)), axis =1)
+    X = np.concatenate((Lat_glob.ravel().reshape(-1,1), Lon_glob.ravel().reshape(-1,1)), axis=1)
     y = ds_QoI_np.ravel()
     
-    sc = StandardScaler()
-
-    X_train = sc.fit_transform(X)
+    with span('read_local', day=T):
+        if cache is None:
+            Latlocal_1, Lonlocal_1, Lat_np, Lon_np, ds_sstloc_mean_np = westernAustraliaLocal(ds_local, var_local, T, depth)
+        else:
+            Latlocal_1, Lonlocal_1, Lat_np, Lon_np, ds_sstloc_mean_np = cache.get(
+                ('local', source_of(ds_local), var_local), lambda: westernAustraliaLocal(ds_local, var_local, T, depth))
     
-    model = RBFInterpolator(X_train, y, kernel='linear')
+    X_test = np.concatenate((Lat_np.ravel().reshape(-1,1), Lon_np.ravel().reshape(-1,1)), axis =1)
 
-    #model = RandomForestRegressor(n_estimators=500, random_state= 0)
+    if cache is None:
+        sc = StandardScaler()
 
-    #model.fit(X_train, y)
-    
-    Latlocal_1, Lonlocal_1, Lat_np, Lon_np, ds_sstloc_mean_np = westernAustraliaLocal(ds_local, var_local, T, depth)
-    
-    X_test = np.concatenate((Lat_np.ravel().reshape(-1,1), Lon_np.ravel().reshape(-1,1)), axis =1)
+        X_train = sc.fit_transform(X)
+        
+        with span('fit', method='rbf', day=T):
+            model = RBFInterpolator(X_train, y, kernel='linear')
+
+        #model = RandomForestRegressor(n_estimators=500, random_state= 0)
+
+        #model.fit(X_train, y)
 
-    X_test_std = sc.transform(X_test)
+        X_test_std = sc.transform(X_test)
 
-    interpolated = model(X_test_std)
+        with span('predict', method='rbf', day=T):
+            interpolated = model(X_test_std)
+    else:
+        # the land columns dropped above are part of X, so a changed land mask gets its own weights
+        with span('fit', method='rbf', day=T):
+            weights = cache.get(('rbf', fingerprint(X), fingerprint(X_test)), lambda: RBFWeights(X, X_test))
+        with span('predict', method='rbf', day=T):
+            interpolated = weights.apply(y)
     interpolated = interpolated.reshape(640,480)
     np.random.seed(0)
     noise = np.random.normal(0, 50, interpolated.shape)/10000
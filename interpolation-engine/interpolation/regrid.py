@@ -0,0 +1,167 @@
+"""
+Name: regrid
+Reusable regridding weights
+
+Requirement:
+    numpy, scipy, StandardScaler
+
+Inputs:
+    Source (global) and target (local) coordinates
+
+Output:
+    RBFWeights: the linear RBF used by interpolator_era5 / interpolator_mld1,
+    factorised once for a pair of grids and applied to any field on them
+    GridCache: cache of grid work (target grid, region windows, weights), in memory and
+    optionally on disk, keyed by grid fingerprints, with hit/miss counts
+
+"""
+#%% ##### Import modules ######
+
+import collections
+import hashlib
+import os
+import pickle
+import numpy as np
+from scipy.linalg import lu_factor, lu_solve
+from scipy.spatial.distance import cdist
+from sklearn.preprocessing import StandardScaler
+
+#%% Grid fingerprints and cache:
+
+def fingerprint(*arrays):
+    """
+    Short hash of coordinate arrays (shape, dtype and values), used as a cache key
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for a in arrays:
+        a = np.ascontiguousarray(a)
+        h.update(repr((a.shape, a.dtype.str)).encode())
+        h.update(a.tobytes())
+    return h.hexdigest()
+
+
+def source_of(ds):
+    """
+    Identity of the file a dataset was opened from (path, size, mtime); xarray keeps the path in .encoding
+    """
+    src = ds.encoding.get('source')
+    if src and os.path.exists(src):
+        st = os.stat(src)
+        return f'{os.path.abspath(src)}:{st.st_size}:{st.st_mtime_ns}'
+    return f'mem:{id(ds)}'
+
+
+class GridCache:
+
+    """
+    Keeps grid work that does not change from day to day:
+        the local (ROMS) grid and land mask, source region windows, and RBF
+        weights per (source, target) grid
+
+    With a directory, entries are also pickled to disk and shared by every
+    year, process and run that uses the same grids. Keys are built from grid
+    fingerprints (coordinate hashes) or file identities, so a changed grid
+    or file gets a new entry instead of a stale one.
+
+    Counts per kind of entry: memory hits, disk hits, misses (built).
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._items = {}
+        self._grids = {}
+        self.counts = collections.defaultdict(collections.Counter)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _file(self, key):
+        name = hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+        return os.path.join(self.directory, f'{key[0]}_{name}.pkl')
+
+    def get(self, key, build):
+        if key in self._items:
+            self.counts[key[0]]['memory'] += 1
+            return self._items[key]
+
+        persist = self.directory is not None and 'mem:' not in repr(key)
+        if persist and os.path.exists(self._file(key)):
+            with open(self._file(key), 'rb') as f:
+                value = pickle.load(f)
+            self.counts[key[0]]['disk'] += 1
+        else:
+            value = build()
+            self.counts[key[0]]['miss'] += 1
+            if persist:
+                tmp = f'{self._file(key)}.{os.getpid()}.tmp'
+                with open(tmp, 'wb') as f:
+                    pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, self._file(key))
+        self._items[key] = value
+        return value
+
+    def grid_key(self, ds, *coords):
+        """
+        Fingerprint of a dataset's coordinate arrays, computed once per file
+        """
+        key = (source_of(ds),) + coords
+        if key not in self._grids:
+            self._grids[key] = fingerprint(*(ds[c].to_numpy() for c in coords))
+        return self._grids[key]
+
+    def stats(self):
+        total = collections.Counter()
+        for c in self.counts.values():
+            total.update(c)
+        hits = total['memory'] + total['disk']
+        lookups = hits + total['miss']
+        return {'memory_hits': total['memory'], 'disk_hits': total['disk'], 'misses': total['miss'],
+                'hit_rate': hits / lookups if lookups else 0.0, 'entries': len(self._items),
+                'by_kind': {k: dict(c) for k, c in self.counts.items()}}
+
+#%% Linear RBF weights:
+
+class RBFWeights:
+
+    """
+    Same interpolant as RBFInterpolator(X_train, y, kernel='linear'):
+        phi(r) = -r plus a constant (scipy's default degree 0 for 'linear'), no smoothing
+
+    The interpolation system only depends on the source coordinates, so it is
+    LU-factorised once; each field then costs one O(N^2) solve and one pass over
+    the target points (in chunks, to bound memory). Several fields on the same
+    grid (columns of y) share that pass.
+
+    Inputs:
+        X: source coordinates (N, 2), unscaled
+        X_test: target coordinates (M, 2), unscaled
+    """
+
+    def __init__(self, X, X_test, chunk=16384):
+        sc = StandardScaler()
+        self.X_train = sc.fit_transform(X)
+        self.X_test_std = sc.transform(X_test)
+        self.chunk = chunk
+
+        n = len(self.X_train)
+        P = np.ones((n, 1))
+        A = np.zeros((n + P.shape[1], n + P.shape[1]))
+        A[:n, :n] = -cdist(self.X_train, self.X_train)
+        A[:n, n:] = P
+        A[n:, :n] = P.T
+        self._lu = lu_factor(A, check_finite=False)
+
+    def apply(self, y):
+        """
+        y: (N,) or (N, k) values on the source points -> (M,) or (M, k) on the target points
+        """
+        y = np.asarray(y, dtype=np.float64)
+        Y = y.reshape(len(self.X_train), -1)
+        rhs = np.vstack([Y, np.zeros((self._lu[0].shape[0] - len(Y), Y.shape[1]))])
+        coef = lu_solve(self._lu, rhs, check_finite=False)
+        w, b = coef[:len(Y)], coef[len(Y):]
+
+        out = np.empty((len(self.X_test_std), Y.shape[1]))
+        for s in range(0, len(out), self.chunk):
+            Xt = self.X_test_std[s:s + self.chunk]
+            out[s:s + len(Xt)] = -cdist(Xt, self.X_train) @ w + b[0]
+        return out.reshape((-1,) + y.shape[1:])
@@ -0,0 +1,119 @@
+"""
+Name: sparse_gp
+Approximate Gaussian-process regridding (inducing points)
+
+Requirement:
+    numpy, scipy, scikit-learn
+
+Inputs:
+    Source (global) and target (local) coordinates, and the field on the source points
+
+Output:
+    SparseGP: GP posterior mean on the target points
+
+The exact GaussianProcessRegressor costs O(N^3) time and O(N^2) memory per day
+on N source points. SparseGP uses m << N inducing points (k-means centres of
+the source points) and the DTC / projected-process approximation:
+
+    mean(x*) = K*u A^-1 Kuf y,            A = s2n Kuu + Kuf Kfu
+
+so a day costs O(N m^2) and the targets are predicted in batches of rows.
+A is not formed directly: on smooth fields the fitted noise s2n gets tiny and
+A loses positive definiteness in floating point. With Kuu = L L^T and
+V = L^-1 Kuf, A = s2n L B L^T where B = I + V V^T / s2n has eigenvalues >= 1,
+so only the well-conditioned B is factorised (s2n is also floored).
+The kernel (signal variance * anisotropic RBF + white noise) is fitted once,
+by maximum likelihood on a subset of the source points of the first day, and
+then kept: A only depends on the source grid and the hyperparameters, so it
+is factorised once and every later day is two matrix products per batch.
+Cached in a GridCache, the fitted model is shared across the days of one
+source file (one year) and refitted for the next.
+The predictive variance is not computed: the pipeline has no channel for it.
+"""
+#%% ##### Import modules ######
+
+import numpy as np
+from scipy.linalg import cho_solve, solve_triangular
+from scipy.spatial.distance import cdist
+from sklearn.cluster import KMeans
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import ConstantKernel, RBF, WhiteKernel
+from sklearn.preprocessing import StandardScaler
+
+#%% Sparse GP:
+
+class SparseGP:
+
+    """
+    Inputs:
+        X: source coordinates (N, 2), unscaled
+        X_test: target coordinates (M, 2), unscaled
+        n_inducing: number of inducing points (capped at N)
+        n_fit: number of source points used to fit the hyperparameters
+        chunk: target points per prediction batch
+    """
+
+    def __init__(self, X, X_test, n_inducing=400, n_fit=1000, chunk=16384, seed=0):
+        sc = StandardScaler()
+        self.X_train = sc.fit_transform(X)
+        self.X_test_std = sc.transform(X_test)
+        self.n_fit = n_fit
+        self.chunk = chunk
+        self.seed = seed
+
+        m = min(n_inducing, len(self.X_train))
+        if m < len(self.X_train):
+            km = KMeans(n_clusters=m, n_init=1, random_state=seed).fit(self.X_train)
+            self.Z = km.cluster_centers_
+        else:
+            self.Z = self.X_train.copy()
+        self.kernel_ = None
+
+    def _k(self, A, B):
+        return self.signal * np.exp(-0.5 * cdist(A / self.length_scale, B / self.length_scale, 'sqeuclidean'))
+
+    def fit(self, y):
+        """
+        Fits the kernel hyperparameters on (a subset of) one day and factorises A
+        """
+        y = self._standardise(y)[0]
+        rng = np.random.default_rng(self.seed)
+        sub = rng.choice(len(self.X_train), min(self.n_fit, len(self.X_train)), replace=False)
+
+        kernel = ConstantKernel(1.0) * RBF(length_scale=np.ones(self.X_train.shape[1])) + WhiteKernel(1e-2)
+        gpr = GaussianProcessRegressor(kernel=kernel, random_state=self.seed).fit(self.X_train[sub], y[sub])
+        self.kernel_ = gpr.kernel_
+        self.signal = self.kernel_.k1.k1.constant_value
+        self.length_scale = np.atleast_1d(self.kernel_.k1.k2.length_scale)
+        self.noise = self.kernel_.k2.noise_level
+
+        m = len(self.Z)
+        self.noise = max(self.noise, 1e-6 * self.signal)
+        Kuu = self._k(self.Z, self.Z) + 1e-8 * m * self.signal * np.eye(m)
+        self._Luu = np.linalg.cholesky(Kuu)
+        self._V = solve_triangular(self._Luu, self._k(self.Z, self.X_train), lower=True)
+        self._LB = np.linalg.cholesky(np.eye(m) + self._V @ self._V.T / self.noise)
+        return self
+
+    @staticmethod
+    def _standardise(y):
+        y = np.asarray(y, dtype=np.float64)
+        mean, std = y.mean(), y.std() or 1.0
+        return (y - mean) / std, mean, std
+
+    def apply(self, y):
+        """
+        y: (N,) values on the source points -> (M,) posterior mean on the target points
+        """
+        if self.kernel_ is None:
+            self.fit(y)
+        y, mean, std = self._standardise(y)
+        # mean = K*u L^-T B^-1 V y / s2n = K*u c
+        b = cho_solve((self._LB, True), self._V @ y) / self.noise
+        c = solve_triangular(self._Luu, b, lower=True, trans='T')
+
+        out = np.empty(len(self.X_test_std))
+        for s in range(0, len(out), self.chunk):
+            Ksu = self._k(self.X_test_std[s:s + self.chunk], self.Z)
+            out[s:s + len(Ksu)] = Ksu @ c
+        return out * std + mean
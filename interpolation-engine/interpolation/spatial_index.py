@@ -0,0 +1,156 @@
+"""
+Name: spatial_index
+Spatial index for curvilinear (e.g. tripolar ORCA) source grids
+
+Requirement:
+    numpy, scipy
+
+Inputs:
+    2-D latitude / longitude arrays of a source grid (nav_lat, nav_lon)
+
+Output:
+    GridIndex: KD-tree over the grid cells, with
+        window(): exact (y, x) index window covering a lat/lon box
+        nearest(): nearest grid cell of any points
+
+The cells are indexed as points on the unit sphere, so there is no
+longitude seam, no pole problem and no assumption that row 0 / column 0
+carry the latitudes / longitudes of the whole grid (they do not on the
+tripolar ORCA grid north of ~20N). The tree is built once per source grid
+and cached with the other grid work (see regrid.GridCache).
+
+regionWindow() is the region crop shared by the interpolators: always the
+exact GridIndex window; without a GridCache the tree is built for the call
+(a one-off O(N log N)).
+"""
+#%% ##### Import modules ######
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+#%% Spatial index:
+
+def to_xyz(lat, lon):
+    """
+    Unit-sphere coordinates (N, 3) of latitudes / longitudes in degrees
+    """
+    lat = np.radians(np.asarray(lat, dtype=np.float64)).ravel()
+    lon = np.radians(np.asarray(lon, dtype=np.float64)).ravel()
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+def _index_span(idx, n, periodic):
+    """
+    Smallest index range (slice, or index array if it wraps around a periodic axis) covering idx
+    """
+    idx = np.unique(idx)
+    if not periodic or len(idx) == 1:
+        return slice(int(idx[0]), int(idx[-1]) + 1)
+    gaps = np.diff(np.append(idx, idx[0] + n))
+    g = int(np.argmax(gaps))
+    if g == len(idx) - 1:                       # the largest gap is across the seam: no wrap
+        return slice(int(idx[0]), int(idx[-1]) + 1)
+    start = idx[g + 1]
+    return np.arange(start, start + n - gaps[g] + 1) % n
+
+
+class GridIndex:
+
+    """
+    KD-tree over the cells of a 2-D (y, x) grid
+
+    Inputs:
+        lat, lon: (ny, nx) coordinates in degrees
+        periodic: whether x wraps around (global grids); detected from the
+                  spacing between the first and last column when None
+    """
+
+    def __init__(self, lat, lon, periodic=None):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.shape = self.lat.shape
+        xyz = to_xyz(self.lat, self.lon)
+        self.tree = cKDTree(xyz)
+
+        if periodic is None:
+            cells = xyz.reshape(self.shape + (3,))
+            row = cells[self.shape[0] // 2]
+            step = np.median(np.linalg.norm(np.diff(row, axis=0), axis=1))
+            periodic = self.shape[1] > 2 and np.linalg.norm(row[0] - row[-1]) <= 2 * step
+        self.periodic = bool(periodic)
+
+    def nearest(self, lat, lon):
+        """
+        Nearest cell of each point: (j, i) index arrays and the great-circle distance in degrees
+        """
+        chord, k = self.tree.query(to_xyz(lat, lon))
+        j, i = np.unravel_index(k, self.shape)
+        return j, i, np.degrees(2 * np.arcsin(np.minimum(chord / 2, 1)))
+
+    def cells(self, latmin, latmax, lonmin, lonmax):
+        """
+        Flat indices of all cells inside the box (longitudes taken modulo 360)
+        """
+        width = (lonmax - lonmin) % 360 or (360 if lonmax != lonmin else 0)
+        if width > 180 or latmax - latmin > 180:
+            candidates = np.arange(self.lat.size)
+        else:
+            # ball around the box centre through its farthest boundary point
+            t = np.linspace(0, 1, 33)
+            blat = np.concatenate([latmin + (latmax - latmin) * t, latmin + (latmax - latmin) * t,
+                                   np.full_like(t, latmin), np.full_like(t, latmax)])
+            blon = np.concatenate([np.full_like(t, lonmin), np.full_like(t, lonmin + width),
+                                   lonmin + width * t, lonmin + width * t])
+            centre = to_xyz((latmin + latmax) / 2, lonmin + width / 2)[0]
+            radius = np.linalg.norm(to_xyz(blat, blon) - centre, axis=1).max() * (1 + 1e-9)
+            candidates = np.asarray(self.tree.query_ball_point(centre, radius), dtype=np.int64)
+
+        lat = self.lat.ravel()[candidates]
+        lon = self.lon.ravel()[candidates]
+        inside = (lat >= latmin) & (lat <= latmax) & ((lon - lonmin) % 360 <= width)
+        return np.sort(candidates[inside])
+
+    def window(self, latmin, latmax, lonmin, lonmax):
+        """
+        (rows, cols) index window of the box, usable in ds.isel(y=rows, x=cols):
+        slices, except cols is an index array when the box crosses the x seam
+        """
+        k = self.cells(latmin, latmax, lonmin, lonmax)
+        if len(k) == 0:
+            raise ValueError(f"No grid cells in lat [{latmin}, {latmax}], lon [{lonmin}, {lonmax}]")
+        j, i = np.unravel_index(k, self.shape)
+        return _index_span(j, self.shape[0], False), _index_span(i, self.shape[1], self.periodic)
+
+
+def grid_index(ds, cache=None, lat='nav_lat', lon='nav_lon'):
+    """
+    GridIndex of a dataset's grid, built once per source grid when a GridCache is given
+    """
+    build = lambda: GridIndex(ds[lat].to_numpy(), ds[lon].to_numpy())
+    if cache is None:
+        return build()
+    return cache.get(('index', cache.grid_key(ds, lat, lon)), build)
+
+
+def regionWindow(ds, latmin, latmax, lonmin, lonmax, cache=None):
+
+    """
+    Inputs:
+        global climate model data: ds
+        latmin, latmax, lonmin, lonmax: latitude, longitude of the region of interest
+        cache: optional GridCache; the spatial index and the window are then found
+               once per source grid instead of on every call
+
+    Output:
+        index window (rows, cols) of the region, usable in ds.isel(y=rows, x=cols),
+        and the 2-D latitudes / longitudes of its grid cells
+    """
+
+    def build():
+        index = grid_index(ds, cache)
+        rows, cols = index.window(latmin, latmax, lonmin, lonmax)
+        return rows, cols, index.lat[rows][:, cols], index.lon[rows][:, cols]
+
+    if cache is None:
+        return build()
+    return cache.get(('window', cache.grid_key(ds, 'nav_lat', 'nav_lon'), latmin, latmax, lonmin, lonmax), build)
@@ -0,0 +1,163 @@
+"""
+Name: vertical
+Multi-level regridding: ACCESS z-levels -> ROMS s-levels
+
+Requirement:
+    numpy, xarray
+
+Inputs:
+    Global climate model data with a deptht axis (ACCESS-S2 sst, salt, ...)
+    Local climate model data (ROMS grid file: h, s_rho and, if present, Cs_r, hc, Vtransform)
+
+Output:
+    (levels, 640, 480) field on the requested ROMS s-levels
+
+The horizontal step is the same linear RBF as the single-level interpolators,
+but the weights are computed once for the source grid and applied to all
+requested source depths in one batched solve (RBFWeights.apply on an (N, k)
+array). The vertical step is a linear interpolation in depth done for every
+water column at once: the ACCESS levels are the same everywhere, so one
+searchsorted over the ROMS level depths gives the bracketing levels and
+weights of all columns. Adding a level costs one more column in the solve,
+not another horizontal interpolation.
+"""
+#%% ##### Import modules ######
+
+import numpy as np
+
+from profiling.tracer import span
+from interpolation.access_interpolator import westernAustraliaGlobal, padding
+from interpolation.regrid import RBFWeights, fingerprint, source_of
+
+#%% ROMS level depths:
+
+def romsDepths(ds_local, zeta=0.0):
+
+    """
+    Inputs:
+        Local climate model data: ds_local
+        free surface: zeta (0 for the rest depths)
+
+    Output:
+        depth (positive down, m) of every s_rho level, shape (N, eta, xi), bottom level first
+    """
+
+    h = ds_local.h.to_numpy().astype(np.float64)
+    s = ds_local.s_rho.to_numpy().astype(np.float64)[:, None, None]
+    Cs = ds_local.Cs_r.to_numpy().astype(np.float64)[:, None, None] if 'Cs_r' in ds_local else s
+    hc = float(ds_local.hc) if 'hc' in ds_local else 0.0
+    Vtransform = int(ds_local.Vtransform) if 'Vtransform' in ds_local else 2
+
+    if Vtransform == 1:
+        z0 = hc * s + (h - hc) * Cs
+        z = z0 + zeta * (1.0 + z0 / h)
+    else:
+        z0 = (hc * s + h * Cs) / (hc + h)
+        z = zeta + (zeta + h) * z0
+    return -z
+
+#%% Read local climate model data
+
+def westernAustraliaLocalLevels(ds_local, var_local, levels=None):
+
+    """
+    Inputs:
+        Local climate model data: ds_local
+        local variable (for the land / below-bottom mask): var_local
+        s_rho indices to produce: levels (all when None)
+
+    Output:
+        Lat_np, Lon_np, depth of the levels (L, eta, xi) and their NaN mask (L, eta, xi)
+    """
+
+    levels = np.arange(ds_local.sizes['s_rho']) if levels is None else np.asarray(levels)
+    Lat_np = ds_local.lat_rho.to_numpy()
+    Lon_np = ds_local.lon_rho.to_numpy()
+    z = romsDepths(ds_local)[levels]
+    local = ds_local[var_local].isel(s_rho=levels).to_numpy()[0]
+    return Lat_np, Lon_np, z, np.isnan(local)
+
+#%% Vertical interpolation:
+
+def verticalInterpolation(fields, src_depths, z):
+
+    """
+    Inputs:
+        fields: (k, eta, xi) values on the source depths
+        src_depths: (k,) source depths (positive down, increasing)
+        z: (L, eta, xi) target depths
+
+    Output:
+        (L, eta, xi) linearly interpolated in depth; targets above the first or below
+        the last source depth take that level's value
+    """
+
+    src_depths = np.asarray(src_depths, dtype=np.float64)
+    if len(src_depths) == 1:
+        return np.broadcast_to(fields[0], z.shape).copy()
+
+    zc = np.clip(z, src_depths[0], src_depths[-1])
+    k = np.clip(np.searchsorted(src_depths, zc, side='right') - 1, 0, len(src_depths) - 2)
+    w = (zc - src_depths[k]) / (src_depths[k + 1] - src_depths[k])
+
+    rows, cols = np.indices(z.shape[1:])
+    upper = fields[k, rows, cols]
+    lower = fields[k + 1, rows, cols]
+    return (1.0 - w) * upper + w * lower
+
+#%% Interpolation!:
+
+def interpolator_levels(ds, ds_local, var_global, var_local, T, depths, latmin, latmax, lonmin, lonmax,
+                        levels=None, cache=None):
+
+    """
+    Inputs:
+        westernAustraliaGlobal, padding
+        global and local variables of interest: var_global, var_local
+        day of the year: T
+        deptht indices of the source levels to use: depths
+        s_rho indices to produce: levels (all when None)
+        cache: optional GridCache; the region window, level depths and RBF weights are then reused
+
+    Output:
+        Global climate model data interpolated onto the ROMS s-levels, shape (L, 640, 480)
+    """
+
+    depths = list(depths)
+    with span('read_global', var=var_global, day=T, levels=len(depths)):
+        ds_QoI, Lat_glob, Lon_glob = westernAustraliaGlobal(ds, var_global, T, depths, latmin, latmax, lonmin, lonmax,
+                                                            cache)
+        src_depths = ds_QoI.deptht.to_numpy()
+        ds_QoI_np = np.stack([padding(ds_QoI[i]) for i in range(len(depths))])
+
+    # drop the land columns of the shallowest level, so every level shares one source grid
+    idx = np.argwhere(np.all(ds_QoI_np[0] == 0, axis=0))[:, 0]
+    ds_QoI_np = np.delete(ds_QoI_np, idx, axis=2)
+    Lat_glob = np.delete(Lat_glob, idx, axis=1)
+    Lon_glob = np.delete(Lon_glob, idx, axis=1)
+
+    X = np.concatenate((Lat_glob.ravel().reshape(-1,1), Lon_glob.ravel().reshape(-1,1)), axis=1)
+    Y = ds_QoI_np.reshape(len(depths), -1).T                                # (N, k)
+
+    with span('read_local', day=T):
+        key = ('levels', source_of(ds_local), var_local, None if levels is None else tuple(levels))
+        build = lambda: westernAustraliaLocalLevels(ds_local, var_local, levels)
+        Lat_np, Lon_np, z, land = build() if cache is None else cache.get(key, build)
+    X_test = np.concatenate((Lat_np.ravel().reshape(-1,1), Lon_np.ravel().reshape(-1,1)), axis=1)
+
+    with span('fit', method='rbf', day=T):
+        if cache is None:
+            weights = RBFWeights(X, X_test)
+        else:
+            weights = cache.get(('rbf', fingerprint(X), fingerprint(X_test)), lambda: RBFWeights(X, X_test))
+    with span('predict', method='rbf', day=T, levels=len(depths)):
+        horizontal = weights.apply(Y).T.reshape((len(depths),) + Lat_np.shape)
+
+    order = np.argsort(src_depths)
+    with span('vertical', day=T, levels=len(z)):
+        interpolated = verticalInterpolation(horizontal[order], src_depths[order], z)
+
+    interpolated[land] = 0
+    interpolated = np.nan_to_num(interpolated)
+
+    return interpolated
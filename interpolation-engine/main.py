@@ -1,4 +1,66 @@
-from utils.data_generator import interpolationroutine
+"""
+Name: main
+Multi-year interpolation driver
 
-if __name__ == "__main__":
-    interpolationroutine(2021) # Please enter the appropiate year
+Inputs:
+    first and last year (inclusive), e.g. 2008 2021
+
+Output:
+    Data{year}_gcm.npy / .p for every year, and a grid-cache hit/miss report
+
+All years share one on-disk grid cache (--cache-dir): the ROMS grid and land mask,
+the source region windows and the RBF weights are built for the first year that
+needs them and loaded by every later year (and later run) on the same grids.
+
+Usage:
+    python cli.py interpolate 2021
+    python cli.py interpolate 2008 2021 --workers 8 --cache-dir data/grid_cache
+"""
+import argparse
+import collections
+import os
+import time
+
+
+def report(lookups):
+    print(f"{'kind':>10}{'memory':>10}{'disk':>10}{'miss':>10}{'hit rate':>10}")
+    total = collections.Counter()
+    for kind, c in sorted(lookups.items()):
+        total.update(c)
+        n = sum(c.values())
+        print(f"{kind:>10}{c['memory']:>10}{c['disk']:>10}{c['miss']:>10}"
+              f"{(c['memory'] + c['disk']) / n if n else 0:>10.1%}")
+    n = sum(total.values())
+    print(f"{'total':>10}{total['memory']:>10}{total['disk']:>10}{total['miss']:>10}"
+          f"{(total['memory'] + total['disk']) / n if n else 0:>10.1%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Interpolate a range of years onto the ROMS grid.')
+    parser.add_argument('first_year', type=int)
+    parser.add_argument('last_year', type=int, nargs='?', help='inclusive; defaults to first_year')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes per year')
+    parser.add_argument('--chunk-days', type=int, default=31, help='days per worker task')
+    parser.add_argument('--cache-dir', default=os.path.join(os.path.dirname(__file__), '../data/grid_cache'),
+                        help="on-disk grid cache shared by all years ('' to keep it in memory only)")
+    parser.add_argument('--no-pickle', action='store_true', help='only write Data{year}_gcm.npy')
+    args = parser.parse_args(argv)
+
+    from utils.data_generator import interpolationroutine  # xarray, sklearn: only once there is work to do
+
+    years = range(args.first_year, (args.last_year or args.first_year) + 1)
+    lookups = collections.defaultdict(collections.Counter)
+    for year in years:
+        t0 = time.time()
+        year_lookups = interpolationroutine(year, workers=args.workers, chunk_days=args.chunk_days,
+                                            write_pickle=not args.no_pickle, cache_dir=args.cache_dir or None)
+        for kind, c in year_lookups.items():
+            lookups[kind].update(c)
+        c = collections.Counter()
+        for v in year_lookups.values():
+            c.update(v)
+        print(f"{year}: {time.time() - t0:.0f} s, grid cache {c['memory']} memory / {c['disk']} disk hits, "
+              f"{c['miss']} misses")
+
+    print(f"\nGrid cache over {len(years)} year(s):")
+    report(lookups)
@@ -9,30 +9,129 @@ Requirement:
 
 Inputs:
     year - The year for which to run the interpolation
+    workers - number of worker processes (each writes its days straight into the shared result buffer)
+    cache_dir - optional on-disk grid cache shared by all years (see interpolation/regrid.py)
 
 Output:
-    A pickle file containing the interpolated data
+    Data{year}_gcm.npy - (variable, day, 640, 480) array of the interpolated data
+    Data{year}_gcm.p - the same data as a pickle of per-variable lists (write_pickle=True)
 """
 
 #%% Import necessary libraries
-import numpy as np
 import xarray as xr
 from interpolation.access_interpolator import interpolator
 from interpolation.mld1_interpolator import interpolator_mld1
 from interpolation.era5_interpolator import interpolator_era5
 import calendar
+import collections
 import pickle
 import os
+import numpy as np
 
-
-def interpolationroutine(year):
-    # Define region of interest and model parameters for Western Australia
-    depth = 0
-    latmin = -34.3265 
-    latmax = -22.5763
-    lonmin = 108.511
-    lonmax = 116.284
-
+from profiling.tracer import span
+
+
+from interpolation.regrid import GridCache
+from utils.result_buffer import ResultBuffer
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+# Region of interest and model parameters for Western Australia
+depth = 0
+latmin = -34.3265 
+latmax = -22.5763
+lonmin = 108.511
+lonmax = 116.284
+
+var_local = 'temp'
+roms_file = 'data/roms/2021/cwa_20210101_12__avg.nc'
+
+# (global variable, file, interpolator) in the order of the pickle
+sources = [
+    ('sst',  'data/access/daily/sst/do_sst_{year}.nc',            'access'),
+    ('salt', 'data/access/daily/salt/do_salt_{year}.nc',          'access'),
+    ('slhf', 'data/era5/daily/slhf/era5_slhf_daily_{year}.nc',    'era5'),
+    ('ssr',  'data/era5/daily/snsr/era5_ssr_daily_{year}.nc',     'era5'),
+    ('str',  'data/era5/daily/sntr/era5_str_daily_{year}.nc',     'era5'),
+    ('sshf', 'data/era5/daily/sshf/era5_sshf_daily_{year}.nc',    'era5'),
+    ('mld1', 'data/access/daily/mld1/do_mld1_{year}.nc',          'mld1'),
+]
+
+
+def regrid(kind, ds, ds_local, var_global, T, cache=None):
+    """Interpolates day T of var_global onto the local grid with the interpolator for its source."""
+    if kind == 'access':
+        return interpolator(ds, ds_local, var_global, var_local, T, depth, latmin, latmax, lonmin, lonmax,
+                            cache=cache)
+    if kind == 'era5':
+        return interpolator_era5(ds, ds_local, var_global, var_local, T, depth, cache=cache)
+    return interpolator_mld1(ds, ds_local, var_global, var_local, T, depth, latmin, latmax, lonmin, lonmax,
+                             cache=cache)
+
+
+def open_sources(year, data_root='.'):
+    """
+    Opens (lazily) every source file of a year and the ROMS grid file.
+    Returns ({var: ds}, ds_local); a day is only read when it is interpolated.
+    """
+    datasets = {var: xr.open_dataset(os.path.join(data_root, path.format(year=year)))
+                for var, path, _ in sources}
+    return datasets, xr.open_dataset(os.path.join(data_root, roms_file))
+
+
+def interpolate_day(datasets, ds_local, T, cache=None):
+    """
+    Interpolates a single day T (0-based day of the year) of all variables.
+    Returns a list of seven raveled (640*480,) fields in the order of the pickle.
+    """
+    fields = []
+    for var, _, kind in sources:
+        with span('regrid', var=var, day=T):
+            fields.append(regrid(kind, datasets[var], ds_local, var, T, cache).ravel())
+    return fields
+
+
+def _init_worker(buffer_path, cache_dir=None):
+    # per-process state: the shared result buffer, open files and grid cache
+    _worker['buffer'] = ResultBuffer(buffer_path)
+    _worker['cache'] = GridCache(cache_dir)
+    _worker['files'] = {}
+
+
+_worker = {}
+
+
+def _regrid_days(v, year, T0, T1):
+    """Interpolates days T0..T1-1 of sources[v] and writes them into the shared buffer."""
+    var, path, kind = sources[v]
+    files = _worker['files']
+    if (v, year) not in files:
+        with span('read', var=var):
+            files[(v, year)] = (xr.open_dataset(path.format(year=year)), xr.open_dataset(roms_file))
+    ds, ds_local = files[(v, year)]
+
+    cache = _worker['cache']
+    before = {kind: collections.Counter(c) for kind, c in cache.counts.items()}
+    for T in range(T0, T1):
+        with span('regrid', var=var, day=T):
+            interpolationresults = regrid(kind, ds, ds_local, var, T, cache)
+        _worker['buffer'].write(v, T, interpolationresults)
+    _worker['buffer'].flush()
+    # cache lookups made by this task, per kind of entry
+    counts = {kind: dict(c - before.get(kind, collections.Counter())) for kind, c in cache.counts.items()}
+    return v, T0, T1, counts
+
+
+def interpolationroutine(year, workers=1, chunk_days=31, write_pickle=True, cache_dir=None):
+    """
+    Returns the grid-cache lookups of the year as {kind: {'memory'|'disk'|'miss': count}}.
+    With cache_dir, grid work is shared on disk with other years and runs.
+    """
+    with span('interpolationroutine', year=year):
+        return _interpolationroutine(year, workers, chunk_days, write_pickle, cache_dir)
+
+
+def _interpolationroutine(year, workers=1, chunk_days=31, write_pickle=True, cache_dir=None):
     monthstart = 1
     monthend = 13
 
@@ -46,104 +145,42 @@ def interpolationroutine(year):
 
     st_days = 0
 
-    var_local = 'temp'
-    var_global_sst = 'sst'
-    var_global_salt = 'salt'
-    var_global_slhf = 'slhf'
-    var_global_snsr = 'ssr'
-    var_global_sntr = 'str'
-    var_global_sshf = 'sshf'
-    var_global_mld1 = 'mld1'
-
-    # Interpolation lists
-    interpolatedlist_SST = []
-    interpolatedlist_Salt = []
-    interpolatedlist_slhf = []
-    interpolatedlist_snsr = []
-    interpolatedlist_sntr = []
-    interpolatedlist_sshf = []
-    interpolatedlist_mld1 = []
-
-    # SST interpolation cwa_20210101_12__avg
-    ds = xr.open_dataset(f'data/access/daily/sst/do_sst_{year}.nc')
-    ds_local = xr.open_dataset('data/roms/2021/cwa_20210101_12__avg.nc')
-
-    for T in range(st_days, days):
-        interpolationresults_SST = interpolator(ds, ds_local, var_global_sst, var_local, 
-                                                T, depth, latmin, latmax, lonmin, lonmax)
-        interpolatedlist_SST.append(interpolationresults_SST.ravel())
-    
-    
-    # Salt interpolation
-    ds = xr.open_dataset(f'data/access/daily/salt/do_salt_{year}.nc')
-    ds_local = xr.open_dataset('data/roms/2021/cwa_20210101_12__avg.nc')
-
-    for T in range(st_days, days):
-        interpolationresults_salt = interpolator(ds, ds_local, var_global_salt, var_local, 
-                                                T, depth, latmin, latmax, lonmin, lonmax)
-        interpolatedlist_Salt.append(interpolationresults_salt.ravel())
-
-    # slhf interpolation
-    ds = xr.open_dataset(f'data/era5/daily/slhf/era5_slhf_daily_{year}.nc')
-    ds_local = xr.open_dataset('data/roms/2021/cwa_20210101_12__avg.nc')
-
-    for T in range(st_days, days):
-        interpolationresults_slhf = interpolator_era5(ds, ds_local, var_global_slhf, var_local, 
-                                                      T, depth)
-        interpolatedlist_slhf.append(interpolationresults_slhf.ravel())
-
-    # snsr interpolation
-    ds = xr.open_dataset(f'data/era5/daily/snsr/era5_ssr_daily_{year}.nc')
-    ds_local = xr.open_dataset('data/roms/2021/cwa_20210101_12__avg.nc')
-
-    for T in range(st_days, days):
-        interpolationresults_snsr = interpolator_era5(ds, ds_local, var_global_snsr, var_local, 
-                                                      T, depth)
-        interpolatedlist_snsr.append(interpolationresults_snsr.ravel())
-
-    # sntr interpolation
-    ds = xr.open_dataset(f'data/era5/daily/sntr/era5_str_daily_{year}.nc')
-    ds_local = xr.open_dataset('data/roms/2021/cwa_20210101_12__avg.nc')
-
-    for T in range(st_days, days):
-        interpolationresults_sntr = interpolator_era5(ds, ds_local, var_global_sntr, var_local, 
-                                                      T, depth)
-        interpolatedlist_sntr.append(interpolationresults_sntr.ravel())
-
-    # sshf interpolation
-    ds = xr.open_dataset(f'data/era5/daily/sshf/era5_sshf_daily_{year}.nc')
-    ds_local = xr.open_dataset('data/roms/2021/cwa_20210101_12__avg.nc')
-
-    for T in range(st_days, days):
-        interpolationresults_sshf = interpolator_era5(ds, ds_local, var_global_sshf, var_local, 
-                                                      T, depth)
-        interpolatedlist_sshf.append(interpolationresults_sshf.ravel())
-
-    # Mld1
-    ds = xr.open_dataset(f'data/access/daily/mld1/do_mld1_{year}.nc')
-    ds_local = xr.open_dataset('data/roms/2021/cwa_20210101_12__avg.nc') 
-    
-    for T in range(st_days, days):
-        interpolationresults_mld1 = interpolator_mld1(ds, ds_local, var_global_mld1, var_local,
-                                        T, depth, latmin, latmax, lonmin, lonmax)
-
-        interpolatedlist_mld1.append(interpolationresults_mld1.ravel())
-
-
-    # Save all interpolated variables to a pickle file for later use
-    output_file = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../data/processed", f"Data{year}_gcm.p"))
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    
-    with open(output_file, "wb") as f:
-        pickle.dump([
-            interpolatedlist_SST, interpolatedlist_Salt, 
-            interpolatedlist_slhf, interpolatedlist_snsr, 
-            interpolatedlist_sntr, interpolatedlist_sshf, interpolatedlist_mld1
-        ], f)
+    processed_dir = os.getenv("SST_PROCESSED_DIR", os.path.join(os.path.dirname(__file__), "../../data/processed"))
+    output_file = os.path.abspath(os.path.join(processed_dir, f"Data{year}_gcm.npy"))
+
+    # (variable, day, H, W) buffer that every worker writes into by index
+    buffer = ResultBuffer.create(output_file, len(sources), days)
+    tasks = [(v, year, T0, min(T0 + chunk_days, days))
+             for v in range(len(sources)) for T0 in range(st_days, days, chunk_days)]
+
+    lookups = collections.defaultdict(collections.Counter)
+    if workers > 1:
+        ctx = get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=_init_worker, initargs=(output_file, cache_dir)) as pool:
+            for fut in as_completed([pool.submit(_regrid_days, *task) for task in tasks]):
+                v, T0, T1, counts = fut.result()
+                for kind, c in counts.items():
+                    lookups[kind].update(c)
+                print(f"  {sources[v][0]}: days {T0}-{T1 - 1} done")
+    else:
+        _init_worker(output_file, cache_dir)
+        for task in tasks:
+            for kind, c in _regrid_days(*task)[3].items():
+                lookups[kind].update(c)
+        _worker.clear()
+
+    missing = buffer.missing()
+    if missing:
+        raise RuntimeError(f"{len(missing)} (variable, day) slots were not written, e.g. {missing[:5]}")
+    with span('write', year=year):
+        buffer.finalize()
+
+        # Legacy pickle of the interpolated variables ([var][day] -> raveled float64 field, as before)
+        if write_pickle:
+            with open(output_file[:-len('.npy')] + '.p', "wb") as f:
+                pickle.dump([[np.asarray(buffer.array[v, T], dtype=np.float64).ravel() for T in range(days)]
+                             for v in range(len(sources))], f)
     
     print(f"Data for year {year} has been processed and saved to {output_file}")
-
-
-# Example usage
-interpolationroutine(2021)
-# run_downscaling(2018)
+    return {kind: dict(c) for kind, c in lookups.items()}
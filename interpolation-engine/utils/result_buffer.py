@@ -0,0 +1,76 @@
+"""
+Name: result_buffer
+
+Requirement:
+    numpy, os
+
+Inputs:
+    Interpolated daily fields, written by index from any process
+
+Output:
+    Data{year}_gcm.npy: a (variable, day, H, W) float32 array in the processed directory
+
+ResultBuffer preallocates the whole year as a memory-mapped .npy file. Every worker
+opens the same file and writes each regridded field straight into its
+(variable, day) slot, so nothing is pickled back to the parent and there is no
+list-to-array copy at the end. While it is being filled the file carries a
+.partial suffix; finalize() flushes it and renames it into place, so readers
+never see a half-written year.
+
+Completion is tracked explicitly in a (variable, day) bool map next to the
+buffer (.done), set once a slot's whole field has been written, so a NaN in
+a field is never mistaken for a missing day.
+"""
+#%% Import necessary libraries
+import os
+import numpy as np
+
+
+class ResultBuffer:
+
+    def __init__(self, path, mode='r+'):
+        """
+        Opens an existing buffer (e.g. in a worker process) for writing by index
+        """
+        self.path = path
+        self.array = np.load(path + '.partial', mmap_mode=mode)
+        self.done = np.load(path + '.done', mmap_mode=mode)
+
+    @classmethod
+    def create(cls, path, n_vars, days, shape=(640, 480), dtype=np.float32):
+        """
+        Allocates a NaN-filled (n_vars, days, H, W) buffer for the year being processed
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        arr = np.lib.format.open_memmap(path + '.partial', mode='w+', dtype=dtype,
+                                        shape=(n_vars, days) + tuple(shape))
+        arr[:] = np.nan
+        arr.flush()
+        del arr
+        done = np.lib.format.open_memmap(path + '.done', mode='w+', dtype=bool, shape=(n_vars, days))
+        done[:] = False
+        done.flush()
+        del done
+        return cls(path)
+
+    def write(self, v, T, field):
+        self.array[v, T] = np.asarray(field).reshape(self.array.shape[2:])
+        self.done[v, T] = True
+
+    def missing(self):
+        """
+        (variable, day) slots whose field was never completely written
+        """
+        return [tuple(int(k) for k in i) for i in np.argwhere(~self.done)]
+
+    def flush(self):
+        self.array.flush()
+        self.done.flush()
+
+    def finalize(self):
+        self.flush()
+        os.replace(self.path + '.partial', self.path)
+        del self.done
+        os.remove(self.path + '.done')
+        self.array = np.load(self.path, mmap_mode='r')
+        return self.path
@@ -0,0 +1,243 @@
+"""
+tracer.py
+
+Summary:
+    Lightweight span tracer shared by the interpolation engine and the rcnn model.
+    Each span records wall time, the process's current RSS when the stage starts
+    and ends (and the difference) and, optionally, the Python allocations made
+    inside it, tagged with free-form args such as var/day.
+    At exit the spans are written as a Chrome-trace JSON file (open it in
+    chrome://tracing or https://ui.perfetto.dev) and a per-stage summary table
+    is printed. The per-stage totals are kept as running aggregates over every
+    span; the timeline keeps only the last SST_PROFILE_MAX_EVENTS spans, so
+    spans inside endless loops (e.g. one per training patch) use bounded memory.
+
+    Tracing is off unless SST_PROFILE is set. When off, span() hands back one
+    shared no-op context manager, so instrumented code pays a function call
+    and an attribute lookup per span and nothing else.
+
+Settings (environment):
+    - SST_PROFILE: "1" to trace into ./sst_profile_<pid>.json, or a path ending in .json
+    - SST_PROFILE_ALLOC: "1" to also track allocations with tracemalloc (slow)
+    - SST_PROFILE_MAX_EVENTS: spans kept for the timeline (default 100000)
+
+Functions:
+    - span(name, **args): context manager timing one stage
+    - traced(name): decorator form of span()
+    - enabled(): whether tracing is on
+    - summary_table(): per-stage totals as printable text
+    - write_trace(path): writes the Chrome trace + summary JSON
+
+Usage:
+    from profiling.tracer import span
+    with span('regrid', var='sst', day=T):
+        ...
+"""
+
+# tracer.py
+import atexit
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+_SETTING = os.getenv("SST_PROFILE", "")
+_ENABLED = _SETTING not in ("", "0")
+_TRACK_ALLOC = _ENABLED and os.getenv("SST_PROFILE_ALLOC", "") not in ("", "0")
+
+_NULL_SPAN = contextlib.nullcontext()
+_EVENTS = deque(maxlen=int(os.getenv("SST_PROFILE_MAX_EVENTS", "100000")))
+_STATS = {}
+_STATS_LOCK = threading.Lock()
+_LOCAL = threading.local()
+_T0 = time.perf_counter_ns()
+
+if _TRACK_ALLOC:
+    import tracemalloc
+    tracemalloc.start()
+
+
+def enabled():
+    return _ENABLED
+
+
+_PAGE_MB = os.sysconf("SC_PAGE_SIZE") / 1024.0 ** 2 if hasattr(os, "sysconf") else None
+
+
+def _rss_mb():
+    """Current resident set size of this process in MB (None if it cannot be read)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_MB
+    except (OSError, TypeError):
+        pass
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1024.0 ** 2
+    return None
+
+
+def _stack():
+    stack = getattr(_LOCAL, "stack", None)
+    if stack is None:
+        stack = _LOCAL.stack = []
+    return stack
+
+
+class _Span:
+    __slots__ = ("name", "args", "start", "rss_start", "alloc_start", "child_peak")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.child_peak = 0
+
+    def __enter__(self):
+        if _TRACK_ALLOC:
+            current, peak = tracemalloc.get_traced_memory()
+            stack = _stack()
+            if stack:
+                # keep the parent's peak so far before resetting the counter for us
+                stack[-1].child_peak = max(stack[-1].child_peak, peak)
+            tracemalloc.reset_peak()
+            self.alloc_start = current
+        _stack().append(self)
+        self.rss_start = _rss_mb()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        stack = _stack()
+        stack.pop()
+
+        args = dict(self.args)
+        rss_end = _rss_mb()
+        args["rss_start_mb"] = self.rss_start
+        args["rss_end_mb"] = rss_end
+        args["rss_delta_mb"] = None if rss_end is None or self.rss_start is None else rss_end - self.rss_start
+        if _TRACK_ALLOC:
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, self.child_peak)
+            if stack:
+                stack[-1].child_peak = max(stack[-1].child_peak, peak)
+            args["alloc_mb"] = (current - self.alloc_start) / 1024.0 ** 2
+            args["peak_alloc_mb"] = (peak - self.alloc_start) / 1024.0 ** 2
+        if exc_type is not None:
+            args["error"] = exc_type.__name__
+
+        event = {
+            "name": self.name,
+            "ph": "X",
+            "ts": (self.start - _T0) / 1000.0,
+            "dur": (end - self.start) / 1000.0,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args,
+        }
+        _EVENTS.append(event)
+        _aggregate(event)
+        return False
+
+
+def span(name, **args):
+    """Times the enclosed block as stage `name`; args (var, day, year...) end up in the trace."""
+    if not _ENABLED:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def traced(name=None):
+    """Decorator version of span(); defaults to the function name."""
+    def decorator(fn):
+        if not _ENABLED:
+            return fn
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*a, **kw):
+            with _Span(label, {}):
+                return fn(*a, **kw)
+        return wrapper
+    return decorator
+
+
+def _aggregate(ev):
+    """Folds one span into the running per-stage totals."""
+    dur_ms = ev["dur"] / 1000.0
+    args = ev["args"]
+    with _STATS_LOCK:
+        s = _STATS.setdefault(ev["name"], {
+            "count": 0, "total_s": 0.0, "max_ms": 0.0,
+            "max_rss_mb": 0.0, "max_rss_delta_mb": 0.0, "peak_alloc_mb": 0.0,
+        })
+        s["count"] += 1
+        s["total_s"] += dur_ms / 1000.0
+        s["max_ms"] = max(s["max_ms"], dur_ms)
+        s["max_rss_mb"] = max(s["max_rss_mb"], args.get("rss_end_mb") or 0.0)
+        s["max_rss_delta_mb"] = max(s["max_rss_delta_mb"], args.get("rss_delta_mb") or 0.0)
+        s["peak_alloc_mb"] = max(s["peak_alloc_mb"], args.get("peak_alloc_mb", 0.0))
+
+
+def summarize():
+    """Per-stage totals over every span recorded (not only those still in the timeline)."""
+    with _STATS_LOCK:
+        stats = {name: dict(s) for name, s in _STATS.items()}
+    for s in stats.values():
+        s["mean_ms"] = 1000.0 * s["total_s"] / s["count"]
+    return stats
+
+
+def summary_table():
+    stats = summarize()
+    header = (f"{'stage':<32}{'count':>8}{'total s':>12}{'mean ms':>12}{'max ms':>12}"
+              f"{'RSS at end MB':>15}{'max RSS +MB':>13}")
+    if _TRACK_ALLOC:
+        header += f"{'peak alloc MB':>16}"
+    lines = [header, "-" * len(header)]
+    for name, s in sorted(stats.items(), key=lambda kv: -kv[1]["total_s"]):
+        line = (f"{name:<32}{s['count']:>8}{s['total_s']:>12.3f}{s['mean_ms']:>12.2f}"
+                f"{s['max_ms']:>12.2f}{s['max_rss_mb']:>15.1f}{s['max_rss_delta_mb']:>13.1f}")
+        if _TRACK_ALLOC:
+            line += f"{s['peak_alloc_mb']:>16.1f}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _default_path():
+    if _SETTING.endswith(".json"):
+        return _SETTING
+    return os.path.abspath(f"sst_profile_{os.getpid()}.json")
+
+
+def write_trace(path=None):
+    """Writes all spans recorded so far as Chrome trace JSON, with the summary alongside."""
+    path = path or _default_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({
+            "traceEvents": list(_EVENTS),
+            "displayTimeUnit": "ms",
+            "summary": summarize(),
+        }, f)
+    return path
+
+
+def _flush_at_exit():
+    if not _STATS:
+        return
+    path = write_trace()
+    print(summary_table(), file=sys.stderr)
+    print(f"Profile written to {path}", file=sys.stderr)
+
+
+if _ENABLED:
+    atexit.register(_flush_at_exit)
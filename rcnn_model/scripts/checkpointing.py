@@ -0,0 +1,197 @@
+"""
+checkpointing.py
+
+Summary:
+    Full-state, resumable training checkpoints for preemptible jobs.
+
+    Every CHECKPOINT_EVERY_STEPS batches and at every epoch end, a
+    tf.train.Checkpoint (managed by tf.train.CheckpointManager) stores
+        - the model weights (including gradient-accumulation buffers),
+        - the optimizer state (Adam moments, iterations, loss scale),
+        - the epoch, the step within the epoch and the number of batches run,
+    and a small side file (<checkpoint>.state.pkl) stores the Python state
+    that TensorFlow does not track:
+        - the current learning rate (as lowered by ReduceLROnPlateau),
+        - EarlyStopping / ReduceLROnPlateau / ModelCheckpoint / ThroughputMonitor
+          counters and bests (incl. EarlyStopping's best weights),
+        - the patch sampler RNG state and the global numpy RNG state.
+
+    Checkpoints are numbered (and triggered) by the batch count, which
+    advances on every batch; optimizer.iterations does not with gradient
+    accumulation, so two saves could get the same number.
+
+    fit_resumable() restores the latest checkpoint, finishes an interrupted
+    epoch with the remaining steps and then continues with full epochs, so a
+    restarted job follows the same schedule as an uninterrupted one.
+    Patches already sitting in the shuffle/prefetch buffers at save time are
+    not replayed; the stream continues from the saved sampler state. Given a
+    dataset factory, the shuffle is seeded from the restored batch count
+    (shuffle_seed), so resuming from the same checkpoint gives the same batches.
+
+Classes/Functions:
+    - ResumableCheckpoint(directory, sampler, every_n_steps, max_to_keep): Keras callback
+    - fit_resumable(model, train_ds, checkpoint, callbacks, epochs, steps_per_epoch, **fit_kwargs):
+      train_ds may be a function of the shuffle seed, built after the restore
+
+Used In:
+    - train.py
+"""
+
+# checkpointing.py
+import glob
+import os
+import pickle
+import numpy as np
+import tensorflow as tf
+
+from config import Config
+
+# Python-side attributes of the stock (and our) callbacks that make up their state
+CALLBACK_STATE = {
+    'EarlyStopping': ('wait', 'best', 'stopped_epoch', 'best_epoch', 'best_weights'),
+    'ReduceLROnPlateau': ('wait', 'best', 'cooldown_counter'),
+    'ModelCheckpoint': ('best', 'epochs_since_last_save'),
+    'ThroughputMonitor': ('history', '_global_step'),
+}
+
+
+class ResumableCheckpoint(tf.keras.callbacks.Callback):
+    """Must be the last callback in the list: it re-applies callback state after their on_train_begin resets."""
+
+    def __init__(self, directory, sampler=None, every_n_steps=200, max_to_keep=3):
+        super().__init__()
+        self.directory = directory
+        self.sampler = sampler
+        self.every_n_steps = every_n_steps
+        self.max_to_keep = max_to_keep
+        self.epoch = tf.Variable(0, dtype=tf.int64, trainable=False, name='ckpt_epoch')
+        self.step_in_epoch = tf.Variable(0, dtype=tf.int64, trainable=False, name='ckpt_step_in_epoch')
+        # batches run over the whole job; optimizer.iterations lags it with gradient accumulation
+        self.batches = tf.Variable(0, dtype=tf.int64, trainable=False, name='ckpt_batches')
+        self.callbacks = []
+        self.step_offset = 0
+        self._ckpt = None
+        self._manager = None
+        self._pending = None
+
+    def bind(self, model, callbacks):
+        self.set_model(model)
+        self.callbacks = [cb for cb in callbacks if cb is not self]
+        self._ckpt = tf.train.Checkpoint(model=model, optimizer=model.optimizer,
+                                         epoch=self.epoch, step_in_epoch=self.step_in_epoch, batches=self.batches)
+        self._manager = tf.train.CheckpointManager(self._ckpt, self.directory, max_to_keep=self.max_to_keep)
+
+    #%% state capture / apply
+
+    def _python_state(self):
+        state = {
+            'learning_rate': float(tf.keras.backend.get_value(self.model.optimizer.learning_rate)),
+            'numpy_rng': np.random.get_state(),
+            'callbacks': {},
+        }
+        if self.sampler is not None:
+            state['sampler_rng'] = self.sampler.rng.get_state()
+        for i, cb in enumerate(self.callbacks):
+            attrs = CALLBACK_STATE.get(type(cb).__name__)
+            if attrs:
+                state['callbacks'][f'{i}:{type(cb).__name__}'] = {
+                    a: getattr(cb, a) for a in attrs if hasattr(cb, a)
+                }
+        return state
+
+    def _apply_python_state(self, state):
+        tf.keras.backend.set_value(self.model.optimizer.learning_rate, state['learning_rate'])
+        np.random.set_state(state['numpy_rng'])
+        if self.sampler is not None and 'sampler_rng' in state:
+            self.sampler.rng.set_state(state['sampler_rng'])
+        for i, cb in enumerate(self.callbacks):
+            saved = state['callbacks'].get(f'{i}:{type(cb).__name__}')
+            for attr, value in (saved or {}).items():
+                setattr(cb, attr, value)
+
+    #%% save / restore
+
+    def save(self):
+        path = self._manager.save(checkpoint_number=int(self.batches.numpy()))
+        with open(path + '.state.pkl', 'wb') as f:
+            pickle.dump(self._python_state(), f)
+        # drop side files of checkpoints the manager has rotated out
+        live = set(self._manager.checkpoints)
+        for side in glob.glob(os.path.join(self.directory, '*.state.pkl')):
+            if side[:-len('.state.pkl')] not in live:
+                os.remove(side)
+        return path
+
+    def restore(self):
+        """Restores the latest checkpoint, if any. Returns (epoch, step_in_epoch) to resume from."""
+        path = self._manager.latest_checkpoint
+        if path is None:
+            return 0, 0
+        self._ckpt.restore(path)
+        state_file = path + '.state.pkl'
+        if os.path.exists(state_file):
+            with open(state_file, 'rb') as f:
+                self._pending = pickle.load(f)
+        epoch, step = int(self.epoch.numpy()), int(self.step_in_epoch.numpy())
+        print(f"Resuming from {path}: epoch {epoch + 1}, step {step}")
+        return epoch, step
+
+    def shuffle_seed(self):
+        """Shuffle seed of the training dataset: RANDOM_SEED plus the batches already run"""
+        return Config.RANDOM_SEED + int(self.batches.numpy())
+
+    #%% Keras hooks
+
+    def on_train_begin(self, logs=None):
+        if self._pending is not None:
+            self._apply_python_state(self._pending)
+            self._pending = None
+
+    def on_train_end(self, logs=None):
+        # a second fit() call (after a partial epoch) resets the callbacks again
+        self._pending = self._python_state()
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch.assign(epoch)
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.step_in_epoch.assign(self.step_offset + batch + 1)
+        self.batches.assign_add(1)
+        last = batch + 1 == self.params.get('steps')  # saved by on_epoch_end under the same number
+        if self.every_n_steps and int(self.batches.numpy()) % self.every_n_steps == 0 and not last:
+            self.save()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.epoch.assign(epoch + 1)
+        self.step_in_epoch.assign(0)
+        self.step_offset = 0
+        self.save()
+
+
+def fit_resumable(model, train_ds, checkpoint, callbacks, epochs, steps_per_epoch, **fit_kwargs):
+    """
+    model.fit() that resumes from `checkpoint`'s latest state. `callbacks`
+    should not contain `checkpoint`; it is appended last. `train_ds` may be a
+    function of the shuffle seed (see ResumableCheckpoint.shuffle_seed).
+    """
+    callbacks = list(callbacks) + [checkpoint]
+    checkpoint.bind(model, callbacks)
+    initial_epoch, done_steps = checkpoint.restore()
+    if callable(train_ds):
+        train_ds = train_ds(checkpoint.shuffle_seed())
+
+    history = None
+    if 0 < done_steps < steps_per_epoch and initial_epoch < epochs:
+        # finish the interrupted epoch first
+        checkpoint.step_offset = done_steps
+        history = model.fit(train_ds, initial_epoch=initial_epoch, epochs=initial_epoch + 1,
+                            steps_per_epoch=steps_per_epoch - done_steps,
+                            callbacks=callbacks, **fit_kwargs)
+        initial_epoch += 1
+        if model.stop_training:
+            return history
+
+    if initial_epoch < epochs:
+        history = model.fit(train_ds, initial_epoch=initial_epoch, epochs=epochs,
+                            steps_per_epoch=steps_per_epoch, callbacks=callbacks, **fit_kwargs)
+    return history
@@ -7,8 +7,24 @@ Summary:
 
 Key Settings:
     - DATA_PATH, OUTPUT_DIR: where input/output data is stored
+    - PROCESSED_DIR: where the interpolation-engine writes Data<year>_gcm.p
     - PATCH_SIZE, BATCH_SIZE, EPOCHS, LEARNING_RATE: model hyperparameters
-    - MIXED_PRECISION: whether to use float16 training
+    - MIXED_PRECISION, PRECISION_POLICY: reduced-precision training ('mixed_bfloat16' / 'mixed_float16')
+    - JIT_COMPILE: XLA-compile the train step
+    - GRAD_ACCUM_STEPS: batches per optimiser update (effective batch = BATCH_SIZE * steps)
+    - STEPS_PER_EPOCH: train batches per epoch (the patch stream is endless)
+    - VAL_BATCH_SIZE, VAL_TILE_STRIDE, VAL_DROP_LAND: fixed validation tile set
+    - SHUFFLE_BUFFER, PREFETCH_BUFFER, DATA_PARALLELISM: tf.data input pipeline tuning
+    - PATCH_MIN_OCEAN, PATCH_WEIGHTING: land-aware crop sampling (see patch_index.py)
+    - CHECKPOINT_DIR, CHECKPOINT_EVERY_STEPS, CHECKPOINT_KEEP: resumable training state
+    - DAILY_DIR, INTERP_DATA_ROOT: operational one-day mode (output store, root of data/access, data/era5, data/roms)
+    - GRID_CACHE_DIR: on-disk regridding cache shared with the interpolation-engine
+    - SERVE_HOST, SERVE_PORT, SERVE_MAX_BATCH, SERVE_MAX_WAIT_MS: inference server (serve.py)
+    - TEMPORAL_WINDOW, TEMPORAL_STORE_DIR: k-day input context and its memory-mapped day store (temporal.py)
+    - LR_SCALING: learning-rate scaling with the global batch in train_distributed.py
+    - STUDENT_FILTERS, DISTILL_ALPHA, DISTILL_EPOCHS, DISTILL_MAX_RMSE_INCREASE: student sizes and
+      distillation settings (distill.py); INFERENCE_MODEL: 'unet' or 'student' for inference
+    - EVAL_CHUNK_DAYS, EVAL_REGION_BLOCKS, EVAL_REGION_MAP: evaluation harness (evaluate.py)
     - RANDOM_SEED: ensures reproducibility
 
 Functions:
@@ -27,13 +43,56 @@ class Config:
     DATA_PATH = os.path.join(ROOT_DIR, 'data')
     MODEL_DIR = os.path.join(ROOT_DIR, 'models')
     OUTPUT_DIR = os.path.join(ROOT_DIR, 'output')
+    PROCESSED_DIR = os.getenv(
+        "SST_PROCESSED_DIR",
+        os.path.abspath(os.path.join(os.path.dirname(__file__), '../../data/processed'))
+    )
 
     PATCH_SIZE = 128
     BATCH_SIZE = 16
     EPOCHS = 30
     LEARNING_RATE = 1e-3
     VALIDATION_SPLIT = 0.1
+    STEPS_PER_EPOCH = 500
+    VAL_BATCH_SIZE = 64
+    VAL_TILE_STRIDE = None    # None = PATCH_SIZE, i.e. non-overlapping tiles
+    VAL_DROP_LAND = True
+    SHUFFLE_BUFFER = 1024
+    PREFETCH_BUFFER = None    # None = tf.data.AUTOTUNE
+    DATA_PARALLELISM = 1      # number of concurrent patch generators
+    PATCH_MIN_OCEAN = 0.25    # minimum ocean fraction of a training crop (0 = any crop)
+    PATCH_WEIGHTING = 'uniform'   # or 'ocean': sample crops proportionally to ocean fraction
+    DAILY_DIR = os.path.join(OUTPUT_DIR, 'daily')
+    INTERP_DATA_ROOT = os.getenv(
+        "SST_INTERP_DATA_ROOT",
+        os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
+    )
+    SERVE_HOST = '127.0.0.1'
+    SERVE_PORT = 8765
+    SERVE_MAX_BATCH = 8       # days per forward pass
+    SERVE_MAX_WAIT_MS = 25    # latency budget for filling a batch
+    TEMPORAL_WINDOW = 1       # days of input context; 1 = each day on its own
+    TEMPORAL_STORE_DIR = os.path.join(DATA_PATH, 'day_store')
+    GRID_CACHE_DIR = os.getenv(
+        "SST_GRID_CACHE_DIR",
+        os.path.abspath(os.path.join(os.path.dirname(__file__), '../../data/grid_cache'))
+    )
+    CHECKPOINT_DIR = os.path.join(OUTPUT_DIR, 'checkpoints')
+    CHECKPOINT_EVERY_STEPS = 200
+    CHECKPOINT_KEEP = 3
+    LR_SCALING = 'linear'     # 'linear', 'sqrt' or 'none'
+    STUDENT_FILTERS = (8, 16, 24)    # base filters of the student sizes tried by distill.py
+    DISTILL_ALPHA = 0.2       # weight of the ROMS target in the student loss (the rest is the teacher)
+    DISTILL_EPOCHS = 15
+    DISTILL_MAX_RMSE_INCREASE = 0.05  # exported student: fastest within +5% of the teacher's RMSE
+    INFERENCE_MODEL = os.getenv("SST_INFERENCE_MODEL", 'unet')   # or 'student'
+    EVAL_CHUNK_DAYS = 16      # days per forward pass in evaluate.py
+    EVAL_REGION_BLOCKS = (4, 3)   # subregions = row x column blocks of the grid ...
+    EVAL_REGION_MAP = None    # ... unless this is an .npy (H, W) int label map (-1 = not in any region)
     MIXED_PRECISION = True
+    PRECISION_POLICY = 'mixed_bfloat16'   # or 'mixed_float16' (loss-scaled), 'float32'
+    JIT_COMPILE = True
+    GRAD_ACCUM_STEPS = 1
     RANDOM_SEED = 42
 
     @staticmethod
@@ -0,0 +1,84 @@
+"""
+daily_store.py
+
+Summary:
+    Append-by-day output store for the operational (one day at a time) mode.
+
+    Each year is one float32 .npy file of shape (days_in_year, H, W), opened as
+    a memory map, with one slot per day of the year (NaN until written, and on
+    land). Writing a day only touches that day's slot, so a daily run costs
+    one H x W write regardless of how much of the year is already stored, and
+    re-running a day overwrites it in place. index.json records which days
+    have been written and when.
+
+Inputs:
+    - Downscaled (H, W) fields from operational.py
+
+Outputs:
+    - <root>/<name>_<year>.npy and <root>/index.json
+
+Classes:
+    - DailyStore(root, name, shape)
+
+Used In:
+    - operational.py
+
+Usage:
+    store = DailyStore(Config.DAILY_DIR)
+    store.write(datetime.date(2024, 3, 5), field)
+    field = store.read(datetime.date(2024, 3, 5))
+"""
+
+# daily_store.py
+import calendar
+import datetime
+import json
+import os
+import numpy as np
+
+
+class DailyStore:
+    def __init__(self, root, name='sst', shape=(640, 480)):
+        self.root = root
+        self.name = name
+        self.shape = tuple(shape)
+        self._years = {}
+        os.makedirs(root, exist_ok=True)
+        self._index_path = os.path.join(root, 'index.json')
+        self.index = {}
+        if os.path.exists(self._index_path):
+            with open(self._index_path) as f:
+                self.index = json.load(f)
+
+    def path(self, year):
+        return os.path.join(self.root, f'{self.name}_{year}.npy')
+
+    def year(self, year):
+        """Memory map of a whole year, created (NaN-filled) on first use."""
+        if year not in self._years:
+            path = self.path(year)
+            if os.path.exists(path):
+                arr = np.load(path, mmap_mode='r+')
+            else:
+                days = 366 if calendar.isleap(year) else 365
+                arr = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(days,) + self.shape)
+                arr[:] = np.nan
+            self._years[year] = arr
+        return self._years[year]
+
+    def write(self, date, field):
+        day = date.timetuple().tm_yday - 1
+        arr = self.year(date.year)
+        arr[day] = field
+        arr.flush()
+        self.index[date.isoformat()] = datetime.datetime.now().isoformat(timespec='seconds')
+        tmp = self._index_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.index, f, indent=1, sort_keys=True)
+        os.replace(tmp, self._index_path)
+
+    def read(self, date):
+        return np.asarray(self.year(date.year)[date.timetuple().tm_yday - 1])
+
+    def __contains__(self, date):
+        return date.isoformat() in self.index
@@ -9,7 +9,8 @@ Summary:
     Contains training and testing data preparation functions and generators.
 
 Inputs:
-    - Pickle files containing interpolated ERA5 and ACCESS-S2 data
+    - Interpolated ERA5 and ACCESS-S2 data (Data<year>_gcm.npy, or the legacy pickle)
+    - ROMS targets (pds_local_sstnsalt_<year>.p)
     - Configuration parameters from config.py
 
 Outputs:
@@ -18,13 +19,17 @@ Outputs:
     - tf.data generators for training
 
 Functions:
+    - load_gcm(year)
     - load_raw_data(year)
+    - assemble(variables, target, dayS, dayE): features, target and mask in one pass
+    - load_year(year, dayS, dayE)
     - prepare_train_data()
-    - prepare_test_data()
+    - prepare_test_data(year, dayS, dayE)
     - generate_patches()
+    - day_features(fields, H, W)
 
 Used In:
-    - train.py, test_full_inference.py
+    - train.py, test_full_inference.py, evaluate.py, distill.py
 """
 #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
 
@@ -35,25 +40,82 @@ import pickle
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
-from trainingtestingdatagenerator_cnn_era5 import trainingdata, testingdata
 from config import Config
 
+from profiling.tracer import span
+
+def load_gcm(year):
+    """
+    The seven interpolated variables of a year, each indexable as [day] -> raveled field.
+    Prefers the (variable, day, H, W) Data<year>_gcm.npy (memory-mapped, no copy)
+    over the legacy pickle of lists.
+    """
+    npy_file = os.path.join(Config.PROCESSED_DIR, f'Data{year}_gcm.npy')
+    if os.path.exists(npy_file):
+        gcm = np.load(npy_file, mmap_mode='r')
+        return [gcm[v].reshape(gcm.shape[1], -1) for v in range(gcm.shape[0])]
+    with open(os.path.join(Config.PROCESSED_DIR, f'Data{year}_gcm.p'), 'rb') as f:
+        return pickle.load(f)
+
 def load_raw_data(year):
-    data_file = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../data/processed', f'Data{year}_gcm.p')))
     pds_file  = os.path.join(Config.DATA_PATH, f'pds_local_sstnsalt_{year}.p')
     (
         SST, Salt, hfss, rsds, rss, hfls, mld1
-    ) = pickle.load(open(data_file, 'rb'))
+    ) = load_gcm(year)
     pds_local, pds_local_salt, filenames = pickle.load(open(pds_file, 'rb'))
     days = len(pds_local)
     return SST, Salt, hfss, rsds, rss, hfls, mld1, pds_local, pds_local_salt, filenames, days
 
-def prepare_train_data(years, dayS, dayE):
+def _fill(dst, src, d0, d1):
+    """Copies days d0..d1-1 of one variable (day-major array or list of raveled fields) into dst."""
+    if isinstance(src, np.ndarray):
+        dst[...] = src[d0:d1].reshape(dst.shape)   # slice of the store is a view: one copy, into dst
+    else:
+        for i, d in enumerate(range(d0, d1)):
+            dst[i] = np.asarray(src[d]).reshape(dst.shape[1:])
+
+def assemble(variables, target, dayS, dayE, H=640, W=480, chunk=32):
+    """
+    Features (n, H, W, C), target (n, H, W, 1) and ocean mask (n, H, W, 1), float32,
+    for days dayS..dayE-1 of the target, in one pass over preallocated arrays.
+    variables: the interpolated variables (load_gcm); when they hold more days than
+    the target, the last len(target) days are used. Each chunk of days is written
+    variable by variable and its mask taken while it is still in cache; the day
+    range is applied by indexing, so the sources are never sliced into copies.
+    """
+    days = len(target)
+    dayE = min(dayE, days)
+    n, C = max(dayE - dayS, 0), len(variables)
+    X = np.empty((n, H, W, C), dtype=np.float32)
+    y = np.empty((n, H, W, 1), dtype=np.float32)
+    mask = np.empty((n, H, W, 1), dtype=np.float32)
+
+    for s in range(0, n, chunk):
+        e = min(s + chunk, n)
+        d0, d1 = dayS + s, dayS + e
+        for c, var in enumerate(variables):
+            offset = len(var) - days
+            _fill(X[s:e, ..., c], var, offset + d0, offset + d1)
+        _fill(y[s:e, ..., 0], target, d0, d1)
+        np.not_equal(X[s:e].sum(axis=-1, keepdims=True), 0, out=mask[s:e], casting='unsafe')
+    return X, y, mask
+
+def load_year(year, dayS, dayE):
+    """Unscaled features (days, H, W, C), target (days, H, W, 1) and ocean mask of one year."""
+    with span('load_raw_data', year=year):
+        SST, Salt, hfss, rsds, rss, hfls, mld1, pds_local, pds_local_salt, _, days = load_raw_data(year)
+
+    with span('assemble', year=year):
+        X, y, mask = assemble([SST, Salt, hfss, rsds, rss, hfls, mld1], pds_local, dayS, dayE)
+    return X, y, mask
+
+def prepare_train_data(years, dayS, dayE, scalers=None):
     """
     Loads and prepares training data across multiple years.
 
     Parameters:
         years (list): List of years (e.g., [2019, 2020, 2021])
+        scalers: optional fitted (scaler_X, scaler_y) to apply instead of fitting new ones
 
     Returns:
         (X_train, m_train, y_train), (X_val, m_val, y_val), (scaler_X, scaler_y)
@@ -62,55 +124,69 @@ def prepare_train_data(years, dayS, dayE):
 
     for year in years:
         print(f"Loading training data for year {year}...")
-        SST, Salt, hfss, rsds, rss, hfls, mld1, pds_local, pds_local_salt, _, days = load_raw_data(year)
-
-        X, y = trainingdata(
-            SST[-days:], Salt[-days:], hfss[-days:], rsds[-days:], rss[-days:], hfls[-days:], mld1[-days:],
-            pds_local, pds_local_salt, days, dayS, dayE
-        )
-
-        # compute mask here
-        mask = np.where(X.sum(axis=-1, keepdims=True) != 0, 1.0, 0.0)
-
+        X, y, mask = load_year(year, dayS, dayE)
         all_X.append(X)
         all_y.append(y)
         all_mask.append(mask)
 
     # Stack all years together
-    X_all = np.concatenate(all_X, axis=0)
-    y_all = np.concatenate(all_y, axis=0)
-    mask_all = np.concatenate(all_mask, axis=0)
-
-    # Scaling
-    scaler_X = StandardScaler()
-    X_scaled = scaler_X.fit_transform(X_all.reshape(-1, X_all.shape[-1])).reshape(X_all.shape)
-    scaler_y = StandardScaler()
-    y_scaled = scaler_y.fit_transform(y_all.reshape(-1, y_all.shape[-1])).reshape(y_all.shape)
-
-    # Train-validation split
-    X_tr, X_val, m_tr, m_val, y_tr, y_val = train_test_split(
-        X_scaled, mask_all, y_scaled,
-        test_size=Config.VALIDATION_SPLIT,
-        random_state=Config.RANDOM_SEED
-    )
+    with span('scale_and_split'):
+        X_all = np.concatenate(all_X, axis=0)
+        y_all = np.concatenate(all_y, axis=0)
+        mask_all = np.concatenate(all_mask, axis=0)
+
+        # Scaling
+        if scalers is None:
+            scaler_X = StandardScaler().fit(X_all.reshape(-1, X_all.shape[-1]))
+            scaler_y = StandardScaler().fit(y_all.reshape(-1, y_all.shape[-1]))
+        else:
+            scaler_X, scaler_y = scalers
+        X_scaled = scaler_X.transform(X_all.reshape(-1, X_all.shape[-1])).reshape(X_all.shape)
+        y_scaled = scaler_y.transform(y_all.reshape(-1, y_all.shape[-1])).reshape(y_all.shape)
+
+        # Train-validation split
+        X_tr, X_val, m_tr, m_val, y_tr, y_val = train_test_split(
+            X_scaled, mask_all, y_scaled,
+            test_size=Config.VALIDATION_SPLIT,
+            random_state=Config.RANDOM_SEED
+        )
 
     return (X_tr, m_tr, y_tr), (X_val, m_val, y_val), (scaler_X, scaler_y)
 
 
-def generate_patches(X, mask, y):
+def generate_patches(X, mask, y, sampler=None):
+    """
+    Endless stream of random PATCH_SIZE crops. With a patch_index.PatchSampler
+    the offsets come from its land-aware index instead of uniform draws.
+    X, mask and y may also be temporal.TemporalWindows / DaySubset views.
+    """
     ps = Config.PATCH_SIZE
     n = X.shape[0]
     while True:
-        i = np.random.randint(n)
-        img, msk, lbl = X[i], mask[i], y[i]
-        r = np.random.randint(0, img.shape[0]-ps+1)
-        c = np.random.randint(0, img.shape[1]-ps+1)
-        yield (img[r:r+ps, c:c+ps, :], msk[r:r+ps, c:c+ps, :]), lbl[r:r+ps, c:c+ps, :]
+        with span('patch'):
+            if sampler is not None:
+                i, r, c = sampler.sample()
+            else:
+                i = np.random.randint(n)
+                r = np.random.randint(0, X.shape[1]-ps+1)
+                c = np.random.randint(0, X.shape[2]-ps+1)
+            # index in one go so array-likes (temporal windows) only build the crop
+            patch = (X[i, r:r+ps, c:c+ps, :], mask[i, r:r+ps, c:c+ps, :]), y[i, r:r+ps, c:c+ps, :]
+        yield patch
+
+def day_features(fields, H=640, W=480):
+    """
+    Stacks the seven raveled fields of one day (SST, Salt, hfss, rsds, rss, hfls,
+    mld1, as in the pickle) into a (1, H, W, C) float32 feature tensor.
+    """
+    X = np.empty((1, H, W, len(fields)), dtype=np.float32)
+    for c, field in enumerate(fields):
+        X[0, ..., c] = np.asarray(field).reshape(H, W)
+    return X
 
 def prepare_test_data(year, dayS, dayE):
-    SST, Salt, hfss, rsds, rss, hfls, mld1, pds_local, pds_local_salt, filenames, days = load_raw_data(year)
-    X_test, y_test = testingdata(
-        SST[-days:], Salt[-days:], hfss[-days:], rsds[-days:], rss[-days:], hfls[-days:], mld1[-days:],
-        pds_local, pds_local_salt, days, dayS, dayE
-    )
+    with span('load_raw_data', year=year):
+        SST, Salt, hfss, rsds, rss, hfls, mld1, pds_local, pds_local_salt, filenames, days = load_raw_data(year)
+    with span('assemble', year=year):
+        X_test, y_test, _ = assemble([SST, Salt, hfss, rsds, rss, hfls, mld1], pds_local, dayS, dayE)
     return X_test, y_test, filenames
@@ -0,0 +1,225 @@
+#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+"""
+distill.py
+
+Summary:
+    Distils the trained U-Net (teacher, ~7.7M parameters) into compact student
+    U-Nets (model.build_student_unet) for high-volume CPU inference
+    (ensembles, hindcasts).
+
+    Each student is trained on the same patch pipeline as train.py (land-aware
+    sampler, fixed validation tiles), with the teacher's prediction of every
+    batch as the main target:
+        loss = (1 - DISTILL_ALPHA) * MSE(student, teacher) + DISTILL_ALPHA * MSE(student, ROMS)
+    The data are scaled with the teacher's scalers, so both see the same inputs.
+
+    For every size in STUDENT_FILTERS (and the teacher) it reports parameters,
+    validation RMSE against ROMS and against the teacher (degC), and the
+    full-image latency (ms/day) of the inference model, which includes the
+    in-graph scaling as in production. The fastest student whose RMSE is within
+    DISTILL_MAX_RMSE_INCREASE of the teacher's (or the most accurate one) is
+    exported to MODEL_DIR as student.json + student_weights.h5. It is then used by
+    test_full_inference, operational.py and serve.py with
+    SST_INFERENCE_MODEL=student.
+
+Inputs:
+    - Processed data for the given years (same as train.py)
+    - unet_weights.h5 and scalers.pkl in Config.MODEL_DIR (written by train.py)
+
+Outputs:
+    - output/distill/student_<filters>_weights.h5 for every size
+    - output/distill/distill_table.csv / .json (size / accuracy / latency table)
+    - models/student.json, models/student_weights.h5 (exported student)
+
+Usage:
+    python cli.py distill
+    python cli.py distill --years 2015 2016 --day-end 365 --filters 8 16 --export 16
+"""
+#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+# distill.py
+import csv
+import json
+import os
+import pickle
+import shutil
+import time
+import numpy as np
+import tensorflow as tf
+
+from config import Config
+
+from profiling.tracer import span
+
+
+class Distiller(tf.keras.Model):
+    """Trains `student` towards the frozen `teacher` (and, with weight alpha, the ROMS target)."""
+
+    def __init__(self, student, teacher, alpha):
+        super().__init__()
+        self.student = student
+        self.teacher = teacher
+        self.teacher.trainable = False
+        self.alpha = alpha
+        self.loss_tracker = tf.keras.metrics.Mean(name='loss')
+        self.rmse = tf.keras.metrics.RootMeanSquaredError(name='rmse')
+        self.rmse_teacher = tf.keras.metrics.RootMeanSquaredError(name='rmse_teacher')
+
+    @property
+    def metrics(self):
+        return [self.loss_tracker, self.rmse, self.rmse_teacher]
+
+    def call(self, inputs, training=False):
+        return self.student(inputs, training=training)
+
+    def _loss(self, y, t, s):
+        return (1.0 - self.alpha) * tf.reduce_mean(tf.square(t - s)) + self.alpha * tf.reduce_mean(tf.square(y - s))
+
+    def _update(self, loss, y, t, s):
+        self.loss_tracker.update_state(loss)
+        self.rmse.update_state(y, s)
+        self.rmse_teacher.update_state(t, s)
+        return {m.name: m.result() for m in self.metrics}
+
+    def train_step(self, data):
+        inputs, y = data
+        t = self.teacher(inputs, training=False)
+        with tf.GradientTape() as tape:
+            s = self.student(inputs, training=True)
+            loss = self._loss(y, t, s)
+        grads = tape.gradient(loss, self.student.trainable_variables)
+        self.optimizer.apply_gradients(zip(grads, self.student.trainable_variables))
+        return self._update(loss, y, t, s)
+
+    def test_step(self, data):
+        inputs, y = data
+        t = self.teacher(inputs, training=False)
+        s = self.student(inputs, training=False)
+        return self._update(self._loss(y, t, s), y, t, s)
+
+
+def full_image_latency(model, stats, shape, days=None, repeat=3):
+    """Best ms/day of predict_full with the in-graph-scaling inference model at full resolution."""
+    from model import build_inference_model
+    from test_full_inference import predict_full
+
+    days = days or Config.SERVE_MAX_BATCH
+    infer = build_inference_model(model, stats)
+    X = np.random.default_rng(0).standard_normal((days,) + tuple(shape)).astype(np.float32)
+    predict_full(infer, X[:1])  # build + trace outside the timed region
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        predict_full(infer, X)
+        best = min(best, time.perf_counter() - t0)
+    return 1000.0 * best / days
+
+
+def _row(name, filters, model, rmse, rmse_teacher, ms):
+    return {'model': name, 'base_filters': filters, 'params': int(model.count_params()),
+            'val_rmse_degC': rmse, 'rmse_vs_teacher_degC': rmse_teacher, 'ms_per_day': ms}
+
+
+def write_table(rows, out_dir):
+    teacher = rows[0]
+    for r in rows:
+        r['speedup'] = teacher['ms_per_day'] / r['ms_per_day']
+        r['params_ratio'] = r['params'] / teacher['params']
+    with open(os.path.join(out_dir, 'distill_table.json'), 'w') as f:
+        json.dump(rows, f, indent=2)
+    with open(os.path.join(out_dir, 'distill_table.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print(f"\n{'model':<12}{'params':>12}{'val RMSE':>10}{'vs teacher':>12}{'ms/day':>10}{'speedup':>9}")
+    for r in rows:
+        vs = '-' if r['rmse_vs_teacher_degC'] is None else f"{r['rmse_vs_teacher_degC']:.4f}"
+        print(f"{r['model']:<12}{r['params']:>12,}{r['val_rmse_degC']:>10.4f}{vs:>12}"
+              f"{r['ms_per_day']:>10.1f}{r['speedup']:>8.1f}x")
+
+
+def pick_student(rows, export=None):
+    """The requested size, else the fastest student within DISTILL_MAX_RMSE_INCREASE, else the most accurate."""
+    students = rows[1:]
+    if export is not None:
+        return next(r for r in students if r['base_filters'] == export)
+    limit = rows[0]['val_rmse_degC'] * (1 + Config.DISTILL_MAX_RMSE_INCREASE)
+    ok = [r for r in students if r['val_rmse_degC'] <= limit]
+    return min(ok, key=lambda r: r['ms_per_day']) if ok else min(students, key=lambda r: r['val_rmse_degC'])
+
+
+def main(years=(2015, 2016, 2017, 2018, 2019, 2020), dayS=0, dayE=1, filters=None, export=None):
+    from data_utils import prepare_train_data
+    from model import build_unet, build_student_unet, load_scaler_stats
+    from precision import set_precision
+    from validation import make_val_ds
+    import train
+
+    if Config.TEMPORAL_WINDOW > 1:
+        raise ValueError("distill.py feeds single days; models trained with TEMPORAL_WINDOW > 1 run through "
+                         "test_full_inference.py")
+    Config.ensure_directories()
+    set_precision('float32')  # custom train step without loss scaling
+    filters = filters or Config.STUDENT_FILTERS
+    if export is not None and export not in filters:
+        raise ValueError(f"--export {export} is not one of the student sizes to train ({', '.join(map(str, filters))})")
+    out_dir = os.path.join(Config.OUTPUT_DIR, 'distill')
+    os.makedirs(out_dir, exist_ok=True)
+
+    # the teacher's scalers, so teacher and students see exactly the training inputs
+    with open(os.path.join(Config.MODEL_DIR, 'scalers.pkl'), 'rb') as f:
+        scalers = pickle.load(f)
+    scalers = (scalers['scaler_X'], scalers['scaler_y'])
+    stats = load_scaler_stats(Config.MODEL_DIR)
+    y_scale = float(stats['scale_y'][0])
+
+    with span('prepare_train_data', years=len(years)):
+        (X_tr, m_tr, y_tr), (X_val, m_val, y_val), _ = prepare_train_data(list(years), dayS, dayE, scalers)
+    full_shape = X_tr.shape[1:]
+    patch_shape = (Config.PATCH_SIZE, Config.PATCH_SIZE, X_tr.shape[-1])
+
+    sampler, _ = train.make_sampler(m_tr)
+    train_ds = train.make_ds(X_tr, m_tr, y_tr, shuffle=True, sampler=sampler)
+    val_ds, val_steps = make_val_ds(X_val, m_val, y_val)
+
+    teacher = build_unet(patch_shape)
+    teacher.load_weights(os.path.join(Config.MODEL_DIR, 'unet_weights.h5'))
+    teacher.compile(loss='mse', metrics=[tf.keras.metrics.RootMeanSquaredError(name='rmse')])
+    with span('evaluate_teacher'):
+        teacher_rmse = teacher.evaluate(val_ds, steps=val_steps, return_dict=True, verbose=0)['rmse']
+    full_teacher = build_unet(full_shape)
+    full_teacher.set_weights(teacher.get_weights())
+    rows = [_row('teacher', 64, full_teacher, teacher_rmse * y_scale, None,
+                 full_image_latency(full_teacher, stats, full_shape))]
+
+    for f in filters:
+        print(f"\nDistilling student with {f} base filters...")
+        student = build_student_unet(patch_shape, f)
+        distiller = Distiller(student, teacher, Config.DISTILL_ALPHA)
+        distiller.compile(optimizer=tf.keras.optimizers.Adam(Config.LEARNING_RATE))
+        with span('distill', filters=f):
+            distiller.fit(
+                train_ds, epochs=Config.DISTILL_EPOCHS, steps_per_epoch=Config.STEPS_PER_EPOCH,
+                validation_data=val_ds, validation_steps=val_steps,
+                callbacks=[tf.keras.callbacks.EarlyStopping(patience=5, restore_best_weights=True, monitor='val_loss'),
+                           tf.keras.callbacks.ReduceLROnPlateau(patience=3, factor=0.5, monitor='val_loss')]
+            )
+        result = distiller.evaluate(val_ds, steps=val_steps, return_dict=True, verbose=0)
+        student.save_weights(os.path.join(out_dir, f'student_{f}_weights.h5'))
+
+        full_student = build_student_unet(full_shape, f)
+        full_student.set_weights(student.get_weights())
+        rows.append(_row(f'student_{f}', f, full_student, result['rmse'] * y_scale,
+                         result['rmse_teacher'] * y_scale, full_image_latency(full_student, stats, full_shape)))
+
+    write_table(rows, out_dir)
+
+    chosen = pick_student(rows, export)
+    shutil.copyfile(os.path.join(out_dir, f"student_{chosen['base_filters']}_weights.h5"),
+                    os.path.join(Config.MODEL_DIR, 'student_weights.h5'))
+    with open(os.path.join(Config.MODEL_DIR, 'student.json'), 'w') as f:
+        json.dump({'base_filters': chosen['base_filters'], 'table': os.path.join(out_dir, 'distill_table.csv')}, f)
+    print(f"\n✅ Exported {chosen['model']} ({chosen['speedup']:.1f}x, RMSE {chosen['val_rmse_degC']:.4f} degC) "
+          f"to {Config.MODEL_DIR}; use it with SST_INFERENCE_MODEL=student")
+    return rows
@@ -0,0 +1,255 @@
+#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+"""
+evaluate.py
+
+Summary:
+    Evaluation harness: runs a trained model (U-Net or distilled student) over
+    many test years and day ranges in parallel worker processes and reports
+    bias, RMSE, MAE and correlation per year, month, season and spatial
+    subregion.
+
+    The parent reads the scaling statistics once and hands them, with the
+    weights' location, to every worker. TensorFlow models cannot be shared
+    between processes, so each worker builds the inference model once
+    (model.load_inference_model) and keeps it for all its tasks. A task is one
+    (year, day range). The worker loads the year once, assembles EVAL_CHUNK_DAYS
+    days at a time, predicts them and folds the errors into running sums per
+    (month, subregion). Predictions are never kept or sent back. Each task
+    returns a small (12, regions, 9) array of sums, so memory does not grow with
+    the archive and any grouping can be derived from the sums afterwards.
+
+    Subregions are EVAL_REGION_BLOCKS row x column blocks of the grid (r<i>c<j>,
+    in array order), or the labels of an (H, W) .npy map (EVAL_REGION_MAP or
+    --regions; -1 = excluded). Only water pixels (the model's mask) are scored.
+    Seasons are DJF, MAM, JJA and SON.
+
+Inputs:
+    - Processed data and pds_local_sstnsalt_<year>.p for the test years
+    - Model weights and normalisation.npz in Config.MODEL_DIR
+
+Outputs:
+    - output/evaluation/<model>_summary.csv / .json: one row per group
+      (all, year, season, month, region, season/region)
+    - output/evaluation/<model>_sums.npz: the raw (year, month, region, stat) sums
+    If any task fails, the outputs are still written (the failed year / day
+    ranges are listed in the .json and printed under the table) and main()
+    raises RuntimeError, so `cli.py evaluate` exits non-zero.
+
+Usage:
+    python cli.py evaluate --years 2011 2012 2013 --workers 4
+    python cli.py evaluate --years 2011 --day-start 0 --day-end 90 --model student
+"""
+#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+# evaluate.py
+import argparse
+import csv
+import datetime
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from multiprocessing import get_context
+import numpy as np
+
+from config import Config
+
+from profiling.tracer import span
+
+H, W = 640, 480
+SEASONS = {'DJF': (11, 0, 1), 'MAM': (2, 3, 4), 'JJA': (5, 6, 7), 'SON': (8, 9, 10)}
+# running sums per (month, region); y and prediction are taken relative to the training mean
+STATS = ('n', 'e', 'e2', 'ae', 'y', 'y2', 'p', 'p2', 'yp')
+
+
+#%% Subregions
+
+def region_map(path=None, blocks=None):
+    """(H, W) int label map and the region names."""
+    path = path or Config.EVAL_REGION_MAP
+    if path:
+        labels = np.load(path).astype(np.int32)
+        if labels.shape != (H, W):
+            raise ValueError(f"Region map {path} is {labels.shape}, expected {(H, W)}")
+        return labels, [f'region_{k}' for k in range(labels.max() + 1)]
+
+    nr, nc = blocks or Config.EVAL_REGION_BLOCKS
+    rows = np.repeat(np.arange(nr), [len(b) for b in np.array_split(np.arange(H), nr)])
+    cols = np.repeat(np.arange(nc), [len(b) for b in np.array_split(np.arange(W), nc)])
+    return rows[:, None] * nc + cols[None, :], [f'r{i}c{j}' for i in range(nr) for j in range(nc)]
+
+
+#%% Streaming metrics
+
+def months_of(year, d0, d1):
+    """Month (0-11) of the days d0..d1-1 of a year (day 0 = 1 January)."""
+    jan1 = datetime.date(year, 1, 1)
+    return np.array([(jan1 + datetime.timedelta(days=d)).month - 1 for d in range(d0, d1)])
+
+
+def accumulate(sums, y_true, y_pred, mask, months, labels, ref):
+    """Adds a chunk of days to sums (12, regions, len(STATS)); y/pred/mask are (n, H, W, 1)."""
+    R = sums.shape[1]
+    codes = months[:, None] * R + labels.reshape(1, -1)               # (n, H*W)
+    valid = mask.reshape(len(months), -1).astype(bool) & (labels.reshape(1, -1) >= 0)
+
+    c = codes[valid]
+    y = y_true.reshape(len(months), -1)[valid].astype(np.float64) - ref
+    p = y_pred.reshape(len(months), -1)[valid].astype(np.float64) - ref
+    e = p - y
+    for k, w in enumerate((None, e, e * e, np.abs(e), y, y * y, p, p * p, y * p)):
+        sums[..., k] += np.bincount(c, weights=w, minlength=12 * R).reshape(12, R)
+
+
+def metrics(s):
+    """bias, RMSE, MAE and correlation from summed STATS (last axis)."""
+    n, e, e2, ae, y, y2, p, p2, yp = np.moveaxis(np.asarray(s, dtype=np.float64), -1, 0)
+    if n == 0:
+        return {'n': 0, 'bias': math.nan, 'rmse': math.nan, 'mae': math.nan, 'corr': math.nan}
+    cov = n * yp - y * p
+    var = (n * y2 - y * y) * (n * p2 - p * p)
+    return {'n': int(n), 'bias': e / n, 'rmse': math.sqrt(e2 / n), 'mae': ae / n,
+            'corr': cov / math.sqrt(var) if var > 0 else math.nan}
+
+
+def summarise(sums, years, names):
+    """Rows (group, key, n, bias, rmse, mae, corr) from the (year, month, region, stat) sums."""
+    by_month = sums.sum(axis=0)                                       # (12, R, S)
+    seasons = {s: by_month[list(m)].sum(axis=0) for s, m in SEASONS.items()}    # (R, S)
+
+    rows = [('all', 'all', sums.sum(axis=(0, 1, 2)))]
+    rows += [('year', str(y), sums[i].sum(axis=(0, 1))) for i, y in enumerate(years)]
+    rows += [('season', s, v.sum(axis=0)) for s, v in seasons.items()]
+    rows += [('month', str(m + 1), by_month[m].sum(axis=0)) for m in range(12)]
+    rows += [('region', r, by_month[:, k].sum(axis=0)) for k, r in enumerate(names)]
+    rows += [('season/region', f'{s}/{r}', v[k]) for s, v in seasons.items() for k, r in enumerate(names)]
+    return [{'group': g, 'key': key, **metrics(s)} for g, key, s in rows if s[0] > 0]
+
+
+#%% Tasks (run in worker processes)
+
+_worker = {}
+
+def _init_worker(model_dir, variant, stats, labels, threads):
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(2)
+    from model import load_inference_model
+
+    with span('build_model', variant=variant):
+        _worker['model'] = load_inference_model(model_dir, (H, W), variant, stats)
+    _worker['labels'] = labels
+    _worker['ref'] = float(stats['mean_y'][0])
+
+
+@lru_cache(maxsize=1)
+def _year_data(year):
+    from data_utils import load_raw_data
+    SST, Salt, hfss, rsds, rss, hfls, mld1, pds_local, _, _, days = load_raw_data(year)
+    return [SST, Salt, hfss, rsds, rss, hfls, mld1], pds_local, days
+
+
+def run_task(year, dayS, dayE, n_regions, chunk):
+    """Evaluates days dayS..dayE-1 of a year; returns (year, sums, days evaluated)."""
+    from data_utils import assemble
+    from test_full_inference import predict_full
+
+    sums = np.zeros((12, n_regions, len(STATS)))
+    with span('load_raw_data', year=year):
+        variables, target, days = _year_data(year)
+    dayE = min(dayE, days)
+    for d0 in range(dayS, dayE, chunk):
+        d1 = min(d0 + chunk, dayE)
+        with span('assemble', year=year, days=d1 - d0):
+            X, y, _ = assemble(variables, target, d0, d1)
+        y_pred, mask = predict_full(_worker['model'], X)
+        with span('accumulate', days=d1 - d0):
+            accumulate(sums, y, y_pred, mask, months_of(year, d0, d1), _worker['labels'], _worker['ref'])
+    return year, sums, max(dayE - dayS, 0)
+
+
+def make_tasks(years, dayS, dayE, workers):
+    """(year, d0, d1) ranges: each year split so that there are at least as many tasks as workers."""
+    splits = max(1, math.ceil(workers / len(years)))
+    bounds = np.linspace(dayS, dayE, splits + 1).round().astype(int)
+    return [(y, int(a), int(b)) for y in years for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+#%% Driver
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Parallel multi-year evaluation by season and subregion.')
+    parser.add_argument('--years', type=int, nargs='+', default=[2011])
+    parser.add_argument('--day-start', type=int, default=0)
+    parser.add_argument('--day-end', type=int, default=366, help='exclusive; clipped to the days of each year')
+    parser.add_argument('--model', default=Config.INFERENCE_MODEL, choices=['unet', 'student'])
+    parser.add_argument('--model-dir', default=Config.MODEL_DIR)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=None,
+                        help='TensorFlow intra-op threads per worker (default: cores / workers)')
+    parser.add_argument('--chunk-days', type=int, default=Config.EVAL_CHUNK_DAYS)
+    parser.add_argument('--regions', default=None, help='(H, W) int .npy region map (default: EVAL_REGION_BLOCKS)')
+    args = parser.parse_args(argv)
+
+    from model import load_scaler_stats
+
+    if Config.TEMPORAL_WINDOW > 1:
+        raise ValueError("evaluate.py feeds single days; models trained with TEMPORAL_WINDOW > 1 run through "
+                         "test_full_inference.py")
+    Config.ensure_directories()
+    out_dir = os.path.join(Config.OUTPUT_DIR, 'evaluation')
+    os.makedirs(out_dir, exist_ok=True)
+
+    stats = load_scaler_stats(args.model_dir)
+    labels, names = region_map(args.regions)
+    years = sorted(set(args.years))
+    tasks = make_tasks(years, args.day_start, args.day_end, args.workers)
+    threads = args.threads or max(1, (os.cpu_count() or 2) // args.workers)
+    print(f"Evaluating {args.model} on {len(years)} years ({len(tasks)} tasks) "
+          f"with {args.workers} workers x {threads} threads, {len(names)} subregions")
+
+    sums = np.zeros((len(years), 12, len(names), len(STATS)))
+    failed, n_days = [], 0
+    t0 = time.perf_counter()
+    ctx = get_context('spawn')  # TensorFlow is not fork-safe
+    with span('evaluate', years=len(years), tasks=len(tasks)), \
+         ProcessPoolExecutor(max_workers=args.workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(args.model_dir, args.model, stats, labels, threads)) as pool:
+        futures = {pool.submit(run_task, y, a, b, len(names), args.chunk_days): (y, a, b) for y, a, b in tasks}
+        for fut in as_completed(futures):
+            y, a, b = futures[fut]
+            try:
+                year, s, days = fut.result()
+            except Exception as e:
+                failed.append({'year': y, 'day_start': a, 'day_end': b, 'error': repr(e)})
+                print(f"  {y} days {a}-{b} failed: {e!r}")
+                continue
+            sums[years.index(year)] += s
+            n_days += days
+            print(f"  {y} days {a}-{b} done ({n_days / (time.perf_counter() - t0):.2f} days/s overall)")
+
+    rows = summarise(sums, years, names)
+    stem = os.path.join(out_dir, f'{args.model}_summary')
+    with open(stem + '.json', 'w') as f:
+        json.dump({'model': args.model, 'days': n_days, 'failed': failed, 'rows': rows}, f, indent=2)
+    with open(stem + '.csv', 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ['group', 'key'])
+        writer.writeheader()
+        writer.writerows(rows)
+    np.savez(os.path.join(out_dir, f'{args.model}_sums.npz'), sums=sums, years=years, regions=names,
+             stats=STATS, ref=stats['mean_y'])
+
+    print(f"\n{'group':<10}{'key':>8}{'pixels':>14}{'bias':>9}{'RMSE':>9}{'MAE':>9}{'corr':>8}")
+    for r in rows:
+        if r['group'] != 'season/region':
+            print(f"{r['group']:<10}{r['key']:>8}{r['n']:>14,}{r['bias']:>9.4f}{r['rmse']:>9.4f}"
+                  f"{r['mae']:>9.4f}{r['corr']:>8.4f}")
+    if failed:
+        print(f"\n❌ {len(failed)} of {len(tasks)} tasks failed; the sums above leave out:")
+        for t in sorted(failed, key=lambda t: (t['year'], t['day_start'])):
+            print(f"  {t['year']} days {t['day_start']}-{t['day_end'] - 1}: {t['error']}")
+        raise RuntimeError(f"{len(failed)} evaluation tasks failed (listed in {stem}.json); the summary is partial")
+    print(f"\n✅ {n_days} days in {time.perf_counter() - t0:.1f} s; summary in {stem}.csv")
+    return rows
@@ -11,21 +11,31 @@ Inputs:
 
 Outputs:
     - A compiled U-Net model instance with masked output
+    - An inference model that takes raw features: scaling, water mask and
+      unscaling are layers of the graph, initialised from the training statistics
 
 Functions:
     - build_unet(input_shape): returns Keras model
+    - build_student_unet(input_shape, base_filters): compact U-Net for distillation (distill.py)
+    - save_scaler_stats(model_dir, scaler_X, scaler_y): writes normalisation.npz
+    - load_scaler_stats(model_dir): reads it (or converts an older scalers.pkl)
+    - build_inference_model(unet, stats): raw (H, W, C) features -> (SST, mask)
+    - load_inference_model(model_dir, shape, variant, stats, window): U-Net (or distilled student) weights + statistics in one model
 
 Used In:
-    - train.py, test_full_inference.py
+    - train.py, test_full_inference.py, operational.py, serve.py, distill.py, evaluate.py
 """
 
 
 # model.py
+import os
+import numpy as np
 import tensorflow as tf
 from tensorflow.keras.layers import (
     Input, Conv2D, Conv2DTranspose,
     MaxPooling2D, Concatenate,
-    Multiply, BatchNormalization, Dropout
+    Multiply, BatchNormalization, Dropout,
+    Normalization, SeparableConv2D
 )
 from tensorflow.keras.models import Model
 
@@ -59,7 +69,111 @@ def build_unet(input_shape):
     u1 = Concatenate()([u1, c1])
     c7 = conv_block(u1, 64)
 
-    outputs = Conv2D(1, 1, activation='linear')(c7)
-    masked  = Multiply()([outputs, mask_in])
+    # keep the head in float32 under mixed precision policies
+    outputs = Conv2D(1, 1, activation='linear', dtype='float32')(c7)
+    masked  = Multiply(dtype='float32')([outputs, mask_in])
 
     return Model([inputs, mask_in], masked)
+
+
+def build_student_unet(input_shape, base_filters=16):
+    """
+    Compact U-Net for distillation: same inputs, mask and three down/up-sampling
+    stages as build_unet (so 640 x 480 still works), base_filters .. 8*base_filters
+    channels instead of 64 .. 512, and depthwise-separable convolutions after the
+    first layer.
+    """
+    inputs  = Input(shape=input_shape,       name='main_input')
+    mask_in = Input(shape=input_shape[:2]+(1,), name='mask_input')
+
+    def conv_block(x, filters, first=False):
+        conv = Conv2D if first else SeparableConv2D
+        x = conv(filters, 3, padding='same', kernel_initializer='he_normal')(x)
+        x = BatchNormalization()(x); x = tf.nn.relu(x)
+        x = SeparableConv2D(filters, 3, padding='same', kernel_initializer='he_normal')(x)
+        x = BatchNormalization()(x); x = tf.nn.relu(x)
+        return x
+
+    f = base_filters
+    c1 = conv_block(inputs, f, first=True); p1 = MaxPooling2D()(c1)
+    c2 = conv_block(p1, 2 * f);             p2 = MaxPooling2D()(c2)
+    c3 = conv_block(p2, 4 * f);             p3 = MaxPooling2D()(c3)
+    c4 = conv_block(p3, 8 * f)
+
+    u3 = Conv2DTranspose(4 * f, 2, strides=2, padding='same')(c4)
+    c5 = conv_block(Concatenate()([u3, c3]), 4 * f)
+    u2 = Conv2DTranspose(2 * f, 2, strides=2, padding='same')(c5)
+    c6 = conv_block(Concatenate()([u2, c2]), 2 * f)
+    u1 = Conv2DTranspose(f, 2, strides=2, padding='same')(c6)
+    c7 = conv_block(Concatenate()([u1, c1]), f)
+
+    outputs = Conv2D(1, 1, activation='linear', dtype='float32')(c7)
+    masked  = Multiply(dtype='float32')([outputs, mask_in])
+
+    return Model([inputs, mask_in], masked)
+
+#%% Inference model with in-graph scaling
+
+STATS_FILE = 'normalisation.npz'
+
+def save_scaler_stats(model_dir, scaler_X, scaler_y):
+    """Mean and scale of the fitted StandardScalers, as plain arrays (no sklearn needed to read them)."""
+    os.makedirs(model_dir, exist_ok=True)
+    np.savez(os.path.join(model_dir, STATS_FILE),
+             mean_X=scaler_X.mean_, scale_X=scaler_X.scale_, mean_y=scaler_y.mean_, scale_y=scaler_y.scale_)
+
+def load_scaler_stats(model_dir):
+    path = os.path.join(model_dir, STATS_FILE)
+    if not os.path.exists(path):
+        # models trained before the statistics were saved on their own
+        import pickle
+        with open(os.path.join(model_dir, 'scalers.pkl'), 'rb') as f:
+            scalers = pickle.load(f)
+        save_scaler_stats(model_dir, scalers['scaler_X'], scalers['scaler_y'])
+    with np.load(path) as stats:
+        return {k: stats[k].astype(np.float32) for k in stats.files}
+
+def build_inference_model(unet, stats):
+    """
+    Wraps a trained U-Net so it takes raw (unscaled) features:
+        water mask + scale inputs -> U-Net -> unscale output
+    all inside the graph, same arithmetic as StandardScaler.transform / inverse_transform.
+    The mask comes from the raw features, as in training (data_utils.assemble): after
+    scaling, land pixels are -mean/scale, not 0.
+    Outputs (SST in original units, mask), both (H, W, 1).
+    With k-day temporal inputs (k*C channels) the per-variable statistics are repeated per day.
+    """
+    shape = tuple(unet.inputs[0].shape[1:])
+    reps = shape[-1] // len(stats['mean_X'])
+    raw = Input(shape=shape, name='raw_features')
+
+    x = Normalization(mean=np.tile(stats['mean_X'], reps), variance=np.tile(stats['scale_X'], reps) ** 2,
+                      name='scale_inputs')(raw)
+    mask = tf.cast(tf.reduce_sum(raw, axis=-1, keepdims=True) != 0, tf.float32)
+    y = unet([x, mask])
+    y = Normalization(mean=stats['mean_y'], variance=stats['scale_y'] ** 2, invert=True,
+                      name='unscale_output')(y)
+
+    return Model(raw, [y, mask])
+
+def load_inference_model(model_dir, shape, variant='unet', stats=None, window=1):
+    """
+    Full-resolution model with its weights and in-graph scaling; shape is (H, W) or (H, W, C).
+    variant='student' loads the distilled student exported by distill.py (student.json,
+    student_weights.h5) instead of the U-Net; both use the same statistics.
+    stats: already loaded statistics (load_scaler_stats), read from model_dir when None.
+    window: days of input context the model was trained with (TEMPORAL_WINDOW); the
+    model then takes window * C channels (temporal.predict_windows).
+    """
+    stats = load_scaler_stats(model_dir) if stats is None else stats
+    shape = tuple(shape)[:2] + (window * len(stats['mean_X']),)
+    if variant == 'student':
+        import json
+        with open(os.path.join(model_dir, 'student.json')) as f:
+            student = json.load(f)
+        model = build_student_unet(shape, student['base_filters'])
+        model.load_weights(os.path.join(model_dir, 'student_weights.h5'))
+    else:
+        model = build_unet(shape)
+        model.load_weights(os.path.join(model_dir, 'unet_weights.h5'))
+    return build_inference_model(model, stats)
@@ -0,0 +1,134 @@
+#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+"""
+operational.py
+
+Summary:
+    Daily operational mode: interpolates and downscales a single new day end to
+    end, instead of re-running interpolationroutine(year) and reloading the
+    whole year's pickle.
+
+    For each requested date:
+      1. reads only that day from each ACCESS-S2 / ERA5 file (lazy xarray
+         datasets, kept open per year),
+      2. regrids the seven variables with the interpolation-engine routines,
+         reusing the cached ROMS grid, land mask and RBF weights (GridCache,
+         shared on disk with the multi-year runs via GRID_CACHE_DIR),
+      3. stacks them into a (1, H, W, C) feature tensor and runs the inference
+         model (training statistics in the graph), which stays loaded between days,
+      4. writes the downscaled SST into that day's slot of the output store.
+
+    The first day pays for the model build and the grid work; later days in the
+    same process only pay for the daily fits and the forward pass.
+
+Inputs:
+    - Raw daily NetCDF files under Config.INTERP_DATA_ROOT (data/access, data/era5, data/roms)
+    - unet_weights.h5 and normalisation.npz in Config.MODEL_DIR (written by train.py)
+
+Outputs:
+    - output/daily/sst_<year>.npy (see daily_store.py) and timings per stage
+
+Usage:
+    python cli.py operational 2024-03-05
+    python cli.py operational 2024-03-01 2024-03-05 --range   # catch up on several days
+"""
+#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+# operational.py
+import argparse
+import datetime
+import time
+import numpy as np
+
+from config import Config
+from daily_store import DailyStore
+
+from profiling.tracer import span
+
+
+class DailyDownscaler:
+    """
+    Keeps everything that does not change between days resident: the U-Net
+    (with its scaling layers), the grid cache and the open source files.
+    """
+
+    def __init__(self, model_dir=None, data_root=None, store=None):
+        from interpolation.regrid import GridCache
+        from model import load_inference_model
+
+        if Config.TEMPORAL_WINDOW > 1:
+            raise ValueError("operational.py feeds single days; models trained with TEMPORAL_WINDOW > 1 run through "
+                             "test_full_inference.py")
+        self.model_dir = model_dir or Config.MODEL_DIR
+        self.data_root = data_root or Config.INTERP_DATA_ROOT
+        self.store = store or DailyStore(Config.DAILY_DIR)
+        self.cache = GridCache(Config.GRID_CACHE_DIR)
+        self._sources = {}
+
+        with span('build_model'):
+            # scaling, water mask and unscaling are layers of this model
+            self.model = load_inference_model(self.model_dir, self.store.shape, Config.INFERENCE_MODEL)
+
+    def sources(self, year):
+        from utils.data_generator import open_sources
+        if year not in self._sources:
+            self._sources = {year: open_sources(year, self.data_root)}  # one year open at a time
+        return self._sources[year]
+
+    def run(self, date):
+        """Interpolates, downscales and stores one day. Returns the timings in seconds."""
+        from utils.data_generator import interpolate_day
+        from data_utils import day_features
+        from test_full_inference import predict_full
+
+        T = date.timetuple().tm_yday - 1
+        timings = {}
+        t0 = time.perf_counter()
+        with span('operational_day', date=date.isoformat()):
+            datasets, ds_local = self.sources(date.year)
+            with span('interpolate_day', day=T):
+                fields = interpolate_day(datasets, ds_local, T, self.cache)
+            timings['interpolate_s'] = time.perf_counter() - t0
+
+            t1 = time.perf_counter()
+            X = day_features(fields, *self.store.shape)
+            y_pred, mask = predict_full(self.model, X)
+            timings['downscale_s'] = time.perf_counter() - t1
+
+            t2 = time.perf_counter()
+            with span('store', day=T):
+                self.store.write(date, np.where(mask[0, ..., 0] > 0, y_pred[0, ..., 0], np.nan))
+            timings['store_s'] = time.perf_counter() - t2
+        timings['total_s'] = time.perf_counter() - t0
+        return timings
+
+
+def _dates(args):
+    dates = [datetime.date.fromisoformat(d) for d in args.dates]
+    if args.range:
+        start, end = dates[0], dates[-1]
+        dates = [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+    return dates
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Interpolate and downscale single days into the daily store.')
+    parser.add_argument('dates', nargs='+', help='YYYY-MM-DD')
+    parser.add_argument('--range', action='store_true', help='treat the first and last date as an inclusive range')
+    parser.add_argument('--skip-existing', action='store_true', help='skip days already in the store')
+    parser.add_argument('--data-root', default=None, help='root of data/access, data/era5 and data/roms')
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    downscaler = DailyDownscaler(data_root=args.data_root)
+    print(f"Model loaded in {time.perf_counter() - t0:.1f} s")
+
+    for date in _dates(args):
+        if args.skip_existing and date in downscaler.store:
+            print(f"{date}: already in the store, skipped")
+            continue
+        timings = downscaler.run(date)
+        print(f"{date}: interpolate {timings['interpolate_s']:.1f} s, downscale {timings['downscale_s']:.2f} s, "
+              f"store {timings['store_s']:.2f} s, total {timings['total_s']:.1f} s")
+
+    print(f"Grid cache: {downscaler.cache.stats()}")
+    print("✅ Daily products written to", downscaler.store.root)
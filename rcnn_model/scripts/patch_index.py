@@ -0,0 +1,138 @@
+"""
+patch_index.py
+
+Summary:
+    Land-aware sampling of training crops. Uniform crop offsets on the WA grid
+    often land mostly on land, where the mask (and therefore the loss) is zero,
+    so part of every batch is wasted compute.
+
+    PatchIndex counts the ocean pixels under every possible crop offset once,
+    using an integral image (summed-area table) of each mask, so each count is
+    four lookups instead of a PATCH_SIZE^2 sum. Days with identical masks (the
+    usual case, the land mask is static) share one table.
+
+    PatchSampler draws (day, row, col) offsets from that index, either
+    uniformly among offsets with at least `min_ocean_fraction` ocean, or with
+    probability proportional to the ocean fraction ('ocean' weighting).
+
+Inputs:
+    - mask array (n, H, W, 1) from prepare_train_data()
+
+Outputs:
+    - PatchSampler used by data_utils.generate_patches()
+    - ocean_pixel_report(): effective ocean pixels per batch, uniform vs sampler
+
+Classes/Functions:
+    - ocean_counts(mask2d, patch_size)
+    - PatchIndex(mask, patch_size)
+    - PatchSampler(index, min_ocean_fraction, weighting, rng)
+    - ocean_pixel_report(index, sampler, batch_size, n_batches)
+
+Used In:
+    - data_utils.py, train.py
+"""
+
+# patch_index.py
+import hashlib
+import numpy as np
+
+
+def ocean_counts(mask2d, patch_size):
+    """Ocean pixels under each crop offset, shape (H-ps+1, W-ps+1), via an integral image."""
+    ps = patch_size
+    H, W = mask2d.shape
+    S = np.zeros((H + 1, W + 1), dtype=np.int64)
+    S[1:, 1:] = (mask2d != 0).cumsum(axis=0).cumsum(axis=1)
+    counts = S[ps:, ps:] - S[:-ps, ps:] - S[ps:, :-ps] + S[:-ps, :-ps]
+    # ps*ps <= 65535 for patches up to 255 pixels
+    return counts.astype(np.uint16 if ps * ps <= np.iinfo(np.uint16).max else np.uint32)
+
+
+class PatchIndex:
+    def __init__(self, mask, patch_size):
+        self.patch_size = patch_size
+        n, H, W = mask.shape[:3]
+        self.offsets_shape = (H - patch_size + 1, W - patch_size + 1)
+
+        self.day_mask_id = np.empty(n, dtype=np.int64)
+        self.counts = []
+        seen = {}
+        for i in range(n):
+            m = mask[i, ..., 0] if mask.ndim == 4 else mask[i]
+            key = hashlib.blake2b(np.packbits(m != 0).tobytes(), digest_size=16).digest()
+            if key not in seen:
+                seen[key] = len(self.counts)
+                self.counts.append(ocean_counts(m, patch_size))
+            self.day_mask_id[i] = seen[key]
+
+    @property
+    def n_days(self):
+        return len(self.day_mask_id)
+
+    def fraction(self, day, r, c):
+        return self.counts[self.day_mask_id[day]][r, c] / float(self.patch_size ** 2)
+
+
+class PatchSampler:
+    def __init__(self, index, min_ocean_fraction=0.0, weighting='uniform', rng=None):
+        if weighting not in ('uniform', 'ocean'):
+            raise ValueError("weighting must be 'uniform' or 'ocean'")
+        self.index = index
+        self.rng = rng if rng is not None else np.random.RandomState()
+        self.weighting = weighting
+        min_count = min_ocean_fraction * index.patch_size ** 2
+
+        self._valid, self._cdf = [], []
+        for counts in index.counts:
+            flat = counts.ravel()
+            valid = np.flatnonzero((flat >= min_count) & (flat > 0))
+            self._valid.append(valid)
+            self._cdf.append(np.cumsum(flat[valid], dtype=np.float64) if weighting == 'ocean' else None)
+
+        self._days = np.array([i for i in range(index.n_days)
+                               if self._valid[index.day_mask_id[i]].size], dtype=np.int64)
+        if self._days.size == 0:
+            raise ValueError(f"No crop has at least {min_ocean_fraction:.0%} ocean; lower the threshold")
+
+    def sample(self):
+        """Returns a (day, row, col) crop offset."""
+        i = self._days[self.rng.randint(self._days.size)]
+        u = self.index.day_mask_id[i]
+        valid = self._valid[u]
+        if self.weighting == 'ocean':
+            cdf = self._cdf[u]
+            k = valid[min(np.searchsorted(cdf, self.rng.random_sample() * cdf[-1], side='right'), valid.size - 1)]
+        else:
+            k = valid[self.rng.randint(valid.size)]
+        r, c = divmod(int(k), self.index.offsets_shape[1])
+        return int(i), r, c
+
+
+def ocean_pixel_report(index, sampler, batch_size, n_batches=200, seed=0):
+    """
+    Mean ocean pixels per batch for the old uniform crops vs `sampler`,
+    estimated from the index (no data is touched).
+    """
+    rng = np.random.RandomState(seed)
+    Hc, Wc = index.offsets_shape
+
+    def batch_pixels(draw):
+        return np.mean([sum(int(index.counts[index.day_mask_id[i]][r, c]) for i, r, c in
+                            (draw() for _ in range(batch_size))) for _ in range(n_batches)])
+
+    uniform = batch_pixels(lambda: (rng.randint(index.n_days), rng.randint(Hc), rng.randint(Wc)))
+    saved_rng, sampler.rng = sampler.rng, rng
+    try:
+        sampled = batch_pixels(sampler.sample)
+    finally:
+        sampler.rng = saved_rng
+
+    total = batch_size * index.patch_size ** 2
+    return {
+        'pixels_per_batch': total,
+        'uniform_ocean_pixels': float(uniform),
+        'sampler_ocean_pixels': float(sampled),
+        'uniform_ocean_fraction': float(uniform) / total,
+        'sampler_ocean_fraction': float(sampled) / total,
+        'gain': float(sampled) / float(uniform) if uniform else float('inf'),
+    }
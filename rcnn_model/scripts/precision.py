@@ -0,0 +1,124 @@
+"""
+precision.py
+
+Summary:
+    Training performance mode for the U-Net: numeric precision policy,
+    loss-scaled optimiser, XLA-compiled train steps and gradient accumulation.
+
+    - 'mixed_bfloat16' runs convs in bfloat16 with float32 variables; this is
+      the fast path on CPUs with AVX512-BF16/AMX and needs no loss scaling.
+    - 'mixed_float16' additionally wraps the optimiser in a LossScaleOptimizer.
+    - The output head of build_unet always computes in float32.
+    - GRAD_ACCUM_STEPS > 1 averages gradients over that many batches before
+      each optimiser update, i.e. an effective batch of BATCH_SIZE * steps.
+
+Functions:
+    - training_policy(): policy name derived from Config
+    - set_precision(policy): sets the global Keras policy
+    - make_optimizer(learning_rate, policy): Adam, loss-scaled if needed
+    - wrap_for_training(unet, accum_steps): adds gradient accumulation
+
+Classes:
+    - GradientAccumulationModel: functional model with an accumulating train_step
+
+Used In:
+    - train.py, benchmarks/run_benchmarks.py
+
+Usage:
+    policy = set_precision(training_policy())
+    model  = wrap_for_training(build_unet(shape), Config.GRAD_ACCUM_STEPS)
+    model.compile(optimizer=make_optimizer(lr, policy), loss='mse', jit_compile=Config.JIT_COMPILE)
+"""
+
+# precision.py
+import tensorflow as tf
+
+from config import Config
+
+POLICIES = ('float32', 'mixed_bfloat16', 'mixed_float16')
+
+
+def training_policy():
+    return Config.PRECISION_POLICY if Config.MIXED_PRECISION else 'float32'
+
+
+def set_precision(policy):
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown precision policy {policy!r}, expected one of {POLICIES}")
+    tf.keras.mixed_precision.set_global_policy(policy)
+    return policy
+
+
+def make_optimizer(learning_rate, policy='float32'):
+    optimizer = tf.keras.optimizers.Adam(learning_rate)
+    if policy == 'mixed_float16':
+        # float16 gradients underflow without dynamic loss scaling
+        optimizer = tf.keras.mixed_precision.LossScaleOptimizer(optimizer)
+    return optimizer
+
+
+class GradientAccumulationModel(tf.keras.Model):
+    """
+    Functional model whose train_step sums gradients over `accum_steps`
+    batches and applies them once. Metrics are still updated every batch.
+    """
+
+    def __init__(self, *args, accum_steps=1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.accum_steps = int(accum_steps)
+        self._accum_counter = tf.Variable(0, dtype=tf.int64, trainable=False, name='accum_counter')
+        self._accum_grads = [
+            tf.Variable(tf.zeros_like(v), trainable=False, name=f'accum_{i}')
+            for i, v in enumerate(self.trainable_variables)
+        ]
+
+    def compile(self, *args, **kwargs):
+        super().compile(*args, **kwargs)
+        # create the Adam slots up front; they cannot be created inside tf.cond
+        inner = getattr(self.optimizer, 'inner_optimizer', self.optimizer)
+        inner.build(self.trainable_variables)
+
+    def _apply_accumulated(self):
+        self.optimizer.apply_gradients(zip([g.read_value() for g in self._accum_grads],
+                                           self.trainable_variables))
+        for g in self._accum_grads:
+            g.assign(tf.zeros_like(g))
+        return tf.constant(True)
+
+    def train_step(self, data):
+        x, y = data
+        loss_scaled = isinstance(self.optimizer, tf.keras.mixed_precision.LossScaleOptimizer)
+
+        with tf.GradientTape() as tape:
+            y_pred = self(x, training=True)
+            loss = self.compiled_loss(y, y_pred, regularization_losses=self.losses)
+            scaled_loss = self.optimizer.get_scaled_loss(loss) if loss_scaled else loss
+        grads = tape.gradient(scaled_loss, self.trainable_variables)
+        if loss_scaled:
+            grads = self.optimizer.get_unscaled_gradients(grads)
+
+        for acc, g in zip(self._accum_grads, grads):
+            acc.assign_add(tf.cast(g, acc.dtype) / self.accum_steps)
+        self._accum_counter.assign_add(1)
+        tf.cond(self._accum_counter % self.accum_steps == 0,
+                self._apply_accumulated, lambda: tf.constant(False))
+
+        self.compiled_metrics.update_state(y, y_pred)
+        return {m.name: m.result() for m in self.metrics}
+
+    def get_config(self):
+        config = super().get_config()
+        config['accum_steps'] = self.accum_steps
+        return config
+
+
+def wrap_for_training(unet, accum_steps=1):
+    """
+    Returns `unet` itself when accum_steps <= 1, otherwise a
+    GradientAccumulationModel sharing its layers and weights, so the plain
+    `unet` can still be saved and reloaded with build_unet.
+    """
+    if accum_steps <= 1:
+        return unet
+    return GradientAccumulationModel(unet.inputs, unet.outputs,
+                                     accum_steps=accum_steps, name=unet.name)
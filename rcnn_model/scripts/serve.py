@@ -0,0 +1,353 @@
+#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+"""
+serve.py
+
+Summary:
+    Long-lived local inference server around the trained U-Net. TensorFlow,
+    the model weights and its scaling layers are loaded once at startup (and the
+    forward pass traced with a warm-up batch), so jobs no longer pay that cost
+    per invocation.
+
+    Concurrent requests are micro-batched: the first queued request opens a
+    batch, which is run as soon as it holds SERVE_MAX_BATCH days or
+    SERVE_MAX_WAIT_MS after that first request arrived, whichever comes first.
+
+Endpoints (HTTP over TCP, or over a Unix socket with --socket):
+    POST /predict   body: .npy of raw features (H, W, C) or (n, H, W, C)
+                    (Content-Type: application/x-npy), or JSON
+                    {"year": 2021, "days": [0, 1]} referencing the processed store
+                    -> .npy of SST (n, H, W) in original units, NaN on land
+    GET  /metrics   JSON: request/batch counts, batch sizes, latency and queue-wait
+                    percentiles, days/s
+    GET  /health
+
+Inputs:
+    - unet_weights.h5 and normalisation.npz in Config.MODEL_DIR
+    - Data<year>_gcm.npy (or .p) in Config.PROCESSED_DIR for store references
+
+Usage:
+    python cli.py serve                       # http://127.0.0.1:8765
+    python cli.py serve --socket /tmp/sst.sock
+
+    from serve import InferenceClient
+    sst = InferenceClient(socket_path='/tmp/sst.sock').predict(X)   # X: (n, H, W, C)
+"""
+#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+# serve.py
+import argparse
+import collections
+import http.client
+import io
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+from config import Config
+
+
+#%% Micro-batching
+
+class MicroBatcher:
+    """Collects submitted (n, H, W, C) arrays into batches for predict_fn, on one worker thread."""
+
+    def __init__(self, predict_fn, max_batch, max_wait_ms, metrics):
+        self.predict_fn = predict_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.metrics = metrics
+        self._queue = queue.Queue()
+        self._carry = None
+        self._thread = threading.Thread(target=self._loop, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, X):
+        fut = Future()
+        self._queue.put((X, fut, time.perf_counter()))
+        return fut
+
+    def _collect(self):
+        if self._carry is not None:
+            first, self._carry = self._carry, None
+        else:
+            first = self._queue.get()
+        items = [first]
+        n = len(first[0])
+        deadline = first[2] + self.max_wait
+        while n < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if n + len(item[0]) > self.max_batch:
+                self._carry = item  # opens the next batch
+                break
+            items.append(item)
+            n += len(item[0])
+        return items
+
+    def _loop(self):
+        while True:
+            items = self._collect()
+            start = time.perf_counter()
+            try:
+                X = items[0][0] if len(items) == 1 else np.concatenate([x for x, _, _ in items])
+                Y = self.predict_fn(X)
+            except Exception as e:
+                for _, fut, _ in items:
+                    fut.set_exception(e)
+                continue
+            self.metrics.record_batch(len(X), time.perf_counter() - start,
+                                      [start - t for _, _, t in items])
+            offset = 0
+            for x, fut, _ in items:
+                fut.set_result(Y[offset:offset + len(x)])
+                offset += len(x)
+
+
+class Metrics:
+    def __init__(self, window=2000):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.requests = self.errors = self.batches = self.days = 0
+        self.latency = collections.deque(maxlen=window)
+        self.queue_wait = collections.deque(maxlen=window)
+        self.batch_sizes = collections.deque(maxlen=window)
+        self.compute = collections.deque(maxlen=window)
+
+    def record_batch(self, n, compute_s, waits):
+        with self._lock:
+            self.batches += 1
+            self.days += n
+            self.batch_sizes.append(n)
+            self.compute.append(compute_s)
+            self.queue_wait.extend(waits)
+
+    def record_request(self, latency_s, ok=True):
+        with self._lock:
+            self.requests += 1
+            self.errors += not ok
+            if ok:
+                self.latency.append(latency_s)
+
+    def snapshot(self):
+        def pct(values):
+            if not values:
+                return {}
+            a = 1000.0 * np.asarray(values)
+            return {'p50_ms': float(np.percentile(a, 50)), 'p95_ms': float(np.percentile(a, 95)),
+                    'p99_ms': float(np.percentile(a, 99)), 'max_ms': float(a.max())}
+
+        with self._lock:
+            uptime = time.time() - self.started
+            return {
+                'uptime_s': uptime,
+                'requests': self.requests,
+                'errors': self.errors,
+                'batches': self.batches,
+                'days': self.days,
+                'days_per_s': self.days / uptime if uptime else 0.0,
+                'mean_batch_size': float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+                'latency': pct(self.latency),
+                'queue_wait': pct(self.queue_wait),
+                'batch_compute': pct(self.compute),
+            }
+
+
+#%% Model
+
+class WarmModel:
+    """Inference model (U-Net with in-graph scaling) and a traced forward pass, loaded once."""
+
+    def __init__(self, model_dir=None, shape=(640, 480), max_batch=8):
+        import tensorflow as tf
+        from model import load_inference_model
+
+        if Config.TEMPORAL_WINDOW > 1:
+            raise ValueError("serve.py feeds single days; models trained with TEMPORAL_WINDOW > 1 run through "
+                             "test_full_inference.py")
+        # raw features in, SST and mask out: the training statistics are layers of the model
+        self.model = load_inference_model(model_dir or Config.MODEL_DIR, shape, Config.INFERENCE_MODEL)
+        self.shape = tuple(self.model.inputs[0].shape[1:])
+        self._forward = tf.function(lambda x: self.model(x, training=False), reduce_retracing=True)
+        self._years = {}
+        self._lock = threading.Lock()  # handler threads share the loaded year
+
+        # trace once for a single day and a full batch so requests don't pay for it
+        for n in sorted({1, max_batch}):
+            self.predict(np.zeros((n,) + self.shape, dtype=np.float32))
+
+    def predict(self, X):
+        from test_full_inference import predict_full
+        y_pred, mask = predict_full(self.model, X, forward=self._forward)
+        return np.where(mask[..., 0] > 0, y_pred[..., 0], np.nan).astype(np.float32)
+
+    def store_features(self, year, days):
+        """Raw features of the given days from the processed store (the last year used stays loaded)."""
+        from data_utils import day_features, load_gcm
+        with self._lock:
+            if year not in self._years:
+                self._years = {year: load_gcm(year)}
+            variables = self._years[year]
+        H, W = self.shape[:2]
+        return np.concatenate([day_features([v[d] for v in variables], H, W) for d in days])
+
+
+#%% HTTP
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'sst-unet/1.0'
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def address_string(self):
+        return str(self.client_address[0]) if self.client_address else 'unix'
+
+    def _send(self, code, body, content_type):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, code, obj):
+        self._send(code, json.dumps(obj).encode(), 'application/json')
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            self._send_json(200, self.server.metrics.snapshot())
+        elif self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path != '/predict':
+            return self._send_json(404, {'error': 'not found'})
+        t0 = time.perf_counter()
+        try:
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if self.headers.get('Content-Type', '').startswith('application/json'):
+                ref = json.loads(body)
+                X = self.server.warm.store_features(int(ref['year']), [int(d) for d in ref['days']])
+            else:
+                X = np.load(io.BytesIO(body), allow_pickle=False)
+            X = np.asarray(X, dtype=np.float32)
+            if X.ndim == 3:
+                X = X[None]
+            if X.shape[1:] != self.server.warm.shape:
+                raise ValueError(f"expected features of shape (n,) + {self.server.warm.shape}, got {X.shape}")
+            Y = self.server.batcher.submit(X).result()
+        except Exception as e:
+            self.server.metrics.record_request(time.perf_counter() - t0, ok=False)
+            return self._send_json(400, {'error': repr(e)})
+
+        buf = io.BytesIO()
+        np.save(buf, Y)
+        self.server.metrics.record_request(time.perf_counter() - t0)
+        self._send(200, buf.getvalue(), 'application/x-npy')
+
+
+class _UnixHTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        socketserver.TCPServer.server_bind(self)
+        self.server_name, self.server_port = 'localhost', 0
+
+
+def make_server(warm, host=None, port=None, socket_path=None, max_batch=None, max_wait_ms=None):
+    metrics = Metrics()
+    batcher = MicroBatcher(warm.predict, max_batch or Config.SERVE_MAX_BATCH,
+                           Config.SERVE_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms, metrics)
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = _UnixHTTPServer(socket_path, _Handler)
+    else:
+        server = ThreadingHTTPServer((host or Config.SERVE_HOST, Config.SERVE_PORT if port is None else port),
+                                     _Handler)
+    server.daemon_threads = True
+    server.warm, server.batcher, server.metrics = warm, batcher, metrics
+    return server
+
+
+#%% Client
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self._path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self._path)
+
+
+class InferenceClient:
+    def __init__(self, host=None, port=None, socket_path=None, timeout=300):
+        self.host = host or Config.SERVE_HOST
+        self.port = Config.SERVE_PORT if port is None else port
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def _request(self, method, path, body=None, content_type=None):
+        conn = (_UnixConnection(self.socket_path, self.timeout) if self.socket_path
+                else http.client.HTTPConnection(self.host, self.port, timeout=self.timeout))
+        try:
+            conn.request(method, path, body=body, headers={'Content-Type': content_type} if content_type else {})
+            resp = conn.getresponse()
+            data = resp.read()
+        finally:
+            conn.close()
+        if resp.status != 200:
+            raise RuntimeError(f"{method} {path}: {resp.status} {data.decode(errors='replace')}")
+        return data
+
+    def predict(self, X):
+        buf = io.BytesIO()
+        np.save(buf, np.asarray(X, dtype=np.float32))
+        return np.load(io.BytesIO(self._request('POST', '/predict', buf.getvalue(), 'application/x-npy')))
+
+    def predict_store(self, year, days):
+        body = json.dumps({'year': year, 'days': list(days)}).encode()
+        return np.load(io.BytesIO(self._request('POST', '/predict', body, 'application/json')))
+
+    def metrics(self):
+        return json.loads(self._request('GET', '/metrics'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Warm, micro-batching U-Net inference server.')
+    parser.add_argument('--host', default=Config.SERVE_HOST)
+    parser.add_argument('--port', type=int, default=Config.SERVE_PORT)
+    parser.add_argument('--socket', default=None, help='serve on this Unix socket instead of TCP')
+    parser.add_argument('--max-batch', type=int, default=Config.SERVE_MAX_BATCH)
+    parser.add_argument('--max-wait-ms', type=float, default=Config.SERVE_MAX_WAIT_MS)
+    parser.add_argument('--model-dir', default=None)
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    warm = WarmModel(args.model_dir, max_batch=args.max_batch)
+    server = make_server(warm, args.host, args.port, args.socket, args.max_batch, args.max_wait_ms)
+    where = args.socket or f"http://{args.host}:{args.port}"
+    print(f"✅ Model loaded and warmed up in {time.perf_counter() - t0:.1f} s; serving on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
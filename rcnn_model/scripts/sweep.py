@@ -0,0 +1,218 @@
+"""
+sweep.py
+
+Summary:
+    In-process hyperparameter sweep over PATCH_SIZE, BATCH_SIZE and
+    LEARNING_RATE that loads and scales the training data only once.
+
+    The parent process runs prepare_train_data() a single time and copies the
+    scaled arrays (as float32) into multiprocessing shared memory. Each trial
+    runs in a worker process that attaches to those blocks zero-copy as
+    read-only numpy arrays, builds its own patch sampler, validation tiles and
+    U-Net, and trains for a few short epochs.
+
+    Trials are pruned with a median stopping rule: after `min_epochs`, a trial
+    whose val_loss is worse than the median of the other trials with the same
+    patch size at the same epoch stops early. The patch size sets the
+    validation tiles, so val_loss is only compared (and ranked) within it. Results are printed as a table and saved as CSV/JSON.
+
+Inputs:
+    - Processed data for the given years (same as train.py)
+
+Outputs:
+    - output/sweep_<timestamp>.csv / .json with one row per trial
+
+Usage:
+    python cli.py sweep --patch-size 64 128 --batch-size 16 32 --lr 1e-3 3e-4 --workers 4
+"""
+
+# sweep.py
+import argparse
+import csv
+import itertools
+import json
+import math
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+
+from config import Config
+
+
+#%% Shared memory
+
+def share_arrays(arrays):
+    """Copies arrays into new shared-memory blocks. Returns (blocks, specs) where specs can be pickled to workers."""
+    blocks, specs = [], {}
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        shm = SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        blocks.append(shm)
+        specs[name] = (shm.name, arr.shape, arr.dtype.str)
+    return blocks, specs
+
+
+def attach_arrays(specs):
+    """Read-only numpy views on the parent's shared blocks (keep the returned blocks alive)."""
+    blocks, arrays = [], {}
+    for name, (shm_name, shape, dtype) in specs.items():
+        try:
+            shm = SharedMemory(name=shm_name, track=False)
+        except TypeError:  # Python < 3.13
+            shm = SharedMemory(name=shm_name)
+        arr = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        arr.flags.writeable = False
+        blocks.append(shm)
+        arrays[name] = arr
+    return blocks, arrays
+
+
+#%% Trials (run in worker processes)
+
+def _make_pruner(trial_id, group, shared_losses, min_epochs, margin):
+    import tensorflow as tf
+
+    class MedianPruner(tf.keras.callbacks.Callback):
+        def __init__(self):
+            super().__init__()
+            self.pruned = False
+
+        def on_epoch_end(self, epoch, logs=None):
+            loss = float(logs.get('val_loss', math.inf))
+            key = (group, trial_id)
+            shared_losses[key] = list(shared_losses.get(key, [])) + [loss]
+            # only trials validated on the same tiles (same patch size) are comparable
+            others = [v[epoch] for (g, t), v in shared_losses.items()
+                      if g == group and t != trial_id and len(v) > epoch]
+            if epoch + 1 >= min_epochs and others and (
+                    not math.isfinite(loss) or loss > statistics.median(others) * (1.0 + margin)):
+                self.pruned = True
+                self.model.stop_training = True
+
+    return MedianPruner()
+
+
+def run_trial(trial_id, params, specs, shared_losses, settings):
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(settings['threads'])
+    tf.config.threading.set_inter_op_parallelism_threads(2)
+    tf.keras.backend.clear_session()  # drop the previous trial's graphs and models in this long-lived worker
+
+    Config.PATCH_SIZE = params['patch_size']
+    Config.BATCH_SIZE = params['batch_size']
+    Config.LEARNING_RATE = params['learning_rate']
+
+    from train import make_ds, make_sampler, build_model
+    from validation import make_val_ds
+    from precision import training_policy, set_precision
+
+    blocks, a = attach_arrays(specs)
+    try:
+        policy = set_precision(training_policy())
+        sampler, _ = make_sampler(a['m_tr'])
+        train_ds = make_ds(a['X_tr'], a['m_tr'], a['y_tr'], shuffle=True, sampler=sampler)
+        val_ds, val_steps = make_val_ds(a['X_val'], a['m_val'], a['y_val'])
+        _, model = build_model(a['X_tr'].shape[-1], policy)
+
+        pruner = _make_pruner(trial_id, params['patch_size'], shared_losses, settings['min_epochs'], settings['margin'])
+        t0 = time.perf_counter()
+        history = model.fit(train_ds, epochs=settings['epochs'], steps_per_epoch=settings['steps_per_epoch'],
+                            validation_data=val_ds, validation_steps=val_steps,
+                            callbacks=[pruner, tf.keras.callbacks.TerminateOnNaN()], verbose=0)
+        val_losses = history.history.get('val_loss', [])
+        return {
+            'trial': trial_id, **params,
+            'best_val_loss': min(val_losses) if val_losses else math.inf,
+            'final_val_loss': val_losses[-1] if val_losses else math.inf,
+            'epochs': len(val_losses),
+            'pruned': pruner.pruned,
+            'train_s': time.perf_counter() - t0,
+        }
+    finally:
+        del a
+        for shm in blocks:
+            shm.close()
+
+
+#%% Driver
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Hyperparameter sweep sharing one copy of the training data.')
+    parser.add_argument('--years', type=int, nargs='+', default=[2015, 2016, 2017, 2018, 2019, 2020])
+    parser.add_argument('--dayS', type=int, default=0)
+    parser.add_argument('--dayE', type=int, default=1)
+    parser.add_argument('--patch-size', type=int, nargs='+', default=[Config.PATCH_SIZE])
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[Config.BATCH_SIZE])
+    parser.add_argument('--lr', type=float, nargs='+', default=[Config.LEARNING_RATE])
+    parser.add_argument('--epochs', type=int, default=5)
+    parser.add_argument('--steps-per-epoch', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help='TensorFlow intra-op threads per worker')
+    parser.add_argument('--min-epochs', type=int, default=2, help='epochs before a trial can be pruned')
+    parser.add_argument('--margin', type=float, default=0.0, help='prune if val_loss > median * (1 + margin)')
+    args = parser.parse_args(argv)
+
+    from data_utils import prepare_train_data
+
+    trials = [dict(patch_size=p, batch_size=b, learning_rate=lr)
+              for p, b, lr in itertools.product(args.patch_size, args.batch_size, args.lr)]
+    print(f"Sweep: {len(trials)} trials on {args.workers} workers x {args.threads} threads")
+
+    # Load and scale once
+    t0 = time.perf_counter()
+    (X_tr, m_tr, y_tr), (X_val, m_val, y_val), _ = prepare_train_data(args.years, args.dayS, args.dayE)
+    arrays = {'X_tr': X_tr, 'm_tr': m_tr, 'y_tr': y_tr, 'X_val': X_val, 'm_val': m_val, 'y_val': y_val}
+    arrays = {k: v.astype(np.float32, copy=False) for k, v in arrays.items()}
+    blocks, specs = share_arrays(arrays)
+    del X_tr, m_tr, y_tr, X_val, m_val, y_val, arrays
+    print(f"Data loaded and shared in {time.perf_counter() - t0:.1f} s")
+
+    settings = dict(epochs=args.epochs, steps_per_epoch=args.steps_per_epoch, threads=args.threads,
+                    min_epochs=args.min_epochs, margin=args.margin)
+    ctx = get_context('spawn')  # TensorFlow is not fork-safe
+    results = []
+    try:
+        with ctx.Manager() as manager:
+            shared_losses = manager.dict()
+            with ProcessPoolExecutor(max_workers=args.workers, mp_context=ctx) as pool:
+                futures = {pool.submit(run_trial, i, params, specs, shared_losses, settings): i
+                           for i, params in enumerate(trials)}
+                for fut in as_completed(futures):
+                    try:
+                        res = fut.result()
+                    except Exception as e:
+                        res = {'trial': futures[fut], **trials[futures[fut]], 'best_val_loss': math.inf,
+                               'error': repr(e)}
+                    results.append(res)
+                    print(f"  trial {res['trial']} done: {res}")
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+    # Results table
+    # val_loss is only comparable within a patch size (different validation tiles)
+    results.sort(key=lambda r: (r['patch_size'], r['best_val_loss']))
+    cols = ['trial', 'patch_size', 'batch_size', 'learning_rate', 'best_val_loss', 'final_val_loss',
+            'epochs', 'pruned', 'train_s']
+    print("\n" + "".join(f"{c:>15}" for c in cols))
+    for r in results:
+        print("".join(f"{r.get(c, ''):>15.4g}" if isinstance(r.get(c), float) else f"{str(r.get(c, '')):>15}"
+                      for c in cols))
+
+    os.makedirs(Config.OUTPUT_DIR, exist_ok=True)
+    stem = os.path.join(Config.OUTPUT_DIR, f"sweep_{time.strftime('%Y%m%d-%H%M%S')}")
+    with open(stem + '.json', 'w') as f:
+        json.dump(results, f, indent=2)
+    with open(stem + '.csv', 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=cols + ['error'], extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"\nSweep results saved to {stem}.csv")
+    return results
@@ -0,0 +1,255 @@
+"""
+temporal.py
+
+Summary:
+    Temporal-context inputs: the U-Net sees the features of days t-k+1 .. t
+    (stacked on the channel axis, oldest first) and predicts day t.
+
+    The days of all years are written once, day-contiguously, into a
+    memory-mapped store (DayStore) and scaled in place, so no list-of-arrays
+    pickle or np.concatenate copy of the whole period is ever held in memory.
+    A (N-k+1, k, H, W, C) window view over that store is built with strides
+    only (zero copy): window j is the k consecutive days starting at day j.
+
+    A window is valid only if its k days are consecutive calendar days, so
+    windows run across a year boundary when the previous year's last days are
+    in the store (e.g. 31 Dec -> 1 Jan) and are dropped where days are missing.
+
+    TemporalWindows and DaySubset are array-likes indexed by window number:
+    X[i, r0:r1, c0:c1] builds just that crop of window i, mask/y[i] are those of
+    its last day. They plug into generate_patches(), PatchIndex/PatchSampler
+    and make_validation_tiles() unchanged.
+
+Inputs:
+    - Processed data per year (via data_utils.load_year)
+    - TEMPORAL_WINDOW (k) and TEMPORAL_STORE_DIR from config.py
+
+Outputs:
+    - <TEMPORAL_STORE_DIR>/X.f32, mask.f32, y.f32, meta.json (day-major store)
+
+Classes/Functions:
+    - DayStore.build(root, years, dayS, dayE, scalers), DayStore(root)
+    - window_view(X, k), valid_window_ends(dates, k)
+    - DaySubset(arr, days), TemporalWindows(X, k, ends)
+    - prepare_temporal_train_data(years, dayS, dayE, k)
+    - prepare_temporal_test_data(year, dayS, dayE, k)
+    - predict_windows(model, windows, batch_size)
+
+Used In:
+    - train.py, test_full_inference.py (TEMPORAL_WINDOW > 1)
+
+Usage:
+    (X_tr, m_tr, y_tr), (X_val, m_val, y_val), scalers = prepare_temporal_train_data([2019, 2020], 0, 365, k=3)
+    X_tr.shape   # (n_windows, H, W, 3 * C), no copy of the store
+"""
+
+# temporal.py
+import calendar
+import datetime
+import json
+import os
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+from config import Config
+
+
+#%% Day-contiguous store
+
+class DayStore:
+    FILES = ('X', 'mask', 'y')
+
+    def __init__(self, root, mode='r'):
+        self.root = root
+        with open(os.path.join(root, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.dates = np.asarray(self.meta['dates'], dtype=np.int64)
+        shape = tuple(self.meta['shape'])
+        for name in self.FILES:
+            channels = self.meta['channels'] if name == 'X' else 1
+            setattr(self, name, np.memmap(os.path.join(root, f'{name}.f32'), dtype=np.float32, mode=mode,
+                                          shape=(len(self.dates),) + shape + (channels,)))
+
+    @classmethod
+    def build(cls, root, years, dayS, dayE, scalers=None, year_days=None, chunk=32, scale=True):
+        """
+        Writes the given years (ascending) into the store, one year in memory at
+        a time, then scales X and y in place. With scalers=None they are fitted
+        incrementally (partial_fit), which matches one fit on all days.
+        year_days optionally maps year -> (dayS, dayE) to override the range per year.
+        scale=False keeps the raw values (for the inference model, which scales in the graph).
+        Returns (store, (scaler_X, scaler_y)), or (store, None) with scale=False.
+        """
+        from data_utils import load_year
+
+        os.makedirs(root, exist_ok=True)
+        fit = scale and scalers is None
+        scaler_X, scaler_y = (StandardScaler(), StandardScaler()) if fit else (scalers or (None, None))
+        dates, shape, channels = [], None, None
+        files = {name: open(os.path.join(root, f'{name}.f32'), 'wb') for name in cls.FILES}
+        try:
+            for year in sorted(years):
+                d0, d1 = (year_days or {}).get(year, (dayS, dayE))
+                print(f"Adding {year} to the day store...")
+                X, y, mask = load_year(year, d0, d1)
+                shape, channels = X.shape[1:3], X.shape[-1]
+                if fit:
+                    scaler_X.partial_fit(X.reshape(-1, channels))
+                    scaler_y.partial_fit(y.reshape(-1, y.shape[-1]))
+                for name, arr in zip(cls.FILES, (X, mask, y)):
+                    files[name].write(np.ascontiguousarray(arr, dtype=np.float32).tobytes())
+                first = datetime.date(year, 1, 1).toordinal() + d0
+                dates.extend(range(first, first + len(X)))
+                del X, y, mask
+        finally:
+            for f in files.values():
+                f.close()
+
+        with open(os.path.join(root, 'meta.json'), 'w') as f:
+            json.dump({'years': sorted(years), 'dates': dates, 'shape': list(shape), 'channels': channels}, f)
+
+        if not scale:
+            return cls(root), None
+        store = cls(root, mode='r+')
+        for s in range(0, len(dates), chunk):
+            X = store.X[s:s + chunk]
+            X[...] = scaler_X.transform(X.reshape(-1, channels)).reshape(X.shape)
+            y = store.y[s:s + chunk]
+            y[...] = scaler_y.transform(y.reshape(-1, 1)).reshape(y.shape)
+        for name in cls.FILES:
+            getattr(store, name).flush()
+        return cls(root), (scaler_X, scaler_y)
+
+
+#%% Window views
+
+def window_view(X, k):
+    """(N-k+1, k, ...) read-only view of consecutive rows of X, built with strides only."""
+    return np.lib.stride_tricks.as_strided(
+        X, shape=(X.shape[0] - k + 1, k) + X.shape[1:], strides=(X.strides[0],) + X.strides, writeable=False
+    )
+
+
+def valid_window_ends(dates, k):
+    """Store rows t whose window t-k+1 .. t covers k consecutive calendar days."""
+    dates = np.asarray(dates)
+    t = np.arange(k - 1, len(dates))
+    return t[dates[t] - dates[t - k + 1] == k - 1]
+
+
+def _split_key(key):
+    key = key if isinstance(key, tuple) else (key,)
+    return key[0], key[1:]
+
+
+class DaySubset:
+    """Array-like over selected rows of an (N, ...) array, without copying them."""
+
+    def __init__(self, arr, days):
+        self.arr = arr
+        self.days = np.asarray(days)
+
+    @property
+    def shape(self):
+        return (len(self.days),) + self.arr.shape[1:]
+
+    @property
+    def ndim(self):
+        return self.arr.ndim
+
+    def __len__(self):
+        return len(self.days)
+
+    def __getitem__(self, key):
+        i, rest = _split_key(key)
+        return self.arr[(self.days[i],) + rest]
+
+
+class TemporalWindows(DaySubset):
+    """
+    Array-like of shape (n, H, W, k*C): item i is the window ending at store row
+    ends[i], days stacked on the channel axis. Only the requested crop is copied.
+    """
+
+    def __init__(self, X, k, ends):
+        super().__init__(X, ends)
+        self.k = k
+        self.view = window_view(X, k)
+
+    @property
+    def shape(self):
+        return (len(self.days),) + self.arr.shape[1:-1] + (self.k * self.arr.shape[-1],)
+
+    def __getitem__(self, key):
+        i, rest = _split_key(key)
+        window = self.view[self.days[i] - self.k + 1]          # (k, H, W, C) view
+        window = window[(slice(None),) + rest[:2]]              # spatial crop, still a view
+        out = np.concatenate(window, axis=-1)                   # (h, w, k*C), oldest day first
+        return out[(Ellipsis,) + rest[2:]] if len(rest) > 2 else out
+
+
+#%% Train / test preparation
+
+def prepare_temporal_train_data(years, dayS, dayE, k=None):
+    """
+    Same outputs as data_utils.prepare_train_data, with k-day windows as X.
+    Windows (not days) are split into train/validation.
+    """
+    k = k or Config.TEMPORAL_WINDOW
+    store, scalers = DayStore.build(os.path.join(Config.TEMPORAL_STORE_DIR, 'train'), years, dayS, dayE)
+    ends = valid_window_ends(store.dates, k)
+    if len(ends) == 0:
+        raise ValueError(f"No run of {k} consecutive days in {years} ({dayS}..{dayE})")
+    print(f"Temporal windows: {len(ends)} of {len(store.dates)} days have {k} consecutive days of context")
+
+    rng = np.random.RandomState(Config.RANDOM_SEED)
+    order = rng.permutation(len(ends))
+    n_val = max(1, int(round(Config.VALIDATION_SPLIT * len(ends))))
+    val, tr = np.sort(ends[order[:n_val]]), np.sort(ends[order[n_val:]])
+
+    def split(e):
+        return TemporalWindows(store.X, k, e), DaySubset(store.mask, e), DaySubset(store.y, e)
+
+    return split(tr), split(val), scalers
+
+
+def prepare_temporal_test_data(year, dayS, dayE, k=None):
+    """
+    Raw (unscaled) k-day windows for days dayS..dayE of `year`, for the inference
+    model (model.load_inference_model(..., window=k)). The first days take their
+    context from the end of the previous year when its processed file exists.
+    Returns (windows, mask, y, dates).
+    """
+    k = k or Config.TEMPORAL_WINDOW
+    years, year_days = [year], {}
+    prev_days = 366 if calendar.isleap(year - 1) else 365
+    if dayS < k - 1 and any(os.path.exists(os.path.join(Config.PROCESSED_DIR, f'Data{year - 1}_gcm.{ext}'))
+                            for ext in ('npy', 'p')):
+        years.append(year - 1)
+        year_days[year - 1] = (prev_days - (k - 1 - dayS), prev_days)
+    store, _ = DayStore.build(os.path.join(Config.TEMPORAL_STORE_DIR, f'test_{year}'), years, dayS, dayE,
+                              year_days=year_days, scale=False)
+
+    first = datetime.date(year, 1, 1).toordinal()
+    ends = valid_window_ends(store.dates, k)
+    ends = ends[store.dates[ends] >= first]
+    return (TemporalWindows(store.X, k, ends), DaySubset(store.mask, ends), DaySubset(store.y, ends),
+            [datetime.date.fromordinal(int(d)) for d in store.dates[ends]])
+
+
+def predict_windows(model, windows, batch_size=None):
+    """
+    Full-image predictions and water masks (n, H, W, 1) from raw windows with an
+    inference model (model.build_inference_model); one batch of windows is
+    materialised at a time.
+    """
+    from test_full_inference import predict_full
+
+    batch_size = batch_size or Config.BATCH_SIZE
+    n = len(windows)
+    y_pred = np.empty(windows.shape[:3] + (1,), dtype=np.float32)
+    mask = np.empty_like(y_pred)
+    for s in range(0, n, batch_size):
+        X = np.stack([windows[i] for i in range(s, min(s + batch_size, n))])
+        y_pred[s:s + len(X)], mask[s:s + len(X)] = predict_full(model, X)
+    return y_pred, mask
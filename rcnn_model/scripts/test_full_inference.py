@@ -5,14 +5,15 @@ Design: OJ
 test_full_inference.py
 
 Summary:
-    Performs full-image inference using a trained U-Net model.
-    Applies trained scalers to test data, runs predictions, evaluates metrics
-    (MSE, RMSE, MAE), and saves results and metrics to disk.
+    Performs full-image inference using a trained U-Net model on one test year
+    (with k-day windows when the model was trained with TEMPORAL_WINDOW = k > 1).
+    The training statistics are layers of the inference model (input scaling,
+    water mask, output unscaling), so raw test features go straight in. Evaluates
+    metrics (MSE, RMSE, MAE), and saves results and metrics to disk.
 
 Inputs:
     - Test data loaded from pickle
-    - Trained model weights from config.OUTPUT_DIR
-    - Scalers from training
+    - Trained model weights and normalisation.npz from config.MODEL_DIR
 
 Outputs:
     - Predicted SST maps
@@ -20,67 +21,84 @@ Outputs:
     - All results saved to `test_full_results.pkl` in config.OUTPUT_DIR
 
 Usage:
-    python test_full_inference.py
+    python cli.py infer
+    python cli.py infer --year 2012 --day-start 0 --day-end 90
+
+    For many years, or metrics by season and subregion, use evaluate.py.
 """
 #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
 
-from config import Config
-Config.ensure_directories()
-
 # test_full_inference.py
 
 import os
 import pickle
 import numpy as np
-import tensorflow as tf
-from sklearn.metrics import mean_squared_error, mean_absolute_error
 
 from config     import Config
-from data_utils import prepare_test_data
-from model      import build_unet
-
-def main():
-    # 1. Load test data (2011)
-    X_test, y_test, filenames = prepare_test_data()
-    n, H, W, C = X_test.shape
-
-    # 2. Load scalers from training
-    with open(os.path.join(Config.OUTPUT_DIR, 'scalers.pkl'), 'rb') as f:
-        scalers = pickle.load(f)
-    scaler_X, scaler_y = scalers['scaler_X'], scalers['scaler_y']
-
-    # 3. Apply scaling (no .fit, only .transform)
-    X_flat       = X_test.reshape(-1, C)
-    X_scaled     = scaler_X.transform(X_flat).reshape(n, H, W, C)
-    y_flat       = y_test.reshape(-1, 1)
-    y_scaled     = scaler_y.transform(y_flat).reshape(n, H, W, 1)
-
-    # 4. Build full-image UNet and load weights
-    #    (must match the down/upsampling architecture
-    #     so that 640 and 480 are divisible by 2^3=8)
-    model = build_unet((H, W, C))
-    model.load_weights(os.path.join(Config.OUTPUT_DIR, 'unet_weights.h5'))
-    model.compile(
-        loss='mse',
-        metrics=[tf.keras.metrics.RootMeanSquaredError(name='rmse'), 'mae']
-    )
 
-    # 5. Create the water-mask and predict
-    mask = (X_scaled.sum(axis=-1, keepdims=True) != 0).astype(np.float32)
-    y_pred_scaled = model.predict([X_scaled, mask], batch_size=Config.BATCH_SIZE)
-
-    # 6. Invert y-scaling back to original units
-    y_pred_flat = y_pred_scaled.reshape(-1, 1)
-    y_pred_orig = scaler_y.inverse_transform(y_pred_flat).reshape(n, H, W, 1)
+from profiling.tracer import span
+
+def predict_full(model, X_test, forward=None):
+    """
+    Full-image prediction from raw (n, H, W, C) features with an inference model
+    (model.build_inference_model): scaling, water mask and unscaling run in the
+    graph, so the cube goes to the model as is, without host-side copies.
+    Returns the prediction in original units and the water mask, both (n, H, W, 1).
+    forward(X), if given, replaces model.predict (e.g. a traced model call that
+    avoids predict()'s per-call setup in a long-lived server).
+    """
+    X_test = np.asarray(X_test, dtype=np.float32)  # no copy for float32 input
+    with span('predict', days=len(X_test)):
+        if forward is None:
+            y_pred, mask = model.predict(X_test, batch_size=Config.BATCH_SIZE)
+        else:
+            y_pred, mask = (np.asarray(t) for t in forward(X_test))
+    return y_pred, mask
+
+def main(year=2011, dayS=0, dayE=366):
+    Config.ensure_directories()
+    with span('test_full_inference', year=year):
+        _run(year, dayS, dayE)
+
+def _run(year, dayS, dayE):
+    # the model (TensorFlow), sklearn metrics and the data loaders are only needed here, not by predict_full users
+    from sklearn.metrics import mean_squared_error, mean_absolute_error
+    from data_utils import prepare_test_data
+    from model      import load_inference_model
+
+    k = Config.TEMPORAL_WINDOW
+
+    # 1. Load test data (days dayS..dayE-1 of the year, clipped to its length);
+    #    with k-day context, raw windows over a day store instead of single days
+    with span('prepare_test_data', year=year, window=k):
+        if k > 1:
+            from temporal import prepare_temporal_test_data, predict_windows
+            windows, _, y_days, filenames = prepare_temporal_test_data(year, dayS, dayE, k)
+            y_test = y_days.arr[y_days.days]
+        else:
+            X_test, y_test, filenames = prepare_test_data(year, dayS, dayE)
+    H, W = y_test.shape[1:3]
+
+    # 2-6. Full-image model with the training statistics in the graph: scale, mask,
+    #    predict on water pixels and invert the y-scaling on the device
+    #    (the full-image UNet must match the down/upsampling architecture
+    #     so that 640 and 480 are divisible by 2^3=8)
+    with span('build_model'):
+        model = load_inference_model(Config.MODEL_DIR, (H, W), Config.INFERENCE_MODEL, window=k)
+    if k > 1:
+        y_pred_orig, mask = predict_windows(model, windows)
+    else:
+        y_pred_orig, mask = predict_full(model, X_test)
 
     # 7. Compute metrics over water pixels only
-    mask_flat   = mask.reshape(-1).astype(bool)
-    y_true_flat = y_test.reshape(-1)
-    y_pred_flat = y_pred_orig.reshape(-1)
+    with span('metrics'):
+        mask_flat   = mask.reshape(-1).astype(bool)
+        y_true_flat = y_test.reshape(-1)
+        y_pred_flat = y_pred_orig.reshape(-1)
 
-    mse  = mean_squared_error(y_true_flat[mask_flat], y_pred_flat[mask_flat])
-    rmse = np.sqrt(mse)
-    mae  = mean_absolute_error(y_true_flat[mask_flat], y_pred_flat[mask_flat])
+        mse  = mean_squared_error(y_true_flat[mask_flat], y_pred_flat[mask_flat])
+        rmse = np.sqrt(mse)
+        mae  = mean_absolute_error(y_true_flat[mask_flat], y_pred_flat[mask_flat])
 
     print(f"Full-image Test → MSE: {mse:.4f}, RMSE: {rmse:.4f}, MAE: {mae:.4f}")
 
@@ -94,10 +112,7 @@ def main():
         'rmse':      rmse,
         'mae':       mae
     }
-    with open(os.path.join(Config.OUTPUT_DIR, 'test_full_results.pkl'), 'wb') as f:
+    with span('save_results'), open(os.path.join(Config.OUTPUT_DIR, 'test_full_results.pkl'), 'wb') as f:
         pickle.dump(out, f)
 
     print("✅ Full-image inference complete. Results in", Config.OUTPUT_DIR)
-
-if __name__ == '__main__':
-    main()
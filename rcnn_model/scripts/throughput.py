@@ -0,0 +1,190 @@
+"""
+throughput.py
+
+Summary:
+    Training throughput and input-pipeline stall instrumentation.
+
+    InputPipelineTimer hooks into the tf.data pipeline in two places:
+      - around the Python patch generator, to measure how much time is spent
+        producing patches (the per-epoch data-loading cost), and
+      - as the very last stage of the pipeline (after prefetch), to timestamp
+        when the training step actually received each batch.
+    ThroughputMonitor (a Keras callback) compares that timestamp with the
+    start of the step: the difference is time the model sat waiting for input.
+    If the prefetch buffer is full the wait is ~0; if it grows, the input
+    pipeline is the bottleneck.
+
+    Recorded per epoch: samples/sec, mean/p95 step time, input wait (total and
+    fraction of step time), generator time, validation time and host RSS.
+    Exported to TensorBoard (<log_dir>/throughput) and a JSON log.
+
+Functions/Classes:
+    - InputPipelineTimer: .wrap_generator(gen), .instrument(ds)
+    - ThroughputMonitor(timer, batch_size, log_dir, json_path)
+
+Used In:
+    - train.py
+
+Usage:
+    timer = InputPipelineTimer()
+    ds = tf.data.Dataset.from_generator(lambda: timer.wrap_generator(generate_patches(X, m, y)), ...)
+    ds = timer.instrument(ds.batch(bs).prefetch(tf.data.AUTOTUNE))
+    model.fit(ds, callbacks=[ThroughputMonitor(timer, bs, log_dir, json_path)])
+"""
+
+# throughput.py
+import json
+import os
+import threading
+import time
+import numpy as np
+import tensorflow as tf
+
+
+def host_rss_mb():
+    """Current resident set size of this process in MB (None if unavailable)."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024.0 ** 2
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024.0 ** 2
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class InputPipelineTimer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generator_s = 0.0
+        self._generated = 0
+        self._last_dequeue = None
+
+    def wrap_generator(self, gen):
+        """Yields from gen, accumulating the time spent inside it."""
+        while True:
+            t0 = time.perf_counter()
+            try:
+                item = next(gen)
+            except StopIteration:
+                return
+            dt = time.perf_counter() - t0
+            with self._lock:
+                self._generator_s += dt
+                self._generated += 1
+            yield item
+
+    def _record_dequeue(self):
+        self._last_dequeue = time.perf_counter()
+        return np.float64(self._last_dequeue)
+
+    def instrument(self, ds):
+        """
+        Appends a synchronous stamping stage after the last prefetch, so it runs
+        when the training step pulls a batch rather than when it is produced.
+        """
+        def stamp(*element):
+            t = tf.py_function(self._record_dequeue, [], tf.float64)
+            with tf.control_dependencies([t]):
+                return tf.nest.map_structure(tf.identity, element)
+
+        options = tf.data.Options()
+        if hasattr(options.experimental_optimization, 'inject_prefetch'):
+            # an injected prefetch after the stamp would hide the wait
+            options.experimental_optimization.inject_prefetch = False
+        return ds.map(stamp).with_options(options)
+
+    def pop_generator_stats(self):
+        with self._lock:
+            stats = (self._generator_s, self._generated)
+            self._generator_s, self._generated = 0.0, 0
+        return stats
+
+    @property
+    def last_dequeue(self):
+        return self._last_dequeue
+
+
+class ThroughputMonitor(tf.keras.callbacks.Callback):
+    def __init__(self, timer, batch_size, log_dir=None, json_path=None, log_every=50):
+        super().__init__()
+        self.timer = timer
+        self.batch_size = batch_size
+        self.json_path = json_path
+        self.log_every = log_every
+        self.writer = tf.summary.create_file_writer(os.path.join(log_dir, 'throughput')) if log_dir else None
+        self.history = []
+        self._global_step = 0
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._epoch_start = time.perf_counter()
+        self._step_times, self._waits = [], []
+        self._val_s = 0.0
+        self.timer.pop_generator_stats()
+
+    def on_train_batch_begin(self, batch, logs=None):
+        self._batch_start = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        end = time.perf_counter()
+        step = end - self._batch_start
+        dequeued = self.timer.last_dequeue
+        wait = 0.0
+        if dequeued is not None and self._batch_start <= dequeued <= end:
+            wait = dequeued - self._batch_start
+        self._step_times.append(step)
+        self._waits.append(wait)
+        self._global_step += 1
+
+        if self.writer is not None and self._global_step % self.log_every == 0:
+            with self.writer.as_default(step=self._global_step):
+                tf.summary.scalar('step/samples_per_sec', self.batch_size / step)
+                tf.summary.scalar('step/step_time_ms', 1000.0 * step)
+                tf.summary.scalar('step/input_wait_ms', 1000.0 * wait)
+
+    def on_test_begin(self, logs=None):
+        self._val_start = time.perf_counter()
+
+    def on_test_end(self, logs=None):
+        self._val_s += time.perf_counter() - self._val_start
+
+    def on_epoch_end(self, epoch, logs=None):
+        epoch_s = time.perf_counter() - self._epoch_start
+        steps = np.asarray(self._step_times)
+        waits = np.asarray(self._waits)
+        train_s = float(steps.sum()) if steps.size else 0.0
+        generator_s, generated = self.timer.pop_generator_stats()
+
+        record = {
+            'epoch': epoch,
+            'steps': int(steps.size),
+            'epoch_s': epoch_s,
+            'train_s': train_s,
+            'val_s': self._val_s,
+            'samples_per_sec': steps.size * self.batch_size / train_s if train_s else 0.0,
+            'step_ms_mean': 1000.0 * float(steps.mean()) if steps.size else 0.0,
+            'step_ms_p95': 1000.0 * float(np.percentile(steps, 95)) if steps.size else 0.0,
+            'input_wait_s': float(waits.sum()),
+            'input_wait_fraction': float(waits.sum()) / train_s if train_s else 0.0,
+            'generator_s': generator_s,
+            'patches_generated': generated,
+            'host_rss_mb': host_rss_mb(),
+        }
+        self.history.append(record)
+
+        if self.writer is not None:
+            with self.writer.as_default(step=epoch):
+                for key, value in record.items():
+                    if key != 'epoch' and value is not None:
+                        tf.summary.scalar(f'epoch/{key}', value)
+            self.writer.flush()
+        if self.json_path:
+            with open(self.json_path, 'w') as f:
+                json.dump(self.history, f, indent=2)
+
+        print(f"  throughput: {record['samples_per_sec']:.1f} samples/s, "
+              f"step {record['step_ms_mean']:.1f} ms (p95 {record['step_ms_p95']:.1f}), "
+              f"input wait {100 * record['input_wait_fraction']:.1f}%, "
+              f"generator {generator_s:.1f} s, val {self._val_s:.1f} s")
@@ -7,8 +7,9 @@ train.py
 
 Summary:
     Trains a U-Net model for downscaling SST data using interpolated inputs.
-    Uses patch-based training with optional mixed precision, model checkpoints,
-    and early stopping. Saves the model weights and scalers to output directory.
+    Uses patch-based training, a fixed tiled validation set, optional mixed
+    precision (bf16/fp16), XLA-compiled steps, gradient accumulation, model
+    checkpoints, and early stopping. Saves the model weights and scalers to output directory.
 
 Inputs:
     - Training data from processed pickle files (defined in config.DATA_PATH)
@@ -16,95 +17,162 @@ Inputs:
 
 Outputs:
     - Trained U-Net model weights (.h5)
-    - Scalers used to normalize input/output
+    - Scalers used to normalize input/output (scalers.pkl, and their statistics in
+      normalisation.npz for the in-graph scaling of the inference model)
     - Training logs and metrics saved to config.OUTPUT_DIR
+    - Resumable checkpoints (model, optimizer, LR, epoch, callbacks, RNG) in config.CHECKPOINT_DIR
+    - Throughput / input-wait log (throughput.json + TensorBoard 'throughput' run)
 
 Usage:
-    python train.py
+    python cli.py train
 """
 #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
 
-from config import Config
-Config.ensure_directories()
-
 # train.py
 import os
 import tensorflow as tf
+import json
 import pickle
+import numpy as np
 
 from config    import Config
 from data_utils import prepare_train_data, generate_patches
-from model     import build_unet
-
-# Mixed precision
-if Config.MIXED_PRECISION:
-    tf.keras.mixed_precision.set_global_policy('float32')
+from model     import build_unet, save_scaler_stats
+from validation import make_val_ds
+from throughput import InputPipelineTimer, ThroughputMonitor
+from patch_index import PatchIndex, PatchSampler, ocean_pixel_report
+from checkpointing import ResumableCheckpoint, fit_resumable
+from precision import training_policy, set_precision, make_optimizer, wrap_for_training
 
-years = [2015, 2016, 2017, 2018, 2019, 2020]
-dayS = 0
-dayE = 1
-# Prepare data
-(X_tr, m_tr, y_tr), (X_val, m_val, y_val), (scaler_X, scaler_y) = prepare_train_data(years, dayS, dayE)
+from profiling.tracer import span
 
 # Create tf.data pipelines
-def make_ds(X, m, y, shuffle=False):
-    ds = tf.data.Dataset.from_generator(
-        lambda: generate_patches(X, m, y),
-        output_signature=(
-            (tf.TensorSpec((Config.PATCH_SIZE, Config.PATCH_SIZE, X.shape[-1]), tf.float32),
-             tf.TensorSpec((Config.PATCH_SIZE, Config.PATCH_SIZE, 1),           tf.float32)),
-            tf.TensorSpec((Config.PATCH_SIZE, Config.PATCH_SIZE, 1),           tf.float32)
+def make_ds(X, m, y, shuffle=False, timer=None, sampler=None, seed=None):
+    def patches(_=None):
+        gen = generate_patches(X, m, y, sampler)
+        return timer.wrap_generator(gen) if timer is not None else gen
+
+    def from_generator(_=None):
+        return tf.data.Dataset.from_generator(
+            patches,
+            output_signature=(
+                (tf.TensorSpec((Config.PATCH_SIZE, Config.PATCH_SIZE, X.shape[-1]), tf.float32),
+                 tf.TensorSpec((Config.PATCH_SIZE, Config.PATCH_SIZE, 1),           tf.float32)),
+                tf.TensorSpec((Config.PATCH_SIZE, Config.PATCH_SIZE, 1),           tf.float32)
+            )
         )
-    )
+
+    if Config.DATA_PARALLELISM > 1:
+        # several independent patch streams produced concurrently
+        ds = tf.data.Dataset.range(Config.DATA_PARALLELISM).interleave(
+            from_generator, cycle_length=Config.DATA_PARALLELISM,
+            num_parallel_calls=Config.DATA_PARALLELISM, deterministic=False
+        )
+    else:
+        ds = from_generator()
     if shuffle:
-        ds = ds.shuffle(1024)
-    return ds.batch(Config.BATCH_SIZE).prefetch(tf.data.AUTOTUNE)
-
-train_ds = make_ds(X_tr, m_tr, y_tr, shuffle=True)
-val_ds   = make_ds(X_val, m_val, y_val)
-
-# Build & compile model
-model = build_unet((Config.PATCH_SIZE, Config.PATCH_SIZE, X_tr.shape[-1]))
-model.compile(
-    optimizer=tf.keras.optimizers.Adam(Config.LEARNING_RATE),
-    loss='mse',
-    metrics=[tf.keras.metrics.RootMeanSquaredError(name='rmse'), 'mae']
-)
-
-# Callbacks
-os.makedirs(Config.OUTPUT_DIR, exist_ok=True)
-cbs = [
-    tf.keras.callbacks.ModelCheckpoint(
-        os.path.join(Config.OUTPUT_DIR, 'best_unet.h5'),
-        save_best_only=True, monitor='val_loss'
-    ),
-    tf.keras.callbacks.EarlyStopping(
-        patience=5, restore_best_weights=True, monitor='val_loss'
-    ),
-    tf.keras.callbacks.ReduceLROnPlateau(
-        patience=3, factor=0.5, monitor='val_loss'
-    ),
-    tf.keras.callbacks.TensorBoard(
-        log_dir=os.path.join(Config.OUTPUT_DIR, 'logs')
+        ds = ds.shuffle(Config.SHUFFLE_BUFFER, seed=seed)
+    ds = ds.batch(Config.BATCH_SIZE).prefetch(Config.PREFETCH_BUFFER or tf.data.AUTOTUNE)
+    return timer.instrument(ds) if timer is not None else ds
+
+def make_sampler(m_tr):
+    """Land-aware crop offsets, built once from the training masks."""
+    with span('patch_index'):
+        patch_index = PatchIndex(m_tr, Config.PATCH_SIZE)
+        sampler = PatchSampler(patch_index, Config.PATCH_MIN_OCEAN, Config.PATCH_WEIGHTING,
+                               rng=np.random.RandomState(Config.RANDOM_SEED))
+    return sampler, ocean_pixel_report(patch_index, sampler, Config.BATCH_SIZE)
+
+def build_model(n_channels, policy):
+    """Returns (unet, model): the plain U-Net to save and the compiled model to train."""
+    unet  = build_unet((Config.PATCH_SIZE, Config.PATCH_SIZE, n_channels))
+    model = wrap_for_training(unet, Config.GRAD_ACCUM_STEPS)
+    model.compile(
+        optimizer=make_optimizer(Config.LEARNING_RATE, policy),
+        loss='mse',
+        metrics=[tf.keras.metrics.RootMeanSquaredError(name='rmse'), 'mae'],
+        jit_compile=Config.JIT_COMPILE
     )
-]
-
-# Train
-model.fit(
-    train_ds,
-    validation_data=val_ds,
-    epochs=Config.EPOCHS,
-    callbacks=cbs
-)
-
-# Save scalers
-with open(os.path.join(Config.MODEL_DIR, 'scalers.pkl'), 'wb') as f:
-    pickle.dump({'scaler_X': scaler_X, 'scaler_y': scaler_y}, f)
-
-# Save model structure + weights
-model_json = model.to_json()
-with open(os.path.join(Config.MODEL_DIR, 'unet_model.json'), 'w') as f:
-    f.write(model_json)
-model.save_weights(os.path.join(Config.MODEL_DIR, 'unet_weights.h5'))
-
-print("✅ Training complete. Artifacts saved in", Config.MODEL_DIR)
+    return unet, model
+
+def build_callbacks(input_timer):
+    os.makedirs(Config.OUTPUT_DIR, exist_ok=True)
+    return [
+        tf.keras.callbacks.ModelCheckpoint(
+            os.path.join(Config.OUTPUT_DIR, 'best_unet.h5'),
+            save_best_only=True, monitor='val_loss'
+        ),
+        tf.keras.callbacks.EarlyStopping(
+            patience=5, restore_best_weights=True, monitor='val_loss'
+        ),
+        tf.keras.callbacks.ReduceLROnPlateau(
+            patience=3, factor=0.5, monitor='val_loss'
+        ),
+        tf.keras.callbacks.TensorBoard(
+            log_dir=os.path.join(Config.OUTPUT_DIR, 'logs')
+        ),
+        ThroughputMonitor(
+            input_timer, Config.BATCH_SIZE,
+            log_dir=os.path.join(Config.OUTPUT_DIR, 'logs'),
+            json_path=os.path.join(Config.OUTPUT_DIR, 'throughput.json')
+        )
+    ]
+
+def main(years=(2015, 2016, 2017, 2018, 2019, 2020), dayS=0, dayE=1):
+    Config.ensure_directories()
+
+    # Mixed precision
+    policy = set_precision(training_policy())
+
+    # Prepare data
+    with span('prepare_train_data', years=len(years)):
+        if Config.TEMPORAL_WINDOW > 1:
+            # k-day windows over a memory-mapped day store (no copies of the store)
+            from temporal import prepare_temporal_train_data
+            (X_tr, m_tr, y_tr), (X_val, m_val, y_val), (scaler_X, scaler_y) = prepare_temporal_train_data(
+                list(years), dayS, dayE, Config.TEMPORAL_WINDOW)
+        else:
+            (X_tr, m_tr, y_tr), (X_val, m_val, y_val), (scaler_X, scaler_y) = prepare_train_data(
+                list(years), dayS, dayE)
+
+    sampler, report = make_sampler(m_tr)
+    print(f"Ocean pixels per batch: {report['uniform_ocean_fraction']:.1%} with uniform crops -> "
+          f"{report['sampler_ocean_fraction']:.1%} with the patch index (x{report['gain']:.2f})")
+    with open(os.path.join(Config.OUTPUT_DIR, 'patch_sampling.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    input_timer = InputPipelineTimer()
+    # built once the checkpoint is restored, with the shuffle seeded from it
+    train_ds = lambda seed: make_ds(X_tr, m_tr, y_tr, shuffle=True, timer=input_timer, sampler=sampler, seed=seed)
+    val_ds, val_steps = make_val_ds(X_val, m_val, y_val)
+
+    # Build & compile model
+    unet, model = build_model(X_tr.shape[-1], policy)
+
+    # Train (resumes from Config.CHECKPOINT_DIR if a previous run was interrupted)
+    checkpoint = ResumableCheckpoint(
+        Config.CHECKPOINT_DIR, sampler=sampler,
+        every_n_steps=Config.CHECKPOINT_EVERY_STEPS, max_to_keep=Config.CHECKPOINT_KEEP
+    )
+    with span('fit', epochs=Config.EPOCHS):
+        fit_resumable(
+            model, train_ds, checkpoint, build_callbacks(input_timer),
+            epochs=Config.EPOCHS,
+            steps_per_epoch=Config.STEPS_PER_EPOCH,
+            validation_data=val_ds,
+            validation_steps=val_steps
+        )
+
+    # Save scalers
+    os.makedirs(Config.MODEL_DIR, exist_ok=True)
+    with open(os.path.join(Config.MODEL_DIR, 'scalers.pkl'), 'wb') as f:
+        pickle.dump({'scaler_X': scaler_X, 'scaler_y': scaler_y}, f)
+    save_scaler_stats(Config.MODEL_DIR, scaler_X, scaler_y)  # read by the inference model, no sklearn needed
+
+    # Save model structure + weights
+    model_json = unet.to_json()
+    with open(os.path.join(Config.MODEL_DIR, 'unet_model.json'), 'w') as f:
+        f.write(model_json)
+    unet.save_weights(os.path.join(Config.MODEL_DIR, 'unet_weights.h5'))
+
+    print("✅ Training complete. Artifacts saved in", Config.MODEL_DIR)
@@ -0,0 +1,284 @@
+#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+"""
+train_distributed.py
+
+Summary:
+    CPU data-parallel training of the U-Net with
+    tf.distribute.MultiWorkerMirroredStrategy. Each worker is a separate
+    process (on one host or across hosts); gradients are all-reduced every step.
+
+    - Each worker draws its own patch stream (sampler seeded with
+      RANDOM_SEED + worker index), so the workers see different crops.
+    - The dataset is batched with the global batch BATCH_SIZE * workers and
+      each worker consumes BATCH_SIZE per step.
+    - The learning rate is scaled with the global batch (LR_SCALING: 'linear',
+      'sqrt' or 'none').
+    - The validation tiles are sharded across workers; val_loss is aggregated.
+    - BackupAndRestore lets a preempted multi-worker job resume.
+    - Only the chief (worker 0) writes logs and the final artifacts. Every
+      worker still calls save_weights (the BatchNorm moving statistics are
+      all-reduced when read); the others write to a temporary directory.
+    - Train steps are not XLA-compiled here (no CPU XLA collectives).
+
+Launching:
+    Local (one process per CPU group, e.g. per socket; CPUs are split evenly
+    and each worker is pinned to its share):
+        python cli.py train-distributed --local-workers 2
+
+    Multi-host: set TF_CONFIG on every host and run the script there, e.g.
+        TF_CONFIG='{"cluster": {"worker": ["node1:12345", "node2:12345"]},
+                    "task": {"type": "worker", "index": 0}}' python cli.py train-distributed
+
+    Smoke test on localhost with random data (no input files needed); checks
+    that all workers end with identical weights and that the save completes on
+    every worker, and exits non-zero otherwise (tests/test_train_distributed.py):
+        python cli.py train-distributed --local-workers 2 --smoke
+"""
+#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+# train_distributed.py
+import argparse
+import hashlib
+import json
+import math
+import os
+import pickle
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+from config import Config
+
+
+#%% Local launcher
+
+def _free_ports(n):
+    socks, ports = [], []
+    for _ in range(n):
+        s = socket.socket()
+        s.bind(('localhost', 0))
+        socks.append(s)
+        ports.append(s.getsockname()[1])
+    for s in socks:
+        s.close()
+    return ports
+
+
+def _cpu_groups(n):
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+    size = max(1, len(cpus) // n)
+    return [cpus[i * size:(i + 1) * size] or cpus for i in range(n)]
+
+
+def launch_local(n_workers, argv, extra_env=None):
+    """Starts n_workers copies of this script on localhost with TF_CONFIG set. Returns the exit code."""
+    cluster = [f'localhost:{p}' for p in _free_ports(n_workers)]
+    groups = _cpu_groups(n_workers)
+    procs = []
+    for i in range(n_workers):
+        env = dict(os.environ, **(extra_env or {}))
+        env['TF_CONFIG'] = json.dumps({'cluster': {'worker': cluster}, 'task': {'type': 'worker', 'index': i}})
+        env['SST_CPU_SET'] = ','.join(map(str, groups[i]))
+        env['PYTHONPATH'] = os.pathsep.join(p for p in sys.path if p)  # the workers import what we import
+        procs.append(subprocess.Popen([sys.executable, os.path.abspath(__file__)] + argv, env=env))
+    codes = [p.wait() for p in procs]
+    return max(codes, key=abs)
+
+
+def _pin_cpus():
+    cpu_set = os.getenv('SST_CPU_SET')
+    if not cpu_set:
+        return None
+    cpus = [int(c) for c in cpu_set.split(',')]
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+    return len(cpus)
+
+
+#%% Worker
+
+def _smoke_data(n_days, H=256, W=256, C=7, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((n_days, H, W, C)).astype(np.float32)
+    X[:, :, -H // 4:, :] = 0.0
+    m = (X.sum(axis=-1, keepdims=True) != 0).astype(np.float32)
+    y = (X[..., :1] * 0.5 + 0.1 * rng.standard_normal((n_days, H, W, 1))).astype(np.float32) * m
+    return (X[:-2], m[:-2], y[:-2]), (X[-2:], m[-2:], y[-2:]), None
+
+
+def scaled_learning_rate(base_lr, n_workers):
+    if Config.LR_SCALING == 'linear':
+        return base_lr * n_workers
+    if Config.LR_SCALING == 'sqrt':
+        return base_lr * n_workers ** 0.5
+    return base_lr
+
+
+def save_artifacts(unet, scalers, model_dir, is_chief):
+    """
+    Saves the U-Net on every worker: reading the BatchNorm moving statistics is
+    a collective under MultiWorkerMirroredStrategy, so a chief-only save hangs.
+    The chief writes to model_dir, the other workers to a temporary directory
+    that is then deleted. The scalers and the model json are chief-only.
+    """
+    from model import save_scaler_stats
+
+    target = model_dir if is_chief else tempfile.mkdtemp(prefix='sst_mwms_worker_')
+    try:
+        os.makedirs(target, exist_ok=True)
+        unet.save_weights(os.path.join(target, 'unet_weights.h5'))
+        if is_chief:
+            if scalers is not None:
+                with open(os.path.join(model_dir, 'scalers.pkl'), 'wb') as f:
+                    pickle.dump({'scaler_X': scalers[0], 'scaler_y': scalers[1]}, f)
+                save_scaler_stats(model_dir, *scalers)
+            with open(os.path.join(model_dir, 'unet_model.json'), 'w') as f:
+                f.write(unet.to_json())
+    finally:
+        if not is_chief:
+            shutil.rmtree(target, ignore_errors=True)
+
+
+def run_worker(args):
+    n_threads = _pin_cpus()
+
+    import tensorflow as tf
+    if n_threads:
+        tf.config.threading.set_intra_op_parallelism_threads(n_threads)
+
+    from data_utils import prepare_train_data
+    from patch_index import PatchIndex, PatchSampler
+    from validation import make_validation_tiles
+    from precision import training_policy, set_precision
+    import train
+
+    strategy = tf.distribute.MultiWorkerMirroredStrategy(
+        communication_options=tf.distribute.experimental.CommunicationOptions(
+            implementation=tf.distribute.experimental.CommunicationImplementation.RING))
+    resolver = strategy.cluster_resolver
+    n_workers = strategy.num_replicas_in_sync
+    index = resolver.task_id if resolver and resolver.task_id is not None else 0
+    is_chief = index == 0
+    print(f"[worker {index}/{n_workers}] started, {n_threads or 'all'} CPUs", flush=True)
+
+    if args.smoke:
+        Config.PATCH_SIZE, Config.GRAD_ACCUM_STEPS = 64, 1
+        (X_tr, m_tr, y_tr), (X_val, m_val, y_val), scalers = _smoke_data(8)
+    else:
+        (X_tr, m_tr, y_tr), (X_val, m_val, y_val), scalers = prepare_train_data(args.years, args.dayS, args.dayE)
+
+    policy = set_precision(training_policy())
+    Config.JIT_COMPILE = False  # XLA cannot compile the cross-worker all-reduce on CPU
+    global_batch = Config.BATCH_SIZE * n_workers
+    Config.LEARNING_RATE = scaled_learning_rate(Config.LEARNING_RATE, n_workers)
+
+    # Per-worker patch stream: the shard is the worker's own RNG seed
+    sampler = PatchSampler(PatchIndex(m_tr, Config.PATCH_SIZE), Config.PATCH_MIN_OCEAN, Config.PATCH_WEIGHTING,
+                           rng=np.random.RandomState(Config.RANDOM_SEED + index))
+    per_worker_batch, Config.BATCH_SIZE = Config.BATCH_SIZE, global_batch
+    train_ds = train.make_ds(X_tr, m_tr, y_tr, shuffle=True, sampler=sampler)
+    Config.BATCH_SIZE = per_worker_batch
+    off = tf.data.Options()
+    off.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.OFF
+    train_ds = train_ds.with_options(off)
+
+    # Fixed validation tiles, sharded across workers by element
+    tiles = make_validation_tiles(X_val, m_val, y_val, Config.PATCH_SIZE, Config.VAL_TILE_STRIDE, Config.VAL_DROP_LAND)
+    val_batch = Config.VAL_BATCH_SIZE * n_workers
+    val_ds = tf.data.Dataset.from_tensor_slices(((tiles[0], tiles[1]), tiles[2])).batch(val_batch).cache()
+    data = tf.data.Options()
+    data.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.DATA
+    val_ds = val_ds.with_options(data)
+    val_steps = math.ceil(len(tiles[0]) / val_batch)  # as validation.make_val_ds: the last partial batch counts
+
+    with strategy.scope():
+        unet, model = train.build_model(X_tr.shape[-1], policy)
+
+    backup_dir = os.path.join(Config.OUTPUT_DIR, 'distributed_backup')
+    cbs = [
+        tf.keras.callbacks.BackupAndRestore(backup_dir),
+        tf.keras.callbacks.EarlyStopping(patience=5, restore_best_weights=True, monitor='val_loss'),
+        tf.keras.callbacks.ReduceLROnPlateau(patience=3, factor=0.5, monitor='val_loss'),
+    ]
+    if is_chief and not args.smoke:
+        cbs.append(tf.keras.callbacks.TensorBoard(log_dir=os.path.join(Config.OUTPUT_DIR, 'logs', 'distributed')))
+
+    epochs = 2 if args.smoke else Config.EPOCHS
+    steps = 5 if args.smoke else Config.STEPS_PER_EPOCH
+    t0 = time.perf_counter()
+    model.fit(train_ds, epochs=epochs, steps_per_epoch=steps,
+              validation_data=val_ds, validation_steps=val_steps,
+              callbacks=cbs, verbose=2 if is_chief else 0)
+    elapsed = time.perf_counter() - t0
+    print(f"[worker {index}] {epochs} epochs in {elapsed:.1f} s "
+          f"({epochs * steps * global_batch / elapsed:.1f} global samples/s)", flush=True)
+
+    if args.smoke:
+        # the same save as a real run, so a hang in it fails the smoke test too
+        save_artifacts(unet, None, os.path.join(args.smoke_dir, 'model'), is_chief)
+        digest = hashlib.sha256(b''.join(w.tobytes() for w in unet.get_weights())).hexdigest()
+        with open(os.path.join(args.smoke_dir, f'worker{index}.sha256'), 'w') as f:
+            f.write(digest)
+        return 0
+
+    save_artifacts(unet, scalers, Config.MODEL_DIR, is_chief)
+    if is_chief:
+        print("✅ Distributed training complete. Artifacts saved in", Config.MODEL_DIR)
+    return 0
+
+
+def _strip_option(argv, name):
+    out, skip = [], False
+    for a in argv:
+        if skip:
+            skip = False
+        elif a == name:
+            skip = True
+        elif not a.startswith(name + '='):
+            out.append(a)
+    return out
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    parser = argparse.ArgumentParser(description='Multi-worker CPU data-parallel training.')
+    parser.add_argument('--local-workers', type=int, default=0,
+                        help='launch this many workers on localhost instead of reading TF_CONFIG')
+    parser.add_argument('--years', type=int, nargs='+', default=[2015, 2016, 2017, 2018, 2019, 2020])
+    parser.add_argument('--dayS', type=int, default=0)
+    parser.add_argument('--dayE', type=int, default=1)
+    parser.add_argument('--smoke', action='store_true', help='short run on random data; checks workers stay in sync')
+    parser.add_argument('--smoke-dir', default=None,
+                        help='where the smoke test leaves the per-worker weight digests (default: a temporary directory)')
+    args = parser.parse_args(argv)
+
+    if args.local_workers:
+        worker_argv = _strip_option(argv, '--local-workers')
+        if not args.smoke:
+            return launch_local(args.local_workers, worker_argv)
+
+        with tempfile.TemporaryDirectory(prefix='sst_mwms_') as tmp:
+            # keep smoke artifacts out of the real output dir
+            smoke_dir = args.smoke_dir or tmp
+            os.makedirs(smoke_dir, exist_ok=True)
+            code = launch_local(args.local_workers, _strip_option(worker_argv, '--smoke-dir') + ['--smoke-dir', smoke_dir],
+                                extra_env={'SST_MODEL_ROOT': tmp})
+            files = [f for f in os.listdir(smoke_dir) if f.endswith('.sha256')]
+            digests = {open(os.path.join(smoke_dir, f)).read() for f in files}
+            n_done = len(files)
+        ok = code == 0 and n_done == args.local_workers and len(digests) == 1
+        print(f"{'✅' if ok else '❌'} smoke test: {n_done}/{args.local_workers} workers finished, "
+              f"{len(digests)} distinct final weight set(s)")
+        return 0 if ok else 1
+
+    if args.smoke and args.smoke_dir is None:
+        args.smoke_dir = tempfile.mkdtemp(prefix='sst_mwms_')
+    return run_worker(args)
+
+
+if __name__ == '__main__':  # worker processes started by launch_local (PYTHONPATH is set)
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+validation.py
+
+Summary:
+    Fixed validation set for training. Instead of drawing random crops from an
+    endless generator, every validation day is tiled once, deterministically,
+    into PATCH_SIZE x PATCH_SIZE tiles that cover the whole image. The tiles
+    are held in memory and evaluated in large batches with a known number of
+    steps, so every val_loss is computed on exactly the same pixels.
+
+    Tiles start every `stride` pixels; the last row/column of tiles is aligned
+    to the image edge so nothing is left out. All-land tiles (mask == 0
+    everywhere) contribute nothing to the loss and are dropped by default.
+
+Inputs:
+    - Scaled validation arrays (X_val, m_val, y_val) from prepare_train_data()
+
+Outputs:
+    - (tiles_X, tiles_m, tiles_y) arrays and a finite, cached tf.data.Dataset
+
+Functions:
+    - tile_offsets(length, patch, stride)
+    - make_validation_tiles(X, mask, y, patch_size, stride, drop_land)
+    - make_val_ds(X, mask, y): returns (dataset, steps)
+
+Used In:
+    - train.py
+"""
+
+# validation.py
+import math
+import numpy as np
+
+from config import Config
+
+
+def tile_offsets(length, patch, stride=None):
+    """Start offsets covering [0, length) with tiles of size `patch`; the last one ends at the edge."""
+    stride = stride or patch
+    if length < patch:
+        raise ValueError(f"Image size {length} is smaller than patch size {patch}")
+    offsets = list(range(0, length - patch + 1, stride))
+    if offsets[-1] != length - patch:
+        offsets.append(length - patch)
+    return offsets
+
+
+def make_validation_tiles(X, mask, y, patch_size=None, stride=None, drop_land=True):
+    ps = patch_size or Config.PATCH_SIZE
+    n, H, W, _ = X.shape
+    rows, cols = tile_offsets(H, ps, stride), tile_offsets(W, ps, stride)
+
+    index = [(i, r, c) for i in range(n) for r in rows for c in cols]
+    if drop_land:
+        index = [(i, r, c) for i, r, c in index if mask[i, r:r+ps, c:c+ps].any()]
+
+    tiles_X = np.empty((len(index), ps, ps, X.shape[-1]), dtype=np.float32)
+    tiles_m = np.empty((len(index), ps, ps, mask.shape[-1]), dtype=np.float32)
+    tiles_y = np.empty((len(index), ps, ps, y.shape[-1]), dtype=np.float32)
+    for k, (i, r, c) in enumerate(index):
+        tiles_X[k] = X[i, r:r+ps, c:c+ps]
+        tiles_m[k] = mask[i, r:r+ps, c:c+ps]
+        tiles_y[k] = y[i, r:r+ps, c:c+ps]
+    return tiles_X, tiles_m, tiles_y
+
+
+def make_val_ds(X, mask, y):
+    """Finite validation dataset and its step count, for model.fit(validation_steps=...)."""
+    import tensorflow as tf
+
+    tiles_X, tiles_m, tiles_y = make_validation_tiles(
+        X, mask, y, Config.PATCH_SIZE, Config.VAL_TILE_STRIDE, Config.VAL_DROP_LAND
+    )
+    print(f"Validation set: {len(tiles_X)} fixed tiles from {X.shape[0]} days")
+    ds = tf.data.Dataset.from_tensor_slices(((tiles_X, tiles_m), tiles_y))
+    ds = ds.batch(Config.VAL_BATCH_SIZE).cache().prefetch(tf.data.AUTOTUNE)
+    return ds, math.ceil(len(tiles_X) / Config.VAL_BATCH_SIZE)
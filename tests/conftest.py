@@ -0,0 +1,10 @@
+# conftest.py
+# The pipeline folders are not installed packages: make their modules importable as the scripts see them
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+for sub in ('', 'interpolation-engine', 'rcnn_model/scripts'):
+    path = os.path.join(ROOT, sub)
+    if path not in sys.path:
+        sys.path.insert(0, path)
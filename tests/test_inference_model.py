@@ -0,0 +1,21 @@
+# test_inference_model.py
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('tensorflow')
+
+from model import build_student_unet, build_inference_model
+
+
+def test_all_zero_pixel_is_land():
+    C = 7
+    stats = {'mean_X': np.full(C, 5.0, np.float32), 'scale_X': np.full(C, 2.0, np.float32),
+             'mean_y': np.array([20.0], np.float32), 'scale_y': np.array([3.0], np.float32)}
+    model = build_inference_model(build_student_unet((16, 16, C), base_filters=2), stats)
+
+    raw = np.random.default_rng(0).uniform(1, 10, (1, 16, 16, C)).astype(np.float32)
+    raw[0, 3, 4] = 0
+    _, mask = model.predict(raw, verbose=0)
+
+    assert mask[0, 3, 4, 0] == 0
+    assert mask.sum() == 16 * 16 - 1
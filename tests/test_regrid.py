@@ -0,0 +1,24 @@
+# test_regrid.py
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('scipy')
+pytest.importorskip('sklearn')
+
+from scipy.interpolate import RBFInterpolator
+from sklearn.preprocessing import StandardScaler
+
+from interpolation.regrid import RBFWeights
+
+
+def test_rbf_weights_match_rbf_interpolator():
+    rng = np.random.default_rng(0)
+    X = np.column_stack((rng.uniform(-34, -22, 60), rng.uniform(108, 117, 60)))
+    X_test = np.column_stack((rng.uniform(-34, -22, 200), rng.uniform(108, 117, 200)))
+    y = rng.standard_normal((60, 2))
+
+    sc = StandardScaler()
+    expected = RBFInterpolator(sc.fit_transform(X), y, kernel='linear')(sc.transform(X_test))
+
+    np.testing.assert_allclose(RBFWeights(X, X_test, chunk=64).apply(y), expected, rtol=1e-6, atol=1e-8)
+    np.testing.assert_allclose(RBFWeights(X, X_test).apply(y[:, 0]), expected[:, 0], rtol=1e-6, atol=1e-8)
@@ -0,0 +1,24 @@
+# test_result_buffer.py
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from utils.result_buffer import ResultBuffer
+
+
+def test_missing_tracks_written_slots_not_nans(tmp_path):
+    path = str(tmp_path / 'Data2021_gcm.npy')
+    buffer = ResultBuffer.create(path, 2, 3, shape=(4, 5))
+
+    field = np.ones((4, 5))
+    field[0, 0] = np.nan                       # a legitimate NaN at the corner
+    buffer.write(0, 0, field)
+    buffer.write(1, 2, np.zeros(20))
+    ResultBuffer(path).write(0, 1, np.zeros(20))  # another process opening the same buffer
+
+    assert buffer.missing() == [(0, 2), (1, 0), (1, 1)]
+    for v, T in buffer.missing():
+        buffer.write(v, T, np.zeros(20))
+    assert buffer.missing() == []
+    assert buffer.finalize() == path
+    assert np.load(path).shape == (2, 3, 4, 5)
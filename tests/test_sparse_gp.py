@@ -0,0 +1,23 @@
+# test_sparse_gp.py
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('scipy')
+pytest.importorskip('sklearn')
+
+from interpolation.sparse_gp import SparseGP
+
+
+@pytest.mark.parametrize('side', [20, 30, 40])
+def test_fits_smooth_field(side):
+    # smooth field with almost no noise: the fitted noise level collapses towards its bound
+    lat, lon = np.meshgrid(np.linspace(-34, -22, side), np.linspace(108, 116, side), indexing='ij')
+    X = np.column_stack((lat.ravel(), lon.ravel()))
+    glat, glon = np.meshgrid(np.linspace(-33, -23, 50), np.linspace(109, 115, 50), indexing='ij')
+    X_test = np.column_stack((glat.ravel(), glon.ravel()))
+    f = lambda P: np.sin(P[:, 0] / 2) + np.cos(P[:, 1] / 1.5)
+
+    mean = SparseGP(X, X_test).fit(f(X)).apply(f(X))
+
+    assert np.all(np.isfinite(mean))
+    assert np.sqrt(np.mean((mean - f(X_test)) ** 2)) < 0.05 * f(X_test).std()
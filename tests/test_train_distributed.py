@@ -0,0 +1,18 @@
+# test_train_distributed.py
+import os
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('tensorflow')
+
+import train_distributed
+
+
+def test_local_workers_end_in_sync(tmp_path):
+    code = train_distributed.main(['--local-workers', '2', '--smoke', '--smoke-dir', str(tmp_path)])
+
+    digests = [(tmp_path / f'worker{i}.sha256').read_text() for i in range(2)]
+    assert code == 0
+    assert digests[0] == digests[1]
+    assert os.path.exists(tmp_path / 'model' / 'unet_weights.h5')